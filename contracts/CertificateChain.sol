@@ -8,9 +8,20 @@ contract CertificateChain {
         address issuer;
     }
 
+    struct Anchor {
+        uint timestamp;
+        address issuer;
+        uint count;
+    }
+
     mapping(string => Certificate) public certificates;
 
+    // Merkle roots of certificate batches; each certificate in a batch is
+    // proven off chain with its inclusion proof against the root.
+    mapping(bytes32 => Anchor) public anchors;
+
     event CertificateAdded(string candidateHash, address issuer);
+    event RootAnchored(bytes32 root, address issuer, uint count);
 
     // Single insert
     function addCertificate(string memory _candidateHash) public {
@@ -30,6 +41,19 @@ contract CertificateChain {
         }
     }
 
+    // ✅ Anchor a batch: one root for any number of certificates
+    function anchorRoot(bytes32 _root, uint _count) public {
+        require(anchors[_root].timestamp == 0, "Already anchored!");
+        anchors[_root] = Anchor(block.timestamp, msg.sender, _count);
+        emit RootAnchored(_root, msg.sender, _count);
+    }
+
+    // Verify an anchored root
+    function verifyRoot(bytes32 _root) public view returns (bool, uint, address, uint) {
+        Anchor memory anchor = anchors[_root];
+        return (anchor.timestamp != 0, anchor.timestamp, anchor.issuer, anchor.count);
+    }
+
     // Verify certificate
     function verifyCertificate(string memory _candidateHash) public view returns (bool, uint, address) {
         if (bytes(certificates[_candidateHash].candidateHash).length == 0) {
@@ -2,24 +2,31 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from skimage.metrics import structural_similarity as ssim
-import easyocr
 import os
 import csv
 import re
 
 # ====================================================================
 # CONFIGURATION AND INITIALIZATION
-# Initialize the EasyOCR Reader for English ('en').
-# Moving this outside the function improves performance dramatically 
-# if you process multiple images.
+# The EasyOCR Reader for English ('en') is created once, on first use,
+# and reused for every image. Importing this module no longer loads the
+# detection and recognition networks.
 # ====================================================================
-try:
-    # Use GPU (True) if available, otherwise CPU (False)
-    # The original script had gpu=False, keeping it as is.
-    READER = easyocr.Reader(['en'], gpu=False) 
-except Exception as e:
-    print(f"Error initializing EasyOCR Reader: {e}")
-    READER = None
+READER = None
+_READER_FAILED = False
+
+def get_reader():
+    global READER, _READER_FAILED
+    if READER is None and not _READER_FAILED:
+        try:
+            import easyocr
+            # Use GPU (True) if available, otherwise CPU (False)
+            # The original script had gpu=False, keeping it as is.
+            READER = easyocr.Reader(['en'], gpu=False)
+        except Exception as e:
+            print(f"Error initializing EasyOCR Reader: {e}")
+            _READER_FAILED = True
+    return READER
 
 def generate_ssim_heatmap(reference_path, test_path):
     """
@@ -114,14 +121,15 @@ def extract_fields(image_path):
         'Certificate ID': 'N/A'
     }
 
-    if not READER or not os.path.exists(image_path):
-        if not READER:
+    reader = get_reader()
+    if not reader or not os.path.exists(image_path):
+        if not reader:
              print("OCR Reader is not initialized. Cannot proceed.")
         return extracted_data
     
     try:
         # EasyOCR reads the image and returns a list of (bbox, text, confidence)
-        results = READER.readtext(image_path)
+        results = reader.readtext(image_path)
         
         # Join all text into one large string for robust keyword/regex searching.
         all_text = " ".join([text.strip() for (bbox, text, conf) in results if text.strip()])
@@ -276,7 +284,7 @@ if __name__ == "__main__":
     if not os.path.exists(CERTIFICATE_FILE_PATH):
         print(f"\nFATAL: Image file not found at path: {CERTIFICATE_FILE_PATH}.")
         print("Please check the filename and ensure the image is in the same directory.")
-    elif READER is None:
+    elif get_reader() is None:
         print("\nFATAL: EasyOCR initialization failed. Check console for error messages.")
     else:
         # Run extraction
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from merkle import MerkleTree
+
+# ====================================================================
+# CONFIGURATION
+# Batches anchored with `issue_certificates.py --anchor` are kept in
+# ANCHOR_DIR as <root>.json ({"root", "leaves"}), the certificate hashes
+# in tree order. The chain only holds each root; proofs are rebuilt from
+# these files, with the trees of the ANCHOR_TREE_CACHE most recently used
+# batches kept built. On a miss the directory is rescanned for new
+# batches at most every ANCHOR_RESCAN_INTERVAL seconds.
+# ====================================================================
+ANCHOR_DIR = os.environ.get('ANCHOR_DIR', 'data/anchors')
+ANCHOR_TREE_CACHE = int(os.environ.get('ANCHOR_TREE_CACHE', 8))
+ANCHOR_RESCAN_INTERVAL = float(os.environ.get('ANCHOR_RESCAN_INTERVAL', 5))
+
+BATCH_SUFFIX = '.json'
+PENDING_SUFFIX = '.json.pending'
+
+
+class AnchorStore:
+    """
+    Merkle-anchored certificate batches on disk.
+
+    The issuer writes a batch as <root>.json.pending before sending its
+    root and commits it (a rename) once the transaction is mined, so a
+    committed file always belongs to an anchored root. The verifier maps
+    every committed leaf to its batch and builds inclusion proofs on demand.
+    """
+
+    def __init__(self, root: str = ANCHOR_DIR, tree_cache: int = ANCHOR_TREE_CACHE,
+                 rescan_interval: float = ANCHOR_RESCAN_INTERVAL):
+        self.root = root
+        self.tree_cache = max(1, tree_cache)
+        self.rescan_interval = rescan_interval
+        self._batch_of: Dict[str, Tuple[str, int]] = {}  # certificate hash -> (root, leaf index)
+        self._batches = set()
+        self._trees: 'OrderedDict[str, MerkleTree]' = OrderedDict()
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._batches)
+
+    def __contains__(self, certificate_hash: str) -> bool:
+        return certificate_hash in self._batch_of
+
+    def _path(self, root: str, suffix: str = BATCH_SUFFIX) -> str:
+        return os.path.join(self.root, root + suffix)
+
+    def _read(self, path: str) -> List[str]:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['leaves']
+
+    # --- verifier side ---------------------------------------------------
+
+    def load(self) -> int:
+        """Index committed batches not seen before. Returns how many were added."""
+        with self._lock:
+            self._last_scan = time.monotonic()
+            if not os.path.isdir(self.root):
+                return 0
+            added = 0
+            for name in sorted(os.listdir(self.root)):
+                root = name[:-len(BATCH_SUFFIX)]
+                if not name.endswith(BATCH_SUFFIX) or root in self._batches:
+                    continue
+                try:
+                    leaves = self._read(os.path.join(self.root, name))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"❌ Skipping anchored batch {name}: {e}")
+                    continue
+                for index, certificate_hash in enumerate(leaves):
+                    self._batch_of.setdefault(certificate_hash, (root, index))
+                self._batches.add(root)
+                added += 1
+            return added
+
+    def proof_for(self, certificate_hash: str) -> Optional[dict]:
+        """Inclusion proof of `certificate_hash` in its anchored batch, or None if it is in none."""
+        located = self._batch_of.get(certificate_hash)
+        if located is None and time.monotonic() - self._last_scan >= self.rescan_interval:
+            self.load()  # the batch may have been committed since the last scan
+            located = self._batch_of.get(certificate_hash)
+        if located is None:
+            return None
+        root, index = located
+        with self._lock:
+            tree = self._trees.get(root)
+            if tree is not None:
+                self._trees.move_to_end(root)
+        if tree is None:
+            tree = MerkleTree(self._read(self._path(root)))
+            with self._lock:
+                self._trees[root] = tree
+                while len(self._trees) > self.tree_cache:
+                    self._trees.popitem(last=False)
+        return tree.proof(index)
+
+    # --- issuer side -----------------------------------------------------
+
+    def write_pending(self, tree: MerkleTree):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(tree.root, PENDING_SUFFIX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'root': tree.root, 'leaves': tree.hashes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def commit(self, root: str):
+        os.replace(self._path(root, PENDING_SUFFIX), self._path(root))
+
+    def discard(self, root: str):
+        os.remove(self._path(root, PENDING_SUFFIX))
+
+    def pending(self) -> List[Tuple[str, List[str]]]:
+        """(root, leaves) of every batch written but not yet committed."""
+        if not os.path.isdir(self.root):
+            return []
+        return [(name[:-len(PENDING_SUFFIX)], self._read(os.path.join(self.root, name)))
+                for name in sorted(os.listdir(self.root)) if name.endswith(PENDING_SUFFIX)]
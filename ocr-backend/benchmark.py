@@ -0,0 +1,307 @@
+"""
+Performance baseline for the verification pipeline.
+
+    python benchmark.py [--repeat N] [--requests N] [--concurrency 1,4,8]
+                        [--url http://host:8000] [--output FILE] [--compare BASELINE]
+
+Synthetic certificates are generated from the reference template (genuine,
+edited text, removed seal, shifted, rescaled, recompressed JPEG), plus a
+junk upload that is no certificate at all (smoothed noise), and pushed
+through each stage on its own - extract_fields, generate_ssim_heatmap,
+generate_hash - and then through POST /ocr/verify end to end, at every
+requested concurrency. Without --url the app runs in-process (TestClient);
+with it, requests go to a live server.
+
+Latency percentiles (p50/p95/p99), throughput and peak RSS are written to a
+JSON file tagged with the git commit. --compare prints the change against an
+earlier file and exits non-zero when a p50 regresses by more than
+--max-regression percent.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Keep benchmark rows, fingerprints and overlays out of the repo's data
+# and heatmaps folders.
+BENCH_DIR = tempfile.mkdtemp(prefix='ocr-bench-')
+os.environ.setdefault('VERIFICATION_DB', os.path.join(BENCH_DIR, 'verifications.db'))
+os.environ.setdefault('NEAR_DUP_DB', os.path.join(BENCH_DIR, 'fingerprints.db'))
+os.environ.setdefault('HEATMAP_FOLDER', os.path.join(BENCH_DIR, 'heatmaps'))
+# Repeated variants would otherwise be answered by the near-duplicate
+# prefilter, and the end-to-end numbers would stop measuring OCR.
+os.environ.setdefault('NEAR_DUP', '0')
+os.environ.setdefault('CHAIN_SOURCE', 'memory')
+
+import main  # noqa: E402  (reads the environment above at import time)
+from main import TEMPLATE_STORE, extract_fields, generate_hash, generate_ssim_heatmap, init_ocr_worker  # noqa: E402
+
+# ====================================================================
+# CONFIGURATION
+# Where genuine.png puts the things the variants tamper with (pixels).
+# ====================================================================
+SEAL_CENTER = (1505, 400)
+SEAL_RADIUS = 145
+ROLL_NO_BOX = (260, 870, 400, 50)
+GRADE_BOX = (742, 752, 32, 48)
+SHIFT_PIXELS = (18, -12)
+RESCALE_FACTOR = 0.75
+JPEG_QUALITY = 60
+JUNK_SEED = 7
+
+# Settings that change what a run measures, recorded with every baseline.
+RECORDED_SETTINGS = ('OCR_WORKERS', 'OCR_PRELOAD', 'OCR_BATCH_SIZE', 'SSIM_MODE', 'ALIGN_MODE',
+                     'ALIGN_DETECTOR', 'HEATMAP_FORMAT', 'RESULT_CACHE_SIZE', 'EARLY_EXIT',
+                     'MIN_KEY_FIELD_CONFIDENCE', 'NEAR_DUP')
+
+
+def _write_text(image, box, text):
+    x, y, w, h = box
+    cv2.rectangle(image, (x, y), (x + w, y + h), (255, 255, 255), -1)
+    cv2.putText(image, text, (x + 5, y + h - 12), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (50, 50, 50), 2, cv2.LINE_AA)
+
+
+def make_variants(genuine):
+    """{name: encoded upload bytes} for every synthetic certificate."""
+    def png(image):
+        return cv2.imencode('.png', image)[1].tobytes()
+
+    h, w = genuine.shape[:2]
+    variants = {'genuine': png(genuine)}
+
+    edited = genuine.copy()
+    _write_text(edited, ROLL_NO_BOX, "Roll Number : 99999")
+    _write_text(edited, GRADE_BOX, "A")
+    variants['text_edit'] = png(edited)
+
+    # Paint the seal over with the ribbon colour just above it
+    unsealed = genuine.copy()
+    cx, cy = SEAL_CENTER
+    ribbon = tuple(int(c) for c in np.median(genuine[cy - SEAL_RADIUS - 40:cy - SEAL_RADIUS - 10,
+                                                     cx - 50:cx + 50].reshape(-1, 3), axis=0))
+    cv2.circle(unsealed, SEAL_CENTER, SEAL_RADIUS, ribbon, -1)
+    variants['stamp_removed'] = png(unsealed)
+
+    shift = np.float32([[1, 0, SHIFT_PIXELS[0]], [0, 1, SHIFT_PIXELS[1]]])
+    variants['shifted'] = png(cv2.warpAffine(genuine, shift, (w, h), borderValue=(255, 255, 255)))
+    variants['rescaled'] = png(cv2.resize(genuine, None, fx=RESCALE_FACTOR, fy=RESCALE_FACTOR,
+                                          interpolation=cv2.INTER_AREA))
+    variants['jpeg'] = cv2.imencode('.jpg', genuine, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])[1].tobytes()
+
+    noise = np.random.default_rng(JUNK_SEED).integers(0, 256, (h // 8, w // 8, 3), dtype=np.uint8)
+    variants['junk'] = png(cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC))
+    return variants
+
+
+def unique_upload(data):
+    # Decoders stop at the end-of-image marker, so trailing bytes leave the
+    # picture unchanged but give every request its own digest: no cache hits
+    # (the near-duplicate prefilter, which would still match, is off).
+    return data + uuid.uuid4().bytes
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest child, in MB."""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {'self': round(own / scale, 1), 'children': round(children / scale, 1)}
+
+
+def summarize(latencies, wall_time):
+    ms = np.array(latencies) * 1000
+    return {
+        'count': len(latencies),
+        'mean_ms': round(float(ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'throughput_per_s': round(len(latencies) / wall_time, 2) if wall_time else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def time_stage(name, fn, inputs, repeat):
+    """Run fn over every (variant, argument) `repeat` times, one call at a time."""
+    latencies, by_variant = [], {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for variant, arg in inputs:
+            t0 = time.perf_counter()
+            fn(arg)
+            elapsed = time.perf_counter() - t0
+            latencies.append(elapsed)
+            by_variant.setdefault(variant, []).append(elapsed)
+    stats = summarize(latencies, time.perf_counter() - started)
+    stats['p50_ms_by_variant'] = {v: round(float(np.percentile(t, 50)) * 1000, 2) for v, t in by_variant.items()}
+    print(f"✅ {name}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, {stats['throughput_per_s']}/s")
+    return stats
+
+
+def bench_stages(variants, repeat):
+    init_ocr_worker()
+    template = TEMPLATE_STORE.by_name('Global Institute of Technology') or TEMPLATE_STORE.default
+    decoded = [(name, cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)) for name, data in variants.items()]
+    grays = [(name, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)) for name, image in decoded]
+
+    stages = {}
+    stages['extract_fields'] = time_stage('extract_fields', lambda gray: extract_fields(gray, template), grays, repeat)
+    stages['generate_ssim_heatmap'] = time_stage(
+        'generate_ssim_heatmap', lambda image: generate_ssim_heatmap(template.path, image, True, template.fields),
+        decoded, repeat)
+    records = [(name, extract_fields(gray, template)) for name, gray in grays]
+    # A single hash is microseconds; time blocks of 1000 for a stable reading
+    stages['generate_hash_x1000'] = time_stage(
+        'generate_hash (x1000)', lambda data: [generate_hash(data) for _ in range(1000)], records, repeat)
+    return stages
+
+
+def post_verify(client, url, filename, data):
+    if client is not None:
+        response = client.post('/ocr/verify', files={'file': (filename, data, 'application/octet-stream')})
+        return response.status_code
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(f'{url.rstrip("/")}/ocr/verify', data=body, method='POST',
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def bench_end_to_end(variants, requests, concurrency_levels, url=None):
+    names = list(variants)
+    uploads = [(names[i % len(names)], variants[names[i % len(names)]]) for i in range(requests)]
+    results = {}
+
+    def run(client):
+        for concurrency in concurrency_levels:
+            def one(item):
+                name, data = item
+                t0 = time.perf_counter()
+                status = post_verify(client, url, f'{name}.bin', unique_upload(data))
+                return time.perf_counter() - t0, status
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                outcomes = list(pool.map(one, uploads))
+            wall_time = time.perf_counter() - started
+            stats = summarize([t for t, _ in outcomes], wall_time)
+            stats['status_codes'] = {str(code): sum(1 for _, s in outcomes if s == code)
+                                     for code in sorted({s for _, s in outcomes})}
+            results[f'concurrency_{concurrency}'] = stats
+            print(f"✅ /ocr/verify x{concurrency}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+                  f"{stats['throughput_per_s']} req/s, status {stats['status_codes']}")
+
+    if url:
+        run(None)
+    else:
+        from fastapi.testclient import TestClient
+        with TestClient(main.app) as client:
+            # Pay for model loading and pool start-up before the clock starts
+            post_verify(client, None, 'warmup.png', unique_upload(variants['genuine']))
+            run(client)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path, max_regression):
+    """Print p50 changes against a baseline file; returns the regressed entries."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('commit')}):")
+    regressions = []
+    for section in ('stages', 'end_to_end'):
+        for name, stats in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before:
+                continue
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            flag = ''
+            if change > max_regression:
+                flag = '  ❌ regression'
+                regressions.append(name)
+            print(f"  {name:28s} p50 {before['p50_ms']:>9.2f} -> {stats['p50_ms']:>9.2f} ms ({change:+.1f}%){flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the certificate verification pipeline")
+    parser.add_argument('--reference', default=main.REFERENCE_IMAGE_PATH, help="image the variants are made from")
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the variants for the per-stage timings")
+    parser.add_argument('--requests', type=int, default=60, help="uploads per end-to-end concurrency level")
+    parser.add_argument('--concurrency', default='1,4,8', help="comma-separated end-to-end concurrency levels")
+    parser.add_argument('--url', help="benchmark a running server instead of the app in-process")
+    parser.add_argument('--skip-stages', action='store_true')
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--save-variants', metavar='DIR', help="also write the synthetic certificates here")
+    parser.add_argument('--output', help="result file (default: data/benchmark-<commit>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="earlier result file to compare against")
+    parser.add_argument('--max-regression', type=float, default=10.0, help="allowed p50 slowdown in percent")
+    return parser.parse_args(argv)
+
+
+def main_cli(args):
+    genuine = cv2.imread(args.reference)
+    if genuine is None:
+        sys.exit(f"❌ Reference image not found: {args.reference}")
+    TEMPLATE_STORE.load_manifest()
+    variants = make_variants(genuine)
+    if args.save_variants:
+        os.makedirs(args.save_variants, exist_ok=True)
+        for name, data in variants.items():
+            with open(os.path.join(args.save_variants, name + ('.jpg' if name == 'jpeg' else '.png')), 'wb') as f:
+                f.write(data)
+
+    commit = git_commit()
+    result = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'settings': {name: os.environ[name] for name in RECORDED_SETTINGS if name in os.environ},
+        'variants': sorted(variants),
+        'stages': {},
+        'end_to_end': {},
+    }
+    if not args.skip_stages:
+        result['stages'] = bench_stages(variants, args.repeat)
+    if not args.skip_end_to_end:
+        levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+        result['end_to_end'] = bench_end_to_end(variants, args.requests, levels, args.url)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    output = args.output or os.path.join('data', f"benchmark-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.compare and compare(result, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli(parse_args())
@@ -0,0 +1,220 @@
+"""
+Golden check and microbenchmark for full-page field extraction.
+
+    python benchmark_fields.py [--iterations N] [--golden FILE] [--edge-cases FILE]
+    python benchmark_fields.py --record ../test1.png ../test2.png ...
+
+The golden set (golden/fields.json) holds EasyOCR output recorded from
+the test certificates, with the fields a person reads off each one. The
+edge cases (golden/edge_cases.json) are hand-written OCR results for
+layouts EasyOCR has been seen to produce (split labels, glued colons,
+seal lettering); they are not recordings and are reported separately.
+The first run checks the field rules against every entry of both and
+exits non-zero on a mismatch. It then times the rules against the regex
+chain they replaced, on the golden inputs and on inputs built to make
+that chain backtrack.
+
+--record re-runs EasyOCR on the given images and stores its raw output
+in the golden file, keeping each entry's expected fields. Check those by
+eye before committing.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from field_rules import rule_set
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+GOLDEN_PATH = os.path.join(GOLDEN_DIR, 'fields.json')
+EDGE_CASES_PATH = os.path.join(GOLDEN_DIR, 'edge_cases.json')
+FIELDS = ['University Name', 'Certificate Holder Name', 'Course', 'Grade', 'Roll No', 'Certificate ID']
+LEGACY_TIMEOUT = 10.0  # seconds before a pathological legacy run is abandoned
+
+
+def empty_fields():
+    return {field: 'N/A' for field in FIELDS}
+
+
+def legacy_fields_from_ocr(results):
+    """The regex chain field_rules replaced, kept verbatim for comparison."""
+    extracted_data = empty_fields()
+    all_text = " ".join([text.strip() for (bbox, text, conf) in results if text.strip()])
+    text_lines = [text.strip() for (bbox, text, conf) in results if text.strip()]
+    uni_end_idx = 0
+    uni_start_idx = -1
+    for i, line in enumerate(text_lines):
+        if 'Institute' in line or 'University' in line or 'Technology' in line:
+            uni_start_idx = i
+            break
+    if uni_start_idx != -1:
+        uni_name_parts = [text_lines[uni_start_idx]]
+        uni_end_idx = uni_start_idx + 1
+        for i in range(uni_end_idx, min(uni_start_idx + 3, len(text_lines))):
+            next_line = text_lines[i].strip()
+            if len(next_line.split()) <= 4 and ('of' in next_line.lower() or 'technology' in next_line.lower()):
+                uni_name_parts.append(next_line)
+                uni_end_idx = i + 1
+            else:
+                break
+        extracted_data['University Name'] = " ".join(uni_name_parts).strip()
+    for i in range(uni_end_idx, len(text_lines)):
+        line = text_lines[i]
+        if len(line.split()) >= 2 and 'course' not in line.lower() and 'roll' not in line.lower() \
+                and 'id' not in line.lower() and 'successfully' not in line.lower():
+            extracted_data['Certificate Holder Name'] = line
+            break
+    roll_match = re.search(r'(?:Roll\s*Number|Roll\s*No)\s*[:\s]*(\S+)', all_text, re.IGNORECASE)
+    if roll_match:
+        extracted_data['Roll No'] = roll_match.group(1).strip()
+    id_match = re.search(r'(?:Certificate\s*ID|Cert\s*ID|ID\s*)\s*[:\s]*(\S+)', all_text, re.IGNORECASE)
+    if id_match:
+        extracted_data['Certificate ID'] = id_match.group(1).strip()
+    grade_match = re.search(r'(?:Grade\s*[-\s:]*|with\s*Grade\s*[-\s:]*)\s*(\S)', all_text, re.IGNORECASE)
+    if grade_match:
+        extracted_data['Grade'] = grade_match.group(1).strip()
+    course_match = re.search(r'completed the course of\s*(.*?)\s*(authorized by|with Grade)', all_text,
+                             re.IGNORECASE | re.DOTALL)
+    if course_match:
+        course_name = course_match.group(1).strip()
+        course_name = re.sub(r'(?:an\s+online\s+non-credit\s+course|a\s+non-credit\s+course)', '', course_name,
+                             flags=re.IGNORECASE).strip()
+        extracted_data['Course'] = course_name
+    if extracted_data['Course'] == 'N/A':
+        course_match_fallback = re.search(r'course of\s*([A-Z0-9\s]+)', all_text, re.IGNORECASE)
+        if course_match_fallback:
+            extracted_data['Course'] = course_match_fallback.group(1).strip()
+    return extracted_data
+
+
+def rules_fields_from_ocr(results):
+    return rule_set().extract(results, empty_fields())
+
+
+def pathological_inputs():
+    """OCR outputs that make the legacy regexes backtrack quadratically."""
+    def line(text, y):
+        return [[[0, y], [1000, y], [1000, y + 30], [0, y + 30]], text, 0.5]
+
+    return {
+        # Lazy DOTALL course match retried from every occurrence, none terminated
+        'unterminated_course': [line('has successfully completed the course of', 40 * i) for i in range(700)],
+        # \s*[:\s]* after a label over a long blank run with no value
+        'blank_after_label': [line('Roll Number' + ' ' * 8000 + ':', 0)],
+        # A long page of noise, for plain linear cost
+        'long_noise': [line(' '.join(f'w{j}' for j in range(40)), 40 * i) for i in range(500)],
+    }
+
+
+def time_per_call(fn, results, iterations):
+    fn(results)  # warm caches (compiled rule set, re module cache)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(results)
+    return (time.perf_counter() - started) / iterations
+
+
+def _timed_legacy(results, queue):
+    started = time.perf_counter()
+    legacy_fields_from_ocr(results)
+    queue.put(time.perf_counter() - started)
+
+
+def time_legacy_bounded(results, timeout=LEGACY_TIMEOUT):
+    """One legacy call in a child process; None if it ran past `timeout`."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_timed_legacy, args=(results, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return queue.get()
+
+
+def load_entries(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_golden(golden, label):
+    failures = 0
+    for entry in golden:
+        got = rules_fields_from_ocr(entry['ocr'])
+        legacy = legacy_fields_from_ocr(entry['ocr'])
+        wrong = {f: (got[f], entry['expected'][f]) for f in FIELDS if got[f] != entry['expected'][f]}
+        legacy_wrong = [f for f in FIELDS if legacy[f] != entry['expected'][f]]
+        status = '✅' if not wrong else '❌'
+        print(f"{status} {label:8s} {entry['image']:10s} {entry.get('note', '')}")
+        for field, (value, expected) in wrong.items():
+            print(f"     {field}: got {value!r}, expected {expected!r}")
+        if legacy_wrong:
+            print(f"     (legacy regexes get {', '.join(legacy_wrong)} wrong here)")
+        failures += bool(wrong)
+    return failures
+
+
+def record(images, golden_path):
+    import easyocr
+    reader = easyocr.Reader(['en'], gpu=False)
+    golden = load_entries(golden_path)
+    by_image = {entry['image']: entry for entry in golden}
+    for path in images:
+        name = os.path.basename(path)
+        results = [[[[int(x), int(y)] for x, y in bbox], text, float(conf)] for bbox, text, conf in reader.readtext(path)]
+        entry = by_image.setdefault(name, {'image': name, 'note': 'recorded',
+                                           'expected': rules_fields_from_ocr(results)})
+        entry['ocr'] = results
+        print(f"Recorded {len(results)} OCR result(s) for {name}")
+    with open(golden_path, 'w', encoding='utf-8') as f:
+        f.write('[\n' + ',\n'.join('  ' + json.dumps(e) for e in by_image.values()) + '\n]\n')
+
+
+def main(args):
+    if args.record:
+        record(args.record, args.golden)
+        return
+
+    golden = load_entries(args.golden)
+    edge_cases = load_entries(args.edge_cases)
+    print(f"Golden set: {len(golden)} recorded certificate(s) from {args.golden}, "
+          f"{len(edge_cases)} hand-written edge case(s) from {args.edge_cases}")
+    if not golden:
+        print("❌ No EasyOCR recordings yet; run with --record ../test1.png ... ../test6.png")
+    failures = check_golden(golden, 'recorded') + check_golden(edge_cases, 'edge')
+
+    print(f"\nPer call, mean of {args.iterations} (µs):")
+    print(f"  {'input':22s} {'rules':>10s} {'legacy':>10s}")
+    for label, entry in [('', e) for e in golden] + [('edge ', e) for e in edge_cases]:
+        rules = time_per_call(rules_fields_from_ocr, entry['ocr'], args.iterations)
+        legacy = time_per_call(legacy_fields_from_ocr, entry['ocr'], args.iterations)
+        print(f"  {label + entry['image']:22s} {rules * 1e6:10.1f} {legacy * 1e6:10.1f}")
+
+    print(f"\nPathological inputs, one call (ms; legacy abandoned after {LEGACY_TIMEOUT:.0f}s):")
+    for name, results in pathological_inputs().items():
+        rules = time_per_call(rules_fields_from_ocr, results, 3)
+        legacy = time_legacy_bounded(results)
+        legacy_text = f"{legacy * 1000:10.1f}" if legacy is not None else f"{'> timeout':>10s}"
+        print(f"  {name:22s} {rules * 1000:10.1f} {legacy_text}")
+
+    if failures:
+        sys.exit(f"❌ {failures} golden certificate(s) or edge case(s) extracted incorrectly")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Golden check and microbenchmark for field extraction")
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    parser.add_argument('--edge-cases', default=EDGE_CASES_PATH)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--record', nargs='+', metavar='IMAGE', help="re-record EasyOCR output for these images")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
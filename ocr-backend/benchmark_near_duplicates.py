@@ -0,0 +1,199 @@
+"""
+Lookup benchmark for the near-duplicate prefilter.
+
+    python benchmark_near_duplicates.py [--count N] [--queries N] [--template FILE]
+
+Renders N certificates on the template (genuine.png by default): a random
+name, roll number and certificate ID written into the manifest's field
+boxes, the rest of the page as issued. Each is stored in a
+NearDuplicateIndex (in a temporary SQLite file) as an upload would be: a
+PNG export, a JPEG re-encode or a downscaled copy.
+
+Queries are fresh copies of stored certificates made the way people
+resubmit them, one group per kind of copy, plus certificates that were
+never stored, which must not match:
+
+    reencode    JPEG at quality 40-90
+    resize      downscaled to 50-90%, then JPEG
+    brightness  brightness +-15 and contrast 0.9-1.1, then JPEG
+    rescan      shifted 2-8 pixels and downscaled, then JPEG, as a scanner
+                or phone camera moves the page
+    unseen      another certificate of the same template
+
+Reports, per group, recall (the stored original is the match), how often
+another stored certificate matched instead (main.py only reuses a verdict
+whose fields hash the same), median key distance and fingerprints read
+back from SQLite; the latency of the
+whole match() call, thumbnail check included; and the Python memory the
+in-memory index holds per entry. The template name, seal and margins are
+shared by every entry and cost nothing once their chunks saturate.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import near_duplicates
+from near_duplicates import NearDuplicateIndex
+from phash_index import hamming
+from template_store import TemplateStore
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'genuine.png')
+FIRST_NAMES = ['Aswath', 'Rohan', 'Priya', 'Neha', 'Arjun', 'Kavya', 'Ishaan', 'Meera', 'Vikram', 'Ananya',
+               'Sahil', 'Diya', 'Kunal', 'Tara', 'Yash', 'Riya', 'Aditya', 'Sneha', 'Omkar', 'Pooja']
+LAST_NAMES = ['Pillai', 'Shelke', 'Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Nair', 'Joshi', 'Kulkarni',
+              'Desai', 'Menon', 'Rao', 'Singh', 'Mahajan', 'Bhat', 'Chopra', 'Das', 'Kapoor', 'Verma']
+INK = (20, 20, 20)
+PAPER = (252, 252, 252)
+
+
+def field_boxes(template_path):
+    """Name, roll number and certificate ID boxes from the manifest entry for `template_path`."""
+    store = TemplateStore()
+    store.load_manifest()
+    for entry in store.entries():
+        if os.path.abspath(entry.path) == os.path.abspath(template_path):
+            return {name: entry.fields[name]['box'] for name in ('Certificate Holder Name', 'Roll No', 'Certificate ID')}
+    # genuine.png's boxes, for a template missing from the manifest
+    return {'Certificate Holder Name': [240, 420, 920, 120], 'Roll No': [260, 870, 400, 50],
+            'Certificate ID': [1480, 1300, 390, 60]}
+
+
+def render(template, boxes, rng: random.Random) -> np.ndarray:
+    image = template.copy()
+    values = {
+        'Certificate Holder Name': (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", 2.4, 5),
+        'Roll No': (f"Roll Number : {rng.randrange(10000, 99999)}", 0.9, 2),
+        'Certificate ID': (f"Certificate ID : {rng.choice('ABEGHKMT')}{rng.choice('ABEGHKMT')}"
+                           f"{rng.randrange(1000, 9999)}", 0.9, 2),
+    }
+    for field, (x, y, w, h) in boxes.items():
+        text, scale, thickness = values[field]
+        image[y:y + h, x:x + w] = PAPER
+        cv2.putText(image, text, (x + 10, y + int(h * 0.75)), cv2.FONT_HERSHEY_SIMPLEX, scale, INK, thickness,
+                    cv2.LINE_AA)
+    return image
+
+
+def jpeg(image, quality):
+    return cv2.imdecode(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+
+def downscale(image, factor):
+    h, w = image.shape[:2]
+    return cv2.resize(image, (int(w * factor), int(h * factor)), interpolation=cv2.INTER_AREA)
+
+
+def shift(image, dx, dy):
+    h, w = image.shape[:2]
+    return cv2.warpAffine(image, np.float32([[1, 0, dx], [0, 1, dy]]), (w, h), borderMode=cv2.BORDER_REPLICATE)
+
+
+def stored_copy(image, rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return image
+    if kind == 1:
+        return jpeg(image, rng.randint(70, 95))
+    return jpeg(downscale(image, rng.uniform(0.5, 0.9)), rng.randint(70, 95))
+
+
+COPIES = {
+    'reencode': lambda image, rng: jpeg(image, rng.randint(40, 90)),
+    'resize': lambda image, rng: jpeg(downscale(image, rng.uniform(0.5, 0.9)), rng.randint(60, 90)),
+    'brightness': lambda image, rng: jpeg(np.clip(image.astype(np.float32) * rng.uniform(0.9, 1.1)
+                                                  + rng.uniform(-15, 15), 0, 255).astype(np.uint8), 85),
+    'rescan': lambda image, rng: jpeg(downscale(shift(image, rng.choice([-1, 1]) * rng.uniform(2, 8),
+                                                      rng.choice([-1, 1]) * rng.uniform(2, 8)),
+                                                rng.uniform(0.6, 0.9)), rng.randint(60, 90)),
+}
+
+
+def gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=3000, help="certificates to store")
+    parser.add_argument('--queries', type=int, default=100, help="queries per group")
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    template = cv2.imread(args.template, cv2.IMREAD_COLOR)
+    if template is None:
+        print(f"❌ Could not read {args.template}")
+        return 1
+    boxes = field_boxes(args.template)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(path=os.path.join(directory, 'fingerprints.db'), enabled=True,
+                                   max_verdicts=args.count)
+        # (entry id, certificate number, stored fingerprint); certificates are
+        # rendered again for the queries so the images don't count as index memory
+        sample = []
+        certificate_rng = lambda i: random.Random(args.seed * 1_000_003 + i)
+        tracemalloc.start()
+        index_time = 0.0
+        for i in range(args.count):
+            certificate = render(template, boxes, certificate_rng(i))
+            probe = index.probe(gray(stored_copy(certificate, rng)))
+            del certificate
+            started = time.perf_counter()
+            entry_id = index.remember(probe, f"{i:064x}", {}, 'benchmark')
+            index_time += time.perf_counter() - started
+            if len(sample) < args.queries:
+                sample.append((entry_id, i, probe[0]))
+            elif rng.random() < args.queries / (i + 1):
+                sample[rng.randrange(args.queries)] = (entry_id, i, probe[0])
+        # Only what near_duplicates.py allocated: numpy imports some of its
+        # modules lazily on first use, which is not index memory
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, near_duplicates.__file__)])
+        index_bytes = sum(stat.size for stat in snapshot.statistics('filename'))
+        tracemalloc.stop()
+        print(f"Stored {len(index)} certificates ({args.count / index_time:,.0f} inserts/s); "
+              f"index holds {index_bytes / len(index):,.0f} B/entry "
+              f"(~{index_bytes / len(index) * 200_000 / 2 ** 20:,.0f} MB at 200k)")
+
+        latencies = []
+        print(f"\n  {'copy':12s} {'recall':>7s} {'other':>7s} {'distance':>9s} {'read':>7s}")
+        groups = [(name, copy) for name, copy in COPIES.items()] + [('unseen', None)]
+        for name, copy in groups:
+            hits, others, distances, candidates = 0, 0, [], []
+            for entry_id, i, fingerprint in sample:
+                if copy is None:
+                    query, entry_id = render(template, boxes, certificate_rng(args.count + i)), None
+                else:
+                    query = copy(render(template, boxes, certificate_rng(i)), rng)
+                probe = index.probe(gray(query))
+                if entry_id is not None:
+                    distances.append(hamming(probe[0], fingerprint))
+                with index._index_lock:
+                    candidates.append(len(index._index.candidates(probe[0], index.max_voted)))
+                started = time.perf_counter()
+                near = index.match(probe, 'benchmark')
+                latencies.append(time.perf_counter() - started)
+                hits += near is not None and near['id'] == entry_id if entry_id is not None else near is None
+                others += near is not None and near['id'] != entry_id
+            label = 'no match' if copy is None else f"{statistics.median(distances):9.0f}"
+            print(f"  {name:12s} {hits / len(sample):7.1%} {others / len(sample):7.1%} {label:>9s} "
+                  f"{statistics.mean(candidates):7.1f}")
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"\nmatch(): median {statistics.median(latencies) * 1e3:.2f} ms, p99 {p99 * 1e3:.2f} ms "
+          f"(radius {index.radius} bits, thumbnails of up to {index.max_candidates})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Offline bulk verification of a directory of certificate scans.
+
+    python bulk_verify.py SCANS_DIR OUT_DIR [--ocr-workers N] [--ssim-workers N]
+                          [--format csv|parquet] [--chunk-size N] [--heatmaps] [--chain]
+
+Scans flow through a pipeline: a thread pool decodes and hashes files,
+then every decoded image goes to a process pool for OCR (extract_fields)
+and, at the same time, to a second process pool for SSIM
+(generate_ssim_heatmap). Results are written to OUT_DIR in numbered chunk
+files as they complete. Each chunk file is written atomically, so the
+chunks double as the checkpoint: a rerun with the same OUT_DIR skips every
+scan already verified in them, retries the ones that failed, and carries
+on where the last run stopped.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+import main
+from main import TEMPLATE_STORE, TEMPLATES, extract_fields, generate_hash, generate_ssim_heatmap, init_ocr_worker
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp')
+DEFAULT_CHUNK_SIZE = 500
+PROGRESS_INTERVAL = 10.0  # seconds between throughput reports
+
+FIELDS = ['University Name', 'Certificate Holder Name', 'Course', 'Grade', 'Roll No', 'Certificate ID']
+COLUMNS = (['path', 'sha256'] + FIELDS +
+           ['template', 'template_match', 'ssim_score', 'alignment', 'hotspots',
+            'heatmap_filename', 'blockchain_hash', 'is_valid', 'error'])
+
+
+def find_scans(root):
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(paths)
+
+
+def decode_scan(root, rel_path):
+    """Decode stage (thread pool): read once, hash, decode colour and grayscale."""
+    with open(os.path.join(root, rel_path), 'rb') as f:
+        data = f.read()
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("not a readable image")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return hashlib.sha256(data).hexdigest(), image, gray
+
+
+def init_ssim_worker(template_paths):
+    # Templates decoded (and keypoints detected) in the parent are inherited
+    # on fork; this only matters where workers are spawned instead.
+    TEMPLATES.preload(*template_paths)
+
+
+class ChunkWriter:
+    """Writes result rows to OUT_DIR/results-NNNNN.{csv,parquet}, one atomic file per chunk."""
+
+    def __init__(self, out_dir, fmt, chunk_size):
+        self.out_dir = out_dir
+        self.format = fmt
+        self.chunk_size = max(1, chunk_size)
+        self.rows = []
+        os.makedirs(out_dir, exist_ok=True)
+        self.next_index = len(self._chunk_files())
+
+    def _chunk_files(self):
+        return sorted(glob.glob(os.path.join(self.out_dir, f"results-*.{self.format}")))
+
+    def done_paths(self):
+        """
+        Scan paths already verified by earlier runs: the resume checkpoint.
+        Error rows don't count, so a rerun retries scans that failed.
+        """
+        done = set()
+        for chunk in self._chunk_files():
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                table = pq.read_table(chunk, columns=['path', 'error']).to_pydict()
+                rows = zip(table['path'], table['error'])
+            else:
+                with open(chunk, newline='', encoding='utf-8') as f:
+                    rows = [(row['path'], row['error']) for row in csv.DictReader(f)]
+            done.update(path for path, error in rows if not error)
+        return done
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        path = os.path.join(self.out_dir, f"results-{self.next_index:05d}.{self.format}")
+        tmp_path = path + '.tmp'
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columns = {c: [None if r.get(c) is None else str(r.get(c)) for r in self.rows] for c in COLUMNS}
+            pq.write_table(pa.table(columns), tmp_path)
+        else:
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(self.rows)
+        os.replace(tmp_path, path)
+        self.next_index += 1
+        self.rows = []
+
+
+def result_row(rel_path, digest, fields, template, template_match, ssim, chain):
+    row = {'path': rel_path, 'sha256': digest, 'template': template.institution,
+           'template_match': template_match, 'error': ''}
+    row.update({field: fields.get(field, 'N/A') for field in FIELDS})
+    if ssim:
+        row.update({'ssim_score': round(ssim['ssim_score'], 6), 'alignment': ssim['alignment']['method'],
+                    'hotspots': len(ssim['hotspots']), 'heatmap_filename': ssim['heatmap_filename'] or ''})
+    row['blockchain_hash'] = generate_hash({field: row[field] for field in FIELDS})
+    row['is_valid'] = chain.contains(row['blockchain_hash']) if chain is not None else ''
+    return row
+
+
+def run(args):
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("❌ --format parquet needs pyarrow (pip install pyarrow)")
+
+    TEMPLATE_STORE.load_manifest()
+    template_paths = {entry.path for entry in TEMPLATE_STORE.entries()}
+    if TEMPLATE_STORE.default is not None:
+        template_paths.add(TEMPLATE_STORE.default.path)
+    TEMPLATES.preload(*template_paths)
+
+    chain = None
+    if args.chain:
+        chain = main.CHAIN_INDEX
+        print(f"Loaded {chain.refresh()} certificate hash(es) from the chain")
+
+    writer = ChunkWriter(args.out_dir, args.format, args.chunk_size)
+    done = writer.done_paths()
+    pending = [p for p in find_scans(args.scans_dir) if p not in done]
+    print(f"{len(done)} scan(s) already verified, {len(pending)} to go")
+    if not pending:
+        return
+
+    # Decoded images waiting for or inside OCR/SSIM are capped so memory
+    # stays flat however large the directory is.
+    max_in_flight = args.max_in_flight or 2 * (args.ocr_workers + args.ssim_workers)
+    queue = iter(pending)
+    decoding, in_pipeline = {}, {}
+    processed = failed = 0
+    started = last_report = time.perf_counter()
+
+    def fail(rel_path, error):
+        nonlocal failed
+        failed += 1
+        row = {c: '' for c in COLUMNS}
+        row.update({'path': rel_path, 'error': error})
+        writer.add(row)
+
+    with ThreadPoolExecutor(args.decode_threads) as decode_pool, \
+            ProcessPoolExecutor(args.ocr_workers, initializer=init_ocr_worker) as ocr_pool, \
+            ProcessPoolExecutor(args.ssim_workers, initializer=init_ssim_worker,
+                                initargs=(sorted(template_paths),)) as ssim_pool:
+
+        def refill():
+            while len(decoding) + len(in_pipeline) < max_in_flight:
+                rel_path = next(queue, None)
+                if rel_path is None:
+                    return
+                decoding[decode_pool.submit(decode_scan, args.scans_dir, rel_path)] = rel_path
+
+        # Rows finished before an interrupt (Ctrl-C, a crash) are written, not lost
+        try:
+            refill()
+            while decoding or in_pipeline:
+                running = list(decoding) + [f for entry in in_pipeline.values() for f in entry[:2] if not f.done()]
+                if running:
+                    wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+
+                # Decoded -> fan out to both pools
+                for future in [f for f in decoding if f.done()]:
+                    rel_path = decoding.pop(future)
+                    try:
+                        digest, image, gray = future.result()
+                    except Exception as e:
+                        fail(rel_path, f"decode: {e}")
+                        continue
+                    template, template_match = TEMPLATE_STORE.select(image=gray)
+                    ocr = ocr_pool.submit(extract_fields, gray, template)
+                    ssim = ssim_pool.submit(generate_ssim_heatmap, template.path, image, args.heatmaps, template.fields)
+                    in_pipeline[rel_path] = (ocr, ssim, digest, image, template, template_match)
+
+                # Both stages done -> one result row
+                for rel_path, (ocr, ssim, digest, image, template, template_match) in list(in_pipeline.items()):
+                    if not (ocr.done() and ssim.done()):
+                        continue
+                    del in_pipeline[rel_path]
+                    try:
+                        fields = ocr.result()
+                        named = TEMPLATE_STORE.by_name(fields.get('University Name'))
+                        if named is not None:
+                            if named.path != template.path:
+                                # OCR named a different institution than the phash guess
+                                ssim = ssim_pool.submit(generate_ssim_heatmap, named.path, image,
+                                                        args.heatmaps, named.fields)
+                            template, template_match = named, 'name'
+                        writer.add(result_row(rel_path, digest, fields, template, template_match, ssim.result(), chain))
+                        processed += 1
+                    except Exception as e:
+                        fail(rel_path, str(e))
+
+                refill()
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    total = processed + failed
+                    rate = total / (now - started)
+                    eta = (len(pending) - total) / rate if rate else float('inf')
+                    print(f"{total}/{len(pending)} scan(s), {rate:.2f} images/s, ETA {eta / 60:.1f} min")
+        finally:
+            writer.flush()
+
+    elapsed = time.perf_counter() - started
+    total = processed + failed
+    print(f"✅ Verified {processed} scan(s), {failed} failed, in {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:.2f} images/s); results in {args.out_dir}")
+
+
+def parse_args(argv=None):
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Verify a directory of certificate scans offline")
+    parser.add_argument('scans_dir')
+    parser.add_argument('out_dir', help="chunked results; reusing it resumes an interrupted run")
+    parser.add_argument('--ocr-workers', type=int, default=max(1, cpus - max(1, cpus // 4)))
+    parser.add_argument('--ssim-workers', type=int, default=max(1, cpus // 4))
+    parser.add_argument('--decode-threads', type=int, default=4)
+    parser.add_argument('--max-in-flight', type=int, default=0,
+                        help="decoded scans held at once (default: 2 x total workers)")
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--heatmaps', action='store_true', help="also render overlays into HEATMAP_FOLDER")
+    parser.add_argument('--chain', action='store_true', help="check each record hash against the chain index")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
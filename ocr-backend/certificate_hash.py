@@ -0,0 +1,22 @@
+import hashlib
+import json
+from typing import Dict
+
+
+def empty_fields() -> Dict[str, str]:
+    """The certificate fields the verifier hashes, each 'N/A' until read."""
+    return {
+        'University Name': 'N/A',
+        'Certificate Holder Name': 'N/A',
+        'Course': 'N/A',
+        'Grade': 'N/A',
+        'Roll No': 'N/A',
+        'Certificate ID': 'N/A'
+    }
+
+
+def generate_hash(data) -> str:
+    # Same canonical form as stableStringify() in scripts/*.js (compact
+    # separators, raw UTF-8) so Python and on-chain hashes agree.
+    sorted_data = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(sorted_data.encode('utf-8')).hexdigest()
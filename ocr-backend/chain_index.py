@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+CHAIN_RPC_URL = os.environ.get('CHAIN_RPC_URL', 'http://127.0.0.1:7545')
+CONTRACT_JSON_PATH = os.environ.get(
+    'CONTRACT_JSON_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'build', 'contracts', 'CertificateChain.json'),
+)
+CONTRACT_ADDRESS = os.environ.get('CONTRACT_ADDRESS')
+CHAIN_POLL_INTERVAL = float(os.environ.get('CHAIN_POLL_INTERVAL', 2))
+# On a miss the index catches up with the chain before answering, but not
+# more often than this, so a flood of junk uploads can't hammer the node.
+CHAIN_MISS_REFRESH_INTERVAL = float(os.environ.get('CHAIN_MISS_REFRESH_INTERVAL', 1))
+
+# (candidateHash, issuer) pairs as emitted by CertificateChain.CertificateAdded
+Event = Tuple[str, str]
+
+
+class InMemoryEventSource:
+    """
+    Stand-in for the chain in tests and offline runs.
+
+    Each emit() call behaves like a mined block containing one
+    CertificateAdded event.
+    """
+
+    def __init__(self, events: Iterable[Event] = ()):
+        self._events: List[Event] = list(events)
+        self._lock = threading.Lock()
+
+    def emit(self, candidate_hash: str, issuer: str = '0x0000000000000000000000000000000000000000'):
+        with self._lock:
+            self._events.append((candidate_hash, issuer))
+
+    def fetch_events(self, from_block: int) -> Tuple[List[Event], int]:
+        with self._lock:
+            return self._events[from_block:], len(self._events) - 1
+
+
+class Web3EventSource:
+    """Reads CertificateAdded logs from a node (Ganache in development)."""
+
+    EVENT = 'CertificateAdded'
+    SIGNATURE = 'CertificateAdded(string,address)'
+
+    def __init__(self, rpc_url: str = CHAIN_RPC_URL, contract_json_path: str = CONTRACT_JSON_PATH,
+                 contract_address: Optional[str] = CONTRACT_ADDRESS):
+        from web3 import Web3
+
+        with open(contract_json_path, 'r') as f:
+            self.artifact = json.load(f)
+
+        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+        self.address = Web3.to_checksum_address(contract_address) if contract_address else None
+        self.topic = self.w3.keccak(text=self.SIGNATURE)
+        self.contract = None
+        self._event = None
+        # An artifact compiled before the event was added can't decode its
+        # logs; say so once instead of failing every poll.
+        self.disabled = not any(entry.get('type') == 'event' and entry.get('name') == self.EVENT
+                                for entry in self.artifact.get('abi', []))
+        if self.disabled:
+            print(f"❌ {contract_json_path} has no {self.EVENT} event in its ABI; "
+                  f"recompile the contract (`truffle compile`). {self.EVENT} events are ignored until then.")
+
+    def _resolve_contract(self):
+        # Deferred until the first fetch so the server can start before Ganache does.
+        if self.address is None:
+            network_id = str(self.w3.net.version)
+            networks = self.artifact.get('networks', {})
+            if network_id not in networks:
+                raise RuntimeError(f"CertificateChain is not deployed on network {network_id}. Run `truffle migrate --reset`.")
+            self.address = self.w3.to_checksum_address(networks[network_id]['address'])
+        self.contract = self.w3.eth.contract(address=self.address, abi=self.artifact['abi'])
+        self._event = getattr(self.contract.events, self.EVENT)()
+
+    def fetch_events(self, from_block: int) -> Tuple[List[Event], int]:
+        if self.disabled:
+            return [], from_block - 1
+        if self._event is None:
+            self._resolve_contract()
+        latest = self.w3.eth.block_number
+        if from_block > latest:
+            return [], latest
+        logs = self.w3.eth.get_logs({
+            'address': self.address,
+            'topics': [self.topic],
+            'fromBlock': from_block,
+            'toBlock': latest,
+        })
+        decoded = [self._event.process_log(log)['args'] for log in logs]
+        return [self._as_event(args) for args in decoded], latest
+
+    def _as_event(self, args) -> Event:
+        return args['candidateHash'], args['issuer']
+
+
+class Web3RootSource(Web3EventSource):
+    """Reads RootAnchored logs: the Merkle roots of anchored certificate batches, as hex."""
+
+    EVENT = 'RootAnchored'
+    SIGNATURE = 'RootAnchored(bytes32,address,uint256)'
+
+    def _as_event(self, args) -> Event:
+        return bytes(args['root']).hex(), args['issuer']
+
+
+class ChainHashIndex:
+    """
+    In-memory set of every certificate hash issued on CertificateChain.
+
+    The index bootstraps from all CertificateAdded events and then follows
+    new blocks incrementally, so verifying a hash is a dict lookup instead
+    of a truffle subprocess that re-checks the whole CSV.
+    """
+
+    def __init__(self, source, poll_interval: float = CHAIN_POLL_INTERVAL,
+                 miss_refresh_interval: float = CHAIN_MISS_REFRESH_INTERVAL):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.miss_refresh_interval = miss_refresh_interval
+        self._issuers: Dict[str, str] = {}
+        self._next_block = 0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.ready = False
+        self.refresh_failures = 0  # RPC errors while fetching events
+
+    def __len__(self):
+        return len(self._issuers)
+
+    def __contains__(self, candidate_hash: str) -> bool:
+        # Known as of the last refresh; unlike contains(), never polls the node
+        return candidate_hash in self._issuers
+
+    def refresh(self) -> int:
+        """Pull events mined since the last refresh. Returns how many were added."""
+        with self._lock:
+            events, last_block = self.source.fetch_events(self._next_block)
+            before = len(self._issuers)
+            for candidate_hash, issuer in events:
+                self._issuers.setdefault(candidate_hash, issuer)
+            self._next_block = max(self._next_block, last_block + 1)
+            self._last_refresh = time.monotonic()
+            self.ready = True
+            return len(self._issuers) - before
+
+    def issuer_of(self, candidate_hash: str) -> Optional[str]:
+        issuer = self._issuers.get(candidate_hash)
+        if issuer is None and time.monotonic() - self._last_refresh >= self.miss_refresh_interval:
+            # The certificate may have been issued after our last poll.
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Error refreshing chain index: {e}")
+            issuer = self._issuers.get(candidate_hash)
+        return issuer
+
+    def contains(self, candidate_hash: str) -> bool:
+        return self.issuer_of(candidate_hash) is not None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._follow, name='chain-index', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _follow(self):
+        while not self._stop.is_set():
+            try:
+                added = self.refresh()
+                if added:
+                    print(f"🔗 Chain index: +{added} hash(es), {len(self)} total")
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Error following chain events: {e}")
+            self._stop.wait(self.poll_interval)
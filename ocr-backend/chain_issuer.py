@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from chain_index import InMemoryEventSource, Web3EventSource, Web3RootSource
+
+# ====================================================================
+# CONFIGURATION
+# addBatch stores a Certificate struct per new hash (a 64-character
+# string, a timestamp and the issuer: five fresh storage slots) and emits
+# an event, roughly 120k gas each. Batches are sized to ISSUE_BATCH_GAS,
+# which has to stay under the block gas limit (6,721,975 on Ganache).
+# ISSUE_ACCOUNT defaults to the node's first unlocked account, as truffle
+# does for scripts/hashAndUpload.js. anchorRoot stores one fixed-size
+# record whatever the batch size, so its gas is flat.
+# ====================================================================
+ISSUE_BATCH_GAS = int(os.environ.get('ISSUE_BATCH_GAS', 6_000_000))
+ISSUE_ACCOUNT = os.environ.get('ISSUE_ACCOUNT')
+ISSUE_RECEIPT_TIMEOUT = float(os.environ.get('ISSUE_RECEIPT_TIMEOUT', 300))
+GAS_PER_HASH_GUESS = 120_000  # until the first estimate comes back
+STUB_BLOCK_GAS_LIMIT = 6_721_975
+STUB_TX_GAS = 21_000
+STUB_ANCHOR_GAS = 90_000
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+
+class Web3Issuer(Web3EventSource):
+    """
+    Sends CertificateChain.addBatch and anchorRoot transactions from an
+    unlocked account. Also an event source, so a ChainHashIndex over it sees what is issued.
+
+    Nonces are assigned here, not by the node, so several transactions can
+    be in flight at once and still be mined in submission order.
+    """
+
+    def __init__(self, account: Optional[str] = ISSUE_ACCOUNT, **kwargs):
+        super().__init__(**kwargs)
+        self.account = account
+        self._nonce = None
+        self._source_args = kwargs
+
+    def root_source(self) -> Web3RootSource:
+        """Event source for the roots this contract has anchored."""
+        return Web3RootSource(**self._source_args)
+
+    def _ready(self):
+        if self.contract is None:
+            self._resolve_contract()
+        if self.account is None:
+            self.account = self.w3.eth.accounts[0]
+        self.account = self.w3.to_checksum_address(self.account)
+        if self._nonce is None:
+            self._nonce = self.w3.eth.get_transaction_count(self.account, 'pending')
+
+    def block_gas_limit(self) -> int:
+        return self.w3.eth.get_block('latest')['gasLimit']
+
+    def estimate_gas(self, hashes: List[str]) -> int:
+        self._ready()
+        return self.contract.functions.addBatch(hashes).estimate_gas({'from': self.account})
+
+    def send(self, hashes: List[str], gas: int) -> str:
+        self._ready()
+        return self._transact(self.contract.functions.addBatch(hashes), gas)
+
+    def estimate_anchor_gas(self, root: str, count: int) -> int:
+        self._ready()
+        return self.contract.functions.anchorRoot(bytes.fromhex(root), count).estimate_gas({'from': self.account})
+
+    def send_anchor(self, root: str, count: int, gas: int) -> str:
+        self._ready()
+        return self._transact(self.contract.functions.anchorRoot(bytes.fromhex(root), count), gas)
+
+    def _transact(self, call, gas: int) -> str:
+        tx_hash = call.transact({'from': self.account, 'nonce': self._nonce, 'gas': gas})
+        self._nonce += 1
+        return tx_hash.hex()
+
+    def wait(self, tx: str) -> Tuple[int, int]:
+        """Block until `tx` is mined; returns (block number, gas used)."""
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx, timeout=ISSUE_RECEIPT_TIMEOUT)
+        if receipt['status'] != 1:
+            raise RuntimeError(f"Transaction {tx} reverted in block {receipt['blockNumber']}")
+        return receipt['blockNumber'], receipt['gasUsed']
+
+
+class StubIssuer(InMemoryEventSource):
+    """
+    CertificateChain without a node, for tests and rehearsals: addBatch
+    semantics (hashes already held are skipped), anchorRoot (a root is
+    anchored once), a flat gas model with a block gas limit, and an
+    optional mining delay so in-flight batching behaves as it would
+    against Ganache. With `path` the issued hashes are kept in a text
+    file, one per line ("root <root> <count>" for anchors), so interrupted
+    runs can resume.
+    """
+
+    def __init__(self, path: Optional[str] = None, mine_delay: float = 0.0,
+                 gas_per_hash: int = GAS_PER_HASH_GUESS, block_gas_limit: int = STUB_BLOCK_GAS_LIMIT):
+        issued, roots = [], []
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and parts[0] == 'root':
+                        roots.append(parts[1])
+                    elif parts:
+                        issued.append(parts[0])
+        super().__init__((h, ZERO_ADDRESS) for h in issued)
+        self.roots = InMemoryEventSource((r, ZERO_ADDRESS) for r in roots)
+        self.path = path
+        self.mine_delay = mine_delay
+        self.gas_per_hash = gas_per_hash
+        self.gas_limit = block_gas_limit
+        self._held = set(issued)
+        self._anchored = set(roots)
+        self._sent = {}
+        self._mine_lock = threading.Lock()
+
+    def root_source(self) -> InMemoryEventSource:
+        return self.roots
+
+    def block_gas_limit(self) -> int:
+        return self.gas_limit
+
+    def estimate_gas(self, hashes: List[str]) -> int:
+        return STUB_TX_GAS + self.gas_per_hash * len(hashes)
+
+    def send(self, hashes: List[str], gas: int) -> str:
+        needed = self.estimate_gas(hashes)
+        if needed > self.gas_limit:
+            raise ValueError(f"addBatch of {len(hashes)} hash(es) needs {needed} gas, over the block limit")
+        if gas < needed:
+            raise ValueError(f"out of gas: {gas} < {needed}")
+        return self._submit(self._mine_batch, list(hashes), needed)
+
+    def estimate_anchor_gas(self, root: str, count: int) -> int:
+        if root in self._anchored:
+            raise ValueError(f"root {root} is already anchored")
+        return STUB_TX_GAS + STUB_ANCHOR_GAS
+
+    def send_anchor(self, root: str, count: int, gas: int) -> str:
+        needed = self.estimate_anchor_gas(root, count)
+        if gas < needed:
+            raise ValueError(f"out of gas: {gas} < {needed}")
+        return self._submit(self._mine_anchor, (root, count), needed)
+
+    def _submit(self, mine, payload, gas) -> str:
+        tx = '0x' + uuid.uuid4().hex
+        self._sent[tx] = (time.monotonic() + self.mine_delay, mine, payload, gas)
+        return tx
+
+    def wait(self, tx: str) -> Tuple[int, int]:
+        ready_at, mine, payload, gas = self._sent.pop(tx)
+        time.sleep(max(0.0, ready_at - time.monotonic()))
+        with self._mine_lock:
+            return mine(payload), gas
+
+    def _mine_batch(self, hashes: List[str]) -> int:
+        new = [h for h in hashes if h not in self._held]
+        self._held.update(new)
+        for candidate_hash in new:
+            self.emit(candidate_hash)
+        self._append(''.join(h + '\n' for h in new))
+        return len(self._events) - 1
+
+    def _mine_anchor(self, anchor: Tuple[str, int]) -> int:
+        root, count = anchor
+        if root in self._anchored:
+            raise RuntimeError(f"anchorRoot({root}) reverted: Already anchored!")
+        self._anchored.add(root)
+        self.roots.emit(root)
+        self._append(f"root {root} {count}\n")
+        return len(self.roots._events) - 1
+
+    def _append(self, lines: str):
+        if self.path and lines:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
@@ -0,0 +1,113 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Box as (x, y, width, height) in template pixel coordinates.
+Box = Tuple[int, int, int, int]
+
+
+class FieldSpec:
+    """
+    Where one field sits on a template and how to read it.
+
+    `lines` splits the box into that many equal horizontal strips, because
+    EasyOCR's recogniser reads a single line of text per crop. `pattern`,
+    if given, is searched in the recognised text and its first group is
+    the field value; otherwise the whole text is.
+    """
+
+    def __init__(self, name: str, box: Box, lines: int = 1, pattern: Optional[str] = None):
+        self.name = name
+        self.box = tuple(int(v) for v in box)
+        self.lines = max(1, int(lines))
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+
+    def line_boxes(self) -> List[Box]:
+        x, y, w, h = self.box
+        step = h / self.lines
+        return [(x, int(round(y + i * step)), w, int(round(step))) for i in range(self.lines)]
+
+    def value_from(self, text: str) -> str:
+        text = ' '.join(text.split())
+        if self.pattern is not None:
+            match = self.pattern.search(text)
+            text = match.group(1).strip() if match else ''
+        return text or 'N/A'
+
+
+class FieldLayout:
+    """
+    Field positions for one template. extract() reads only those crops with
+    EasyOCR's recogniser, skipping full-page text detection entirely.
+    """
+
+    def __init__(self, fields: Dict[str, dict]):
+        self.fields = [FieldSpec(name, **spec) for name, spec in fields.items()]
+
+    def __bool__(self):
+        return bool(self.fields)
+
+    def _crops(self, size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        # Unique line boxes as EasyOCR horizontal_list entries
+        # [x_min, x_max, y_min, y_max], clipped to the image.
+        width, height = size
+        crops = []
+        for spec in self.fields:
+            for x, y, w, h in spec.line_boxes():
+                crop = (max(0, x), min(width, x + w), max(0, y), min(height, y + h))
+                if crop not in crops:
+                    crops.append(crop)
+        return crops
+
+    def extract(self, reader, aligned_gray: np.ndarray) -> Dict[str, str]:
+        """`aligned_gray` must already be in template coordinates."""
+        return self.extract_scored(reader, aligned_gray)[0]
+
+    def extract_scored(self, reader, aligned_gray: np.ndarray) -> Tuple[Dict[str, str], Dict[str, float]]:
+        """extract(), plus each field's lowest strip confidence (0.0 if nothing was read)."""
+        height, width = aligned_gray.shape[:2]
+        crops = self._crops((width, height))
+        results = reader.recognize(aligned_gray, horizontal_list=[list(c) for c in crops],
+                                   free_list=[], detail=1, paragraph=False)
+
+        # recognize() sorts its crops by position, so match results back to
+        # our boxes by their top-left corner.
+        read_at = {}
+        for bbox, text, conf in results:
+            read_at[(int(bbox[0][0]), int(bbox[0][1]))] = (text, float(conf))
+
+        values, confidence = {}, {}
+        for spec in self.fields:
+            parts, confs = [], []
+            for x, y, w, h in spec.line_boxes():
+                text, conf = read_at.get((max(0, x), max(0, y)), ('', 0.0))
+                if text:
+                    parts.append(text)
+                    confs.append(conf)
+            values[spec.name] = spec.value_from(' '.join(parts))
+            confidence[spec.name] = min(confs) if confs and values[spec.name] != 'N/A' else 0.0
+        return values, confidence
+
+
+_LAYOUTS: Dict[str, FieldLayout] = {}
+
+
+def layout_for(fields: Dict[str, dict]) -> FieldLayout:
+    """The compiled FieldLayout for a template's field specs, built once per process."""
+    key = json.dumps(fields, sort_keys=True)
+    layout = _LAYOUTS.get(key)
+    if layout is None:
+        layout = _LAYOUTS[key] = FieldLayout(fields)
+    return layout
+
+
+def align_to_template(gray: np.ndarray, reference) -> np.ndarray:
+    """
+    Bring an upload into template coordinates by registering it onto the
+    ReferenceTemplate `reference` (a plain resize if registration fails).
+    """
+    aligned, _ = reference.align(gray)
+    return aligned
@@ -0,0 +1,330 @@
+import bisect
+import itertools
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# ====================================================================
+# CONFIGURATION
+# The rules that recover certificate fields from full-page OCR output.
+# A template can override any of them with a "rules" object in the
+# manifest; rule kinds:
+#   heading  first line containing one of `keywords`, plus up to
+#            `max_continuation` short lines that contain `continue_words`
+#            and sit under it, at least `min_height_ratio` as tall (so
+#            small print such as a seal's lettering is not taken for a
+#            wrapped name)
+#   name     the tallest line of at least `min_words` words between the
+#            heading and `before`, skipping lines with `exclude` words
+#   label    the token after one of the `labels` phrases (separators
+#            skipped); `chars` keeps only that many characters, and
+#            `value` must fully match it
+#   span     the text between `start` and the nearest following `stop`
+#            phrase, minus any `remove` phrases; with no stop, the rest of
+#            the line
+# Phrases are matched on whole tokens, case-insensitively.
+# ====================================================================
+DEFAULT_RULES = {
+    'University Name': {'kind': 'heading', 'keywords': ['institute', 'university', 'technology', 'college'],
+                        'continue_words': ['of', 'technology'], 'max_continuation': 2, 'min_height_ratio': 0.6},
+    'Certificate Holder Name': {'kind': 'name', 'min_words': 2, 'before': ['has successfully', 'completed the'],
+                                'exclude': ['course', 'roll', 'id', 'successfully', 'certificate']},
+    'Roll No': {'kind': 'label', 'labels': ['roll number', 'roll no', 'rollno']},
+    'Certificate ID': {'kind': 'label', 'labels': ['certificate id', 'cert id', 'certificateid', 'id']},
+    'Grade': {'kind': 'label', 'labels': ['with grade', 'grade'], 'chars': 1},
+    'Course': {'kind': 'span', 'start': ['completed the course of', 'course of'],
+               'stop': ['authorized by', 'with grade'],
+               'remove': ['an online non-credit course', 'a non-credit course', 'an online non-credit']},
+}
+
+# Values are read from single tokens, so no pattern ever sees more than
+# this many characters, whatever the OCR produced.
+MAX_TOKEN_CHARS = 64
+SEPARATORS = {':', '-'}
+
+# One linear scan: runs of non-space, non-separator characters, or a
+# single separator.
+_TOKEN_RE = re.compile(r'[^\s:\-]+|[:\-]')
+_WORD_RE = re.compile(r'\S{1,%d}' % MAX_TOKEN_CHARS)
+
+
+class Line:
+    __slots__ = ('text', 'left', 'right', 'height', 'conf')
+
+    def __init__(self, text: str, left: float, right: float, height: float, conf: float = 1.0):
+        self.text = text
+        self.left, self.right, self.height = left, right, height
+        self.conf = conf
+
+    def keys(self) -> Tuple[str, ...]:
+        return _phrase(self.text)
+
+
+def _key(token: str) -> str:
+    return token.lower().rstrip('.')
+
+
+def _phrase(text: str) -> Tuple[str, ...]:
+    return tuple(_key(token) for token in _TOKEN_RE.findall(text))
+
+
+def reading_order(results) -> List[Line]:
+    """
+    The non-empty OCR results as Lines in reading order: rows by vertical
+    centre (boxes whose centres are within half a line height share a
+    row), left to right within a row.
+    """
+    items = []
+    for result in results:
+        bbox, text = result[0], result[1]
+        text = text.strip()
+        if not text:
+            continue
+        conf = float(result[2]) if len(result) > 2 else 1.0
+        if bbox:
+            xs, ys = zip(*bbox)
+            top, bottom = min(ys), max(ys)
+            items.append(((top + bottom) / 2, Line(text, min(xs), max(xs), bottom - top, conf)))
+        else:
+            items.append((0, Line(text, 0, 0, 0, conf)))
+    if not items:
+        return []
+    heights = sorted(line.height for _, line in items)
+    tolerance = max(1.0, heights[len(heights) // 2] / 2)
+
+    items.sort(key=lambda item: item[0])
+    ordered, row, row_centre = [], [], None
+    for centre, line in items:
+        if row and centre - row_centre > tolerance:
+            row.sort(key=lambda r: r.left)
+            ordered.extend(row)
+            row = []
+        if not row:
+            row_centre = centre
+        row.append(line)
+    row.sort(key=lambda r: r.left)
+    ordered.extend(row)
+    return ordered
+
+
+class RuleSet:
+    """
+    Field rules compiled into one phrase table, applied in a single pass.
+
+    Every phrase any rule looks for (labels, span starts and stops, name
+    sentinels) is indexed by its first token. extract() tokenises the page
+    with one backtracking-free pattern, then visits only the tokens that
+    can start a phrase; matching cost is linear in the OCR output. Value
+    patterns only ever see a single word of at most MAX_TOKEN_CHARS.
+    """
+
+    def __init__(self, rules: Dict[str, dict]):
+        self.rules = rules
+        self.heading = self.name = None
+        self.labels, self.spans = [], []
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], str, object]]] = {}
+
+        for field, rule in rules.items():
+            kind = rule['kind']
+            if kind == 'heading':
+                self.heading = (field, {w.lower() for w in rule['keywords']},
+                                {w.lower() for w in rule.get('continue_words', ())}, rule.get('max_continuation', 2),
+                                rule.get('min_height_ratio', 0.0))
+            elif kind == 'name':
+                self.name = (field, rule.get('min_words', 2), {w.lower() for w in rule.get('exclude', ())})
+                for phrase in rule.get('before', ()):
+                    self._index(phrase, 'before', field)
+            elif kind == 'label':
+                value = re.compile(rule['value']) if rule.get('value') else None
+                spec = (field, rule.get('chars'), value)
+                self.labels.append(field)
+                for phrase in rule['labels']:
+                    self._index(phrase, 'label', spec)
+            elif kind == 'span':
+                self.spans.append(field)
+                for phrase in rule['start']:
+                    self._index(phrase, 'start', field)
+                for phrase in rule.get('stop', ()):
+                    self._index(phrase, 'stop', field)
+                for phrase in rule.get('remove', ()):
+                    self._index(phrase, 'remove', field)
+            else:
+                raise ValueError(f"Unknown rule kind {kind!r} for field {field!r}")
+
+        # Longest phrase first, so 'roll number' wins over 'roll'
+        for candidates in self._phrases.values():
+            candidates.sort(key=lambda c: -len(c[0]))
+
+    def _index(self, phrase: str, role: str, spec):
+        tokens = _phrase(phrase)
+        if tokens:
+            self._phrases.setdefault(tokens[0], []).append((tokens, role, spec))
+
+    def extract(self, results, empty: Dict[str, str]) -> Dict[str, str]:
+        """Fields from EasyOCR's (bbox, text, conf) list; unfound fields keep `empty`'s values."""
+        return self.extract_scored(results, empty)[0]
+
+    def extract_scored(self, results, empty: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, float]]:
+        """
+        extract(), plus each field's OCR confidence: the lowest confidence
+        of the boxes its value was read from, 0.0 for fields not found.
+        """
+        extracted = dict(empty)
+        confidence = {field: 0.0 for field in empty}
+        lines = reading_order(results)
+        if not lines:
+            return extracted, confidence
+
+        # Tokenise the whole page in one pass of the compiled pattern;
+        # token offsets are only read where a phrase matched. Lowercasing
+        # never turns a character into whitespace or a separator, so both
+        # passes produce the same tokens.
+        page = '\n'.join(line.text for line in lines)
+        matches = list(_TOKEN_RE.finditer(page))
+        keys = [token.rstrip('.') for token in _TOKEN_RE.findall(page.lower())]
+        line_starts = list(itertools.accumulate((len(line.text) + 1 for line in lines[:-1]), initial=0))
+
+        def line_at(offset):
+            return bisect.bisect_right(line_starts, offset) - 1
+
+        found_labels = {}
+        span_open = {}     # field -> token index where its text starts
+        span_text = {}     # field -> (start offset, end offset)
+        removed = []       # (start offset, end offset) of 'remove' phrases
+        name_end = None    # first line of the sentinel that ends the name search
+
+        # A phrase can play several roles ('with grade' labels Grade and
+        # ends Course), so every match at a position is applied. Each field
+        # keeps its first (and, at one position, longest) match.
+        phrases = self._phrases
+        for i in [i for i, key in enumerate(keys) if key in phrases]:
+            for phrase, role, spec in phrases[keys[i]]:
+                length = len(phrase)
+                if length > 1 and tuple(keys[i:i + length]) != phrase:
+                    continue
+                if role == 'label':
+                    if spec[0] not in found_labels:
+                        found = self._label_value(keys, matches, i + length, page, spec)
+                        if found is not None:
+                            found_labels[spec[0]] = found
+                elif role == 'start':
+                    if spec not in span_open and spec not in span_text:
+                        span_open[spec] = i + length
+                elif role == 'stop':
+                    if spec in span_open and span_open[spec] <= i:
+                        first = span_open.pop(spec)
+                        span_text[spec] = (matches[first].start(), matches[i].start())
+                elif role == 'remove':
+                    removed.append((matches[i].start(), matches[i + length - 1].end()))
+                elif role == 'before' and name_end is None:
+                    name_end = line_at(matches[i].start())
+
+        # Spans that never met a stop phrase run to the end of their line
+        for field, first in span_open.items():
+            if first < len(matches):
+                start = matches[first].start()
+                end = page.find('\n', start)
+                span_text[field] = (start, end if end != -1 else len(page))
+
+        for field, (start, end) in span_text.items():
+            text = ''.join(page[a:b] for a, b in _subtract((start, end), removed))
+            text = ' '.join(text.split())
+            if text:
+                extracted[field] = text
+                confidence[field] = min(line.conf for line in lines[line_at(start):line_at(end - 1) + 1])
+        for field, (value, offset) in found_labels.items():
+            extracted[field] = value
+            confidence[field] = lines[line_at(offset)].conf
+
+        heading_end = self._heading(lines, extracted, confidence)
+        self._name(lines, heading_end, name_end, extracted, confidence)
+        return extracted, confidence
+
+    def _label_value(self, keys, matches, j, page, spec) -> Optional[Tuple[str, int]]:
+        """The value after a label and its page offset, or None."""
+        _, chars, pattern = spec
+        while j < len(keys) and keys[j] in SEPARATORS:
+            j += 1
+        if j >= len(keys):
+            return None
+        # The value is the whole whitespace-delimited word (so "ET-24/23"
+        # survives), capped so nothing downstream sees unbounded input.
+        offset = matches[j].start()
+        value = _WORD_RE.match(page, offset).group()
+        if chars:
+            value = value[:chars]
+        if pattern is not None and not pattern.fullmatch(value):
+            return None
+        return (value, offset) if value else None
+
+    def _heading(self, lines, extracted, confidence) -> int:
+        """Fill the heading field; returns the index of the first line after it."""
+        if self.heading is None:
+            return 0
+        field, keywords, continue_words, max_continuation, min_height_ratio = self.heading
+        for index, line in enumerate(lines):
+            if not keywords.isdisjoint(line.keys()):
+                parts, conf, end = [line.text], line.conf, index + 1
+                for nxt in lines[index + 1:index + 1 + max_continuation]:
+                    below = nxt.left < line.right and line.left < nxt.right
+                    if len(nxt.text.split()) <= 4 and not continue_words.isdisjoint(nxt.keys()) \
+                            and below and \
+                            nxt.height >= min_height_ratio * line.height:
+                        parts.append(nxt.text)
+                        conf = min(conf, nxt.conf)
+                        end += 1
+                    else:
+                        break
+                extracted[field] = ' '.join(parts)
+                confidence[field] = conf
+                return end
+        return 0
+
+    def _name(self, lines, start, end, extracted, confidence):
+        if self.name is None:
+            return
+        field, min_words, exclude = self.name
+
+        def eligible(line):
+            return len(line.text.split()) >= min_words and exclude.isdisjoint(line.keys())
+
+        # Names are set larger than the surrounding text: take the tallest
+        # eligible line before the sentinel, else the first eligible line.
+        window = lines[start:end] if end is not None and end > start else []
+        candidates = [line for line in window if eligible(line)]
+        chosen = max(candidates, key=lambda line: line.height) if candidates else \
+            next((line for line in lines[start:] if eligible(line)), None)
+        if chosen is not None:
+            extracted[field] = chosen.text
+            confidence[field] = chosen.conf
+
+
+def _subtract(span: Tuple[int, int], holes: List[Tuple[int, int]]):
+    """Pieces of [start, end) left after cutting out `holes`."""
+    start, end = span
+    pieces, cursor = [], start
+    for a, b in sorted(holes):
+        if b <= cursor or a >= end:
+            continue
+        if a > cursor:
+            pieces.append((cursor, a))
+        cursor = max(cursor, b)
+    if cursor < end:
+        pieces.append((cursor, end))
+    return pieces
+
+
+_COMPILED: Dict[str, RuleSet] = {}
+
+
+def rule_set(overrides: Optional[Dict[str, dict]] = None) -> RuleSet:
+    """
+    The compiled RuleSet for DEFAULT_RULES with a template's overrides.
+    Compiled once per distinct rule set per process: templates reach the
+    pool workers pickled, so the cache is keyed by content, not identity.
+    """
+    key = json.dumps(overrides, sort_keys=True) if overrides else ''
+    compiled = _COMPILED.get(key)
+    if compiled is None:
+        compiled = _COMPILED[key] = RuleSet({**DEFAULT_RULES, **(overrides or {})})
+    return compiled
@@ -0,0 +1,60 @@
+import threading
+
+import cv2
+import numpy as np
+
+HEATMAP_BLUR_KERNEL = (51, 51)
+HEATMAP_ALPHA = 0.3
+
+# 256-entry BGR jet lookup table, built once. cv2.applyColorMap with a
+# user LUT is a single table lookup per pixel on a uint8 map, instead of
+# matplotlib's float64 RGBA colormap evaluation.
+JET_LUT = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_JET)
+
+_buffers = threading.local()
+
+
+def _buffer(name: str, shape, dtype) -> np.ndarray:
+    # Per-thread scratch arrays, reused while the image size stays the same.
+    cache = getattr(_buffers, 'arrays', None)
+    if cache is None:
+        cache = _buffers.arrays = {}
+    buf = cache.get(name)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = cache[name] = np.empty(shape, dtype)
+    return buf
+
+
+def quantize_ssim_map(ssim_map: np.ndarray) -> np.ndarray:
+    """
+    Normalise, invert and blur an SSIM map into a uint8 dissimilarity map
+    (255 = least similar), the same shaping the jet overlay always used.
+    """
+    low, high = float(ssim_map.min()), float(ssim_map.max())
+    span = high - low
+    inverted = _buffer('inverted', ssim_map.shape, np.float32)
+    if span > 0:
+        # (high - m) / span == 1 - normalised map
+        np.subtract(high, ssim_map, out=inverted, casting='unsafe')
+        inverted *= 1.0 / span
+    else:
+        inverted.fill(0)
+    cv2.GaussianBlur(inverted, HEATMAP_BLUR_KERNEL, 0, dst=inverted)
+    quantized = _buffer('quantized', ssim_map.shape, np.uint8)
+    cv2.convertScaleAbs(inverted, dst=quantized, alpha=255.0)
+    return quantized
+
+
+def render_overlay(test_bgr: np.ndarray, ssim_map: np.ndarray, alpha: float = HEATMAP_ALPHA) -> np.ndarray:
+    """
+    Blend a jet heatmap of `ssim_map` over `test_bgr` (BGR, same size).
+
+    The returned array is a per-thread buffer that the next call reuses, so
+    encode or copy it before rendering again.
+    """
+    quantized = quantize_ssim_map(ssim_map)
+    colored = _buffer('colored', test_bgr.shape, np.uint8)
+    cv2.applyColorMap(quantized, JET_LUT, dst=colored)
+    overlay = _buffer('overlay', test_bgr.shape, np.uint8)
+    cv2.addWeighted(test_bgr, 1.0 - alpha, colored, alpha, 0, dst=overlay)
+    return overlay
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
+
+# ====================================================================
+# CONFIGURATION
+# HEATMAP_FORMAT is 'jpeg' (default: ~4x faster to encode and ~4x smaller
+# than PNG for a blended overlay), 'webp' (smallest, slowest) or 'png'.
+# The janitor deletes heatmaps older than HEATMAP_TTL seconds, then the
+# oldest ones until the store is under HEATMAP_MAX_BYTES. It only touches
+# the shard directories it writes; older files at the top of the folder
+# (some of them tracked in git) are left alone.
+# ====================================================================
+HEATMAP_FORMAT = os.environ.get('HEATMAP_FORMAT', 'jpeg')
+HEATMAP_QUALITY = int(os.environ.get('HEATMAP_QUALITY', 85))
+HEATMAP_TTL = float(os.environ.get('HEATMAP_TTL', 7 * 24 * 3600))
+HEATMAP_MAX_BYTES = int(os.environ.get('HEATMAP_MAX_BYTES', 1024 * 1024 * 1024))
+HEATMAP_JANITOR_INTERVAL = float(os.environ.get('HEATMAP_JANITOR_INTERVAL', 600))
+
+# format -> (file extension, cv2.imencode params, media type)
+FORMATS = {
+    'jpeg': ('.jpg', lambda q: [cv2.IMWRITE_JPEG_QUALITY, q], 'image/jpeg'),
+    'webp': ('.webp', lambda q: [cv2.IMWRITE_WEBP_QUALITY, q], 'image/webp'),
+    'png': ('.png', lambda q: [], 'image/png'),
+}
+MEDIA_TYPES = {ext: media_type for ext, _, media_type in FORMATS.values()}
+
+# Content-addressed names: 32 hex digits of SHA-256 plus the extension.
+_HASHED_NAME = re.compile(r'^([0-9a-f]{32})(\.(?:jpg|webp|png))$')
+# Names written before content addressing, still served but never swept.
+_LEGACY_NAME = re.compile(r'^[\w.-]+\.(?:jpg|webp|png)$')
+_SHARD_DIR = re.compile(r'^[0-9a-f]{2}$')
+_PARTIAL_NAME = re.compile(r'^[0-9a-f]{32}\.(?:jpg|webp|png)\.\d+\.\d+\.tmp$')  # an interrupted save()
+
+
+class HeatmapStore:
+    """
+    Heatmap overlays stored under the hash of their encoded bytes.
+
+    Files live in 256 shard directories (the first two hex digits), so no
+    directory grows huge and two requests can never overwrite each other's
+    image; identical overlays are stored once. Because a name never changes
+    meaning, served files can be cached by browsers indefinitely.
+    """
+
+    def __init__(self, root: str, fmt: str = HEATMAP_FORMAT, quality: int = HEATMAP_QUALITY,
+                 ttl: float = HEATMAP_TTL, max_bytes: int = HEATMAP_MAX_BYTES):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown heatmap format {fmt!r}, expected one of {sorted(FORMATS)}")
+        self.root = root
+        self.format = fmt
+        self.quality = quality
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, image: np.ndarray) -> Optional[str]:
+        """Encode and store `image`; returns its file name, or None on failure."""
+        ext, params, _ = FORMATS[self.format]
+        ok, encoded = cv2.imencode(ext, image, params(self.quality))
+        if not ok:
+            return None
+        data = encoded.tobytes()
+        filename = hashlib.sha256(data).hexdigest()[:32] + ext
+        path = self._shard_path(filename)
+        if os.path.exists(path):
+            os.utime(path)  # same overlay again: just keep it alive
+            return filename
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return filename
+
+    def _shard_path(self, filename: str) -> str:
+        return os.path.join(self.root, filename[:2], filename)
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """Where `filename` is stored, or None if it isn't (or isn't a valid name)."""
+        if _HASHED_NAME.match(filename):
+            path = self._shard_path(filename)
+        elif _LEGACY_NAME.match(filename):
+            path = os.path.join(self.root, filename)
+        else:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def response(self, filename: str, if_none_match: Optional[str] = None) -> Response:
+        """FileResponse with a strong ETag and long-lived caching for hashed names."""
+        path = self.path_for(filename)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Heatmap not found")
+        media_type = MEDIA_TYPES.get(os.path.splitext(filename)[1])
+        hashed = _HASHED_NAME.match(filename)
+        if not hashed:
+            return FileResponse(path, media_type=media_type)
+
+        etag = f'"{hashed.group(1)}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={int(self.ttl)}, immutable"}
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    # ----------------------------------------------------------- retention
+
+    def _stored_paths(self):
+        # Hashed heatmaps (and interrupted writes) in the shard directories only
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not _SHARD_DIR.match(shard) or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if _HASHED_NAME.match(name) or _PARTIAL_NAME.match(name):
+                    yield os.path.join(shard_dir, name)
+
+    def sweep(self) -> int:
+        """Delete expired heatmaps, then the oldest until under max_bytes. Returns files removed."""
+        cutoff = time.time() - self.ttl
+        files, removed = [], 0
+        for path in self._stored_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime < cutoff:
+                removed += self._remove(path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def start(self, interval: float = HEATMAP_JANITOR_INTERVAL):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._janitor, args=(interval,),
+                                            name='heatmap-janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _janitor(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"Heatmap janitor removed {removed} file(s) from {self.root}")
+            except Exception as e:
+                print(f"❌ Error sweeping heatmaps: {e}")
+            self._stop.wait(interval)
@@ -0,0 +1,137 @@
+import os
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# ====================================================================
+# CONFIGURATION
+# ALIGN_MODE=features  register the upload onto the template (ORB or
+#                      AKAZE keypoints + RANSAC homography) before SSIM
+# ALIGN_MODE=resize    the old behaviour: stretch to the template size
+# Keypoints are found at ALIGN_WORK_WIDTH pixels wide; the homography is
+# still estimated and applied in full-resolution coordinates.
+# ====================================================================
+ALIGN_MODE = os.environ.get('ALIGN_MODE', 'features')
+ALIGN_DETECTOR = os.environ.get('ALIGN_DETECTOR', 'orb')
+ALIGN_WORK_WIDTH = int(os.environ.get('ALIGN_WORK_WIDTH', 1000))
+ALIGN_MAX_FEATURES = int(os.environ.get('ALIGN_MAX_FEATURES', 1000))
+ALIGN_RATIO = float(os.environ.get('ALIGN_RATIO', 0.75))
+ALIGN_MIN_INLIERS = int(os.environ.get('ALIGN_MIN_INLIERS', 25))
+ALIGN_RANSAC_THRESHOLD = float(os.environ.get('ALIGN_RANSAC_THRESHOLD', 5.0))  # template pixels
+# When the matched keypoints already line up to within this many pixels
+# (median) the upload is treated as aligned and the warp is skipped: a
+# sub-pixel resample would only blur it.
+ALIGN_IDENTITY_TOLERANCE = float(os.environ.get('ALIGN_IDENTITY_TOLERANCE', 1.0))
+
+
+# MAGSAC++ (OpenCV >= 4.5) is both faster and far more accurate than plain
+# RANSAC on the repetitive keypoints a page of text produces.
+_ROBUST_METHOD = getattr(cv2, 'USAC_MAGSAC', cv2.RANSAC)
+
+
+def _detector():
+    if ALIGN_DETECTOR == 'akaze':
+        return cv2.AKAZE_create()
+    return cv2.ORB_create(nfeatures=ALIGN_MAX_FEATURES)
+
+
+class Features:
+    """Keypoints (in full-resolution pixels) and binary descriptors of one image."""
+
+    def __init__(self, points: np.ndarray, descriptors: Optional[np.ndarray]):
+        self.points = points
+        self.descriptors = descriptors
+
+    def __len__(self):
+        return len(self.points)
+
+
+def detect(gray: np.ndarray, work_width: int = ALIGN_WORK_WIDTH) -> Features:
+    scale = min(1.0, work_width / gray.shape[1])
+    small = gray
+    if scale < 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    keypoints, descriptors = _detector().detectAndCompute(small, None)
+    points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2) / scale
+    return Features(points, descriptors)
+
+
+class Alignment:
+    """How an upload was brought into template coordinates, and how well."""
+
+    def __init__(self, method: str, homography: Optional[np.ndarray] = None, matches: int = 0,
+                 inliers: int = 0, reprojection_error: Optional[float] = None):
+        self.method = method  # 'identity', 'homography' or 'resize'
+        self.homography = homography
+        self.matches = matches
+        self.inliers = inliers
+        self.reprojection_error = reprojection_error
+
+    @property
+    def inlier_ratio(self) -> float:
+        return self.inliers / self.matches if self.matches else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'method': self.method,
+            'matches': self.matches,
+            'inliers': self.inliers,
+            'inlier_ratio': round(self.inlier_ratio, 3),
+            'reprojection_error': None if self.reprojection_error is None else round(self.reprojection_error, 2),
+        }
+
+
+def _plausible(homography: np.ndarray, template_size: Tuple[int, int]) -> bool:
+    # Reject reflections and extreme scale changes, and require the page
+    # corners to map to a convex quadrilateral.
+    det = np.linalg.det(homography[:2, :2])
+    if not 0.1 < det < 10:
+        return False
+    w, h = template_size
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    projected = cv2.perspectiveTransform(corners, np.linalg.inv(homography))
+    return cv2.isContourConvex(projected.astype(np.float32))
+
+
+def estimate(reference: Features, gray: np.ndarray, template_size: Tuple[int, int]) -> Alignment:
+    """Homography taking `gray` onto the template, or a 'resize' fallback."""
+    test = detect(gray)
+    if reference.descriptors is None or test.descriptors is None or len(test) < 2:
+        return Alignment('resize')
+
+    norm = cv2.NORM_HAMMING if reference.descriptors.dtype == np.uint8 else cv2.NORM_L2
+    pairs = cv2.BFMatcher(norm).knnMatch(test.descriptors, reference.descriptors, k=2)
+    good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < ALIGN_RATIO * p[1].distance]
+    if len(good) < ALIGN_MIN_INLIERS:
+        return Alignment('resize', matches=len(good))
+
+    src = test.points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+    dst = reference.points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+    homography, mask = cv2.findHomography(src, dst, _ROBUST_METHOD, ALIGN_RANSAC_THRESHOLD)
+    inliers = int(mask.sum()) if mask is not None else 0
+    if homography is None or inliers < ALIGN_MIN_INLIERS or not _plausible(homography, template_size):
+        return Alignment('resize', matches=len(good), inliers=inliers)
+
+    keep = mask.ravel().astype(bool)
+    projected = cv2.perspectiveTransform(src[keep], homography)
+    error = float(np.linalg.norm(projected - dst[keep], axis=2).mean())
+
+    method = 'homography'
+    if (gray.shape[1], gray.shape[0]) == tuple(template_size):
+        offset = float(np.median(np.linalg.norm(src[keep] - dst[keep], axis=2)))
+        if offset <= ALIGN_IDENTITY_TOLERANCE:
+            method = 'identity'
+    return Alignment(method, homography, len(good), inliers, error)
+
+
+def warp(image: np.ndarray, alignment: Alignment, template_size: Tuple[int, int]) -> np.ndarray:
+    """Apply `alignment` to `image` (BGR or grayscale)."""
+    if alignment.method == 'homography':
+        # Uncovered border is filled white, like the paper, not black.
+        border = (255,) * (image.shape[2] if image.ndim == 3 else 1)
+        return cv2.warpPerspective(image, alignment.homography, tuple(template_size),
+                                   flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+    if (image.shape[1], image.shape[0]) != tuple(template_size):
+        return cv2.resize(image, tuple(template_size), interpolation=cv2.INTER_AREA)
+    return image
@@ -0,0 +1,337 @@
+"""
+Bulk issuance: put every certificate in a CSV on CertificateChain.
+
+    python issue_certificates.py CSV [--checkpoint FILE] [--hashes-out FILE]
+                                 [--hash-workers N] [--in-flight N] [--batch-gas N] [--max-batch N]
+                                 [--anchor] [--anchor-batch N] [--anchor-dir DIR]
+                                 [--chain web3|stub] [--stub-ledger FILE] [--stub-delay S] [--dry-run]
+
+The CSV has the six certificate columns (University Name, Certificate
+Holder Name, Course, Grade, Roll No, Certificate ID); other columns are
+ignored and empty cells hash as 'N/A', as OCR reports a missing field.
+Rows are streamed in chunks and hashed on a process pool with
+generate_hash() from certificate_hash.py, the canonical JSON and SHA-256
+the verifier computes from OCR'd fields, so whatever is issued here
+verifies there.
+
+Hashes already on chain, already confirmed by an earlier run, or repeated
+in the file are skipped. The rest go out in addBatch transactions sized
+to the gas budget, with up to --in-flight of them awaiting receipts.
+
+Each confirmed transaction is appended to the checkpoint file (JSON
+lines) as its receipt arrives, and a rerun skips every hash in it. A
+batch resent after a crash is harmless: addBatch ignores hashes it
+already holds.
+
+With --anchor, each batch of up to --anchor-batch hashes becomes a
+Merkle tree (merkle.py) and only its root goes on chain, in one
+anchorRoot transaction of flat gas however large the batch. The batch's
+hashes are written to --anchor-dir (anchor_store.py) first, as pending,
+and committed once the root is mined; the verifier builds each
+certificate's inclusion proof from them. A rerun commits pending batches
+whose root was mined before the crash and re-batches the rest.
+
+--chain stub runs against StubIssuer (chain_issuer.py), kept in
+--stub-ledger, to rehearse a run without Ganache.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from anchor_store import ANCHOR_DIR, AnchorStore
+from certificate_hash import empty_fields, generate_hash
+from chain_index import ChainHashIndex
+from chain_issuer import GAS_PER_HASH_GUESS, ISSUE_BATCH_GAS, StubIssuer, Web3Issuer
+from merkle import MerkleTree
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+HASH_CHUNK_ROWS = 2000
+PROGRESS_INTERVAL = 10.0  # seconds between throughput reports
+GAS_MARGIN = 1.1  # headroom over estimate_gas for each transaction
+BLOCK_GAS_SHARE = 0.9  # never ask for more than this share of a block
+ANCHOR_BATCH = int(os.environ.get('ISSUE_ANCHOR_BATCH', 10_000))  # leaves per Merkle root
+
+FIELDS = list(empty_fields())
+
+
+def certificate_record(row):
+    """A CSV row as the field dict the verifier hashes."""
+    return {field: (row.get(field) or '').strip() or 'N/A' for field in FIELDS}
+
+
+def hash_chunk(rows):
+    """Hashing stage (process pool)."""
+    return [generate_hash(certificate_record(row)) for row in rows]
+
+
+def read_chunks(path, size):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = [field for field in FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            sys.exit(f"❌ {path} has no column(s): {', '.join(missing)}")
+        chunk = []
+        for row in reader:
+            if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+                continue  # blank line
+            chunk.append({field: row.get(field) for field in FIELDS})
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def hashed_chunks(chunks, workers):
+    """(rows, hashes) per chunk in file order, with at most 2 x workers chunks hashed ahead."""
+    if workers <= 1:
+        for rows in chunks:
+            yield rows, hash_chunk(rows)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        window = deque()
+        for rows in chunks:
+            window.append((rows, pool.submit(hash_chunk, rows)))
+            if len(window) >= 2 * workers:
+                rows, future = window.popleft()
+                yield rows, future.result()
+        while window:
+            rows, future = window.popleft()
+            yield rows, future.result()
+
+
+class Checkpoint:
+    """Confirmed addBatch/anchorRoot transactions, one JSON line each; their hashes are the resume state."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def issued(self):
+        hashes = set()
+        if not os.path.exists(self.path):
+            return hashes
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    hashes.update(json.loads(line)['hashes'])
+                except (ValueError, KeyError):
+                    continue  # a line cut short by a crash; its batch is resent
+        return hashes
+
+    def record(self, tx, block, gas_used, hashes, root=None):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        entry = {'tx': tx, 'block': block, 'gas_used': gas_used, 'time': time.time(), 'hashes': hashes}
+        if root is not None:
+            entry['root'] = root
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class BatchSender:
+    """
+    Sends addBatch transactions of at most `gas_budget` gas, keeping up
+    to `in_flight` unconfirmed. The batch size starts from a per-hash
+    guess and is recalibrated from every estimate.
+    """
+
+    def __init__(self, chain, checkpoint, in_flight, gas_budget, max_batch=0):
+        self.chain = chain
+        self.checkpoint = checkpoint
+        self.in_flight = max(1, in_flight)
+        self.gas_budget = gas_budget
+        self.max_batch = max_batch
+        self.batch_size = self._size_for(GAS_PER_HASH_GUESS)
+        self.pending = deque()
+        self.transactions = self.issued = self.gas_used = 0
+
+    def _size_for(self, gas_per_hash):
+        size = max(1, int(self.gas_budget // max(1, gas_per_hash)))
+        return min(size, self.max_batch) if self.max_batch else size
+
+    def send(self, hashes):
+        gas = self.chain.estimate_gas(hashes)
+        self.batch_size = self._size_for(gas / len(hashes))
+        if gas > self.gas_budget and len(hashes) > 1:
+            half = len(hashes) // 2
+            self.send(hashes[:half])
+            self.send(hashes[half:])
+            return
+        while len(self.pending) >= self.in_flight:
+            self._confirm_oldest()
+        tx = self.chain.send(hashes, min(int(gas * GAS_MARGIN), self.chain.block_gas_limit()))
+        self.pending.append((tx, hashes, None))
+
+    def _confirm_oldest(self):
+        tx, hashes, root = self.pending.popleft()
+        block, gas_used = self.chain.wait(tx)
+        self._mined(root)
+        self.checkpoint.record(tx, block, gas_used, hashes, root)
+        self.transactions += 1
+        self.issued += len(hashes)
+        self.gas_used += gas_used
+
+    def _mined(self, root):
+        """Called for each mined transaction before it is checkpointed."""
+
+    def drain(self):
+        while self.pending:
+            self._confirm_oldest()
+
+
+class AnchorSender(BatchSender):
+    """
+    Sends each batch of up to `batch_size` hashes as one anchorRoot
+    transaction for its Merkle root, keeping up to `in_flight` unconfirmed.
+    """
+
+    def __init__(self, chain, checkpoint, store, in_flight, batch_size):
+        super().__init__(chain, checkpoint, in_flight, chain.block_gas_limit())
+        self.store = store
+        self.batch_size = max(1, batch_size)
+
+    def send(self, hashes):
+        tree = MerkleTree(hashes)
+        self.store.write_pending(tree)
+        gas = self.chain.estimate_anchor_gas(tree.root, len(hashes))
+        while len(self.pending) >= self.in_flight:
+            self._confirm_oldest()
+        tx = self.chain.send_anchor(tree.root, len(hashes), min(int(gas * GAS_MARGIN), self.chain.block_gas_limit()))
+        self.pending.append((tx, hashes, tree.root))
+
+    def _mined(self, root):
+        self.store.commit(root)  # the batch's proofs become servable
+
+
+def settle_pending(store, checkpoint, chain):
+    """Commit the pending batches whose root was mined before a crash; drop the rest to be re-batched."""
+    pending = store.pending()
+    if not pending:
+        return
+    roots = ChainHashIndex(chain.root_source())
+    roots.refresh()
+    for root, leaves in pending:
+        if root in roots:
+            store.commit(root)
+            checkpoint.record(None, None, None, leaves, root)
+            print(f"✅ Batch {root[:16]}… ({len(leaves)} hash(es)) was anchored before the interruption")
+        else:
+            store.discard(root)
+
+
+def build_chain(args):
+    if args.chain == 'stub':
+        return StubIssuer(args.stub_ledger, mine_delay=args.stub_delay)
+    try:
+        return Web3Issuer()
+    except ImportError:
+        sys.exit("❌ --chain web3 needs web3 (pip install web3), or use --chain stub")
+
+
+def run(args):
+    chain = build_chain(args)
+    index = ChainHashIndex(chain)
+    print(f"Loaded {index.refresh()} certificate hash(es) already on the chain")
+
+    checkpoint = Checkpoint(args.checkpoint)
+    anchors = AnchorStore(args.anchor_dir)
+    if args.anchor and not args.dry_run:
+        settle_pending(anchors, checkpoint, chain)
+    print(f"Loaded {anchors.load()} anchored batch(es) from {args.anchor_dir}")
+    confirmed = checkpoint.issued()
+    print(f"{len(confirmed)} hash(es) confirmed by earlier runs ({args.checkpoint})")
+
+    if args.anchor:
+        sender = AnchorSender(chain, checkpoint, anchors, args.in_flight, args.anchor_batch)
+    else:
+        gas_budget = min(args.batch_gas, int(chain.block_gas_limit() * BLOCK_GAS_SHARE))
+        sender = BatchSender(chain, checkpoint, args.in_flight, gas_budget, args.max_batch)
+
+    out = writer = None
+    if args.hashes_out:
+        out = open(args.hashes_out, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(out)
+        writer.writerow(FIELDS + ['hash', 'status'])
+
+    seen = set()
+    rows_read = on_chain = duplicates = 0
+    batch = []
+    started = last_report = time.perf_counter()
+    try:
+        for rows, hashes in hashed_chunks(read_chunks(args.csv, HASH_CHUNK_ROWS), args.hash_workers):
+            for row, candidate_hash in zip(rows, hashes):
+                rows_read += 1
+                if candidate_hash in seen:
+                    status = 'duplicate'
+                    duplicates += 1
+                elif candidate_hash in confirmed or candidate_hash in index or candidate_hash in anchors:
+                    status = 'on_chain'
+                    on_chain += 1
+                else:
+                    status = 'new'
+                    batch.append(candidate_hash)
+                seen.add(candidate_hash)
+                if writer is not None:
+                    record = certificate_record(row)
+                    writer.writerow([record[field] for field in FIELDS] + [candidate_hash, status])
+                if len(batch) >= sender.batch_size and not args.dry_run:
+                    sender.send(batch)
+                    batch = []
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"{rows_read} row(s), {rows_read / (now - started):.0f} rows/s, "
+                      f"{sender.issued} issued in {sender.transactions} tx(s), {len(sender.pending)} in flight")
+
+        if batch and not args.dry_run:
+            sender.send(batch)
+        sender.drain()
+    finally:
+        if out is not None:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    new = rows_read - on_chain - duplicates
+    if args.dry_run:
+        print(f"✅ Dry run: {rows_read} row(s), {new} to issue, {on_chain} already on chain, "
+              f"{duplicates} duplicate(s), in {elapsed:.1f}s")
+        return
+    kind = 'anchorRoot' if args.anchor else 'addBatch'
+    print(f"✅ Issued {sender.issued} certificate(s) in {sender.transactions} {kind} transaction(s) "
+          f"({sender.gas_used} gas); {on_chain} already on chain, {duplicates} duplicate(s); "
+          f"{rows_read} row(s) in {elapsed:.1f}s ({rows_read / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hash a CSV of certificates and issue them on CertificateChain")
+    parser.add_argument('csv')
+    parser.add_argument('--checkpoint', default='data/issuance-checkpoint.jsonl',
+                        help="confirmed transactions; reusing it resumes an interrupted run")
+    parser.add_argument('--hashes-out', help="write every row with its hash and status to this CSV")
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--in-flight', type=int, default=4, help="addBatch transactions awaiting receipts")
+    parser.add_argument('--batch-gas', type=int, default=ISSUE_BATCH_GAS, help="gas budget per addBatch")
+    parser.add_argument('--max-batch', type=int, default=0, help="hashes per addBatch at most (default: gas-sized)")
+    parser.add_argument('--anchor', action='store_true', help="anchor Merkle roots of batches instead of addBatch")
+    parser.add_argument('--anchor-batch', type=int, default=ANCHOR_BATCH, help="--anchor: hashes per Merkle root")
+    parser.add_argument('--anchor-dir', default=ANCHOR_DIR, help="anchored batches, read by the verifier")
+    parser.add_argument('--chain', choices=('web3', 'stub'), default='web3')
+    parser.add_argument('--stub-ledger', default='data/stub-chain.txt', help="--chain stub: issued hashes file")
+    parser.add_argument('--stub-delay', type=float, default=0.0, help="--chain stub: seconds to mine a transaction")
+    parser.add_argument('--dry-run', action='store_true', help="hash and de-duplicate only; send nothing")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
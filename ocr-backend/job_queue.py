@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+# ====================================================================
+# CONFIGURATION
+# JOB_WORKERS jobs run at once (each still needs a verification pool
+# slot); up to JOB_QUEUE_SIZE more wait their turn. Finished jobs are
+# kept for JOB_RETENTION seconds so clients can collect the result.
+# ====================================================================
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', 3600))
+JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 5))
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be queued; the caller should answer 503."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    One queued verification and everything a client can learn about it.
+
+    `events` is the full progress history (queued, running, each finished
+    stage, then done or failed), so a subscriber that connects late still
+    replays it from the start.
+    """
+
+    def __init__(self, work: Callable[["Job"], Awaitable[dict]]):
+        self.id = uuid.uuid4().hex
+        self.state = 'queued'  # queued -> running -> done / failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.events = []
+        self._work = work
+        self._changed = asyncio.Event()
+        self.progress('queued')
+
+    def progress(self, stage: str, **data):
+        self.events.append({'stage': stage, 'time': time.time(), **data})
+        # Wake current subscribers, and give later ones a fresh event to wait on.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, seen: int):
+        """Wait until there are more than `seen` events."""
+        if len(self.events) <= seen:
+            await self._changed.wait()
+
+    def status(self) -> dict:
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'stage': self.events[-1]['stage'],
+            'events': self.events,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a fixed number of asyncio workers.
+
+    Jobs and their results live only in this process's memory, so they are
+    lost on restart; clients that never collect a result can always fall
+    back to resubmitting, which the result cache makes cheap.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE,
+                 retention: float = JOB_RETENTION, retry_after: int = JOB_RETRY_AFTER):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.retention = retention
+        self.retry_after = retry_after
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+            print(f"✅ Job queue started with {self.workers} worker(s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, work: Callable[[Job], Awaitable[dict]]) -> Job:
+        """Queue `work(job)`; its return value becomes the job result."""
+        if self._queue is None:
+            self.start()
+        self._purge()
+        job = Job(work)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(self.retry_after)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _purge(self):
+        # Jobs are kept in submission order, so stop at the first one that is
+        # unfinished or not yet expired. A slow early job only delays the
+        # purge of later ones until it finishes.
+        cutoff = time.time() - self.retention
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished is None or job.finished > cutoff:
+                break
+            self._jobs.popitem(last=False)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.state = 'running'
+            job.progress('running')
+            try:
+                job.result = await job._work(job)
+                job.state = 'done'
+                job.finished = time.time()
+                job.progress('done')
+            except Exception as e:
+                print(f"Error in job {job.id}: {e}")
+                job.error = str(e)
+                job.state = 'failed'
+                job.finished = time.time()
+                job.progress('failed', error=str(e))
+            finally:
+                job._work = None  # drop the upload it closed over
+                self._queue.task_done()
@@ -1,25 +1,44 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-GUI backend
-import matplotlib.pyplot as plt
-from skimage.metrics import structural_similarity as ssim
-import easyocr
 import os
-import csv
-import re
-import shutil
-import hashlib
 import json
-import subprocess
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from datetime import datetime
 import uvicorn
+from verification_executor import VerificationExecutor, ExecutorBusy, StageTimeout
+from chain_index import ChainHashIndex, InMemoryEventSource, Web3EventSource, Web3RootSource
+from anchor_store import AnchorStore
+from certificate_hash import empty_fields, generate_hash
+from merkle import verify_proof
+from template_registry import TEMPLATES
+from template_store import TemplateStore, TemplateEntry
+from heatmap_render import render_overlay
+from heatmap_store import HeatmapStore
+from tamper_regions import find_hotspots
+from ocr_reader import OCR_READER
+from field_layout import align_to_template, layout_for
+from field_rules import rule_set
+from result_cache import ResultCache
+from verification_store import VerificationStore
+from job_queue import JobQueue, JobQueueFull
+from metrics import EARLY_EXITS, METRICS, NEAR_DUPLICATE_HITS, RequestMetrics, timed
+from near_duplicates import NearDuplicateIndex
+from request_profiler import ProfileStore, RequestProfiler, is_admin
+from verdict_policy import POLICY
+from upload_ingest import (ingest, RequestSizeLimit, UploadTooLarge, UploadUnreadable,
+                           MAX_UPLOAD_BYTES, KEEP_UPLOADS)
 
 app = FastAPI()
 
+# Refuse oversized bodies while they stream in, before multipart parsing.
+# Added before CORS so CORS wraps it and its 413 still carries the
+# Access-Control headers the browser needs to read it.
+app.add_middleware(RequestSizeLimit)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,244 +46,864 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-try:
-    READER = easyocr.Reader(['en'], gpu=False)
-except Exception as e:
-    print(f"Error initializing EasyOCR: {e}")
-    READER = None
+PROFILE_STORE = ProfileStore()
+# Opt-in cProfile capture of individual requests (see request_profiler.py)
+app.add_middleware(RequestProfiler, store=PROFILE_STORE)
+# Outermost, so rejected and failed requests are timed too.
+app.add_middleware(RequestMetrics)
 
 REFERENCE_IMAGE_PATH = 'genuine.png'
 UPLOAD_FOLDER = 'uploads'
-HEATMAP_FOLDER = 'heatmaps'
-CSV_PATH = 'data/certificates2.csv'
+HEATMAP_FOLDER = os.environ.get('HEATMAP_FOLDER', 'heatmaps')
+CSV_PATH = 'data/certificates2.csv'  # legacy log, imported into the store once
+CSV_EXPORT_PATH = os.environ.get('VERIFICATION_CSV_EXPORT', '')  # refreshed on shutdown when set
+OCR_BATCH_SIZE = int(os.environ.get('OCR_BATCH_SIZE', 8))
+OCR_DECODE_THREADS = int(os.environ.get('OCR_DECODE_THREADS', 4))
+OCR_RECOGNITION_BATCH = int(os.environ.get('OCR_RECOGNITION_BATCH', 16))  # text crops per forward pass
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 500))
+# Chunks of one batch OCR'd at a time (0: half the pool's workers), so a
+# batch leaves workers to /ocr/verify and only holds that many chunks' pixels.
+OCR_BATCH_IN_FLIGHT = int(os.environ.get('OCR_BATCH_IN_FLIGHT', 0))
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(HEATMAP_FOLDER, exist_ok=True)
 os.makedirs('data', exist_ok=True)
 
-def generate_ssim_heatmap(reference_path, test_path, output_path):
+def init_ocr_worker():
+    """Process-pool initializer: give every worker a warmed EasyOCR reader."""
+    try:
+        import torch
+        # One intra-op thread per worker; parallelism comes from the pool size.
+        torch.set_num_threads(1)
+    except Exception:
+        pass
+    try:
+        # With OCR_PRELOAD=prefork the reader was inherited from the parent
+        # copy-on-write; otherwise each worker loads its own here.
+        OCR_READER.warm()
+    except Exception as e:
+        print(f"Error warming EasyOCR in worker {os.getpid()}: {e}")
+    # Already decoded when the pool forks after startup; cheap mtime check otherwise.
+    TEMPLATES.preload(*TEMPLATE_STORE.paths())
+
+def ocr_worker_ready():
+    return OCR_READER.state == 'ready'
+
+EXECUTOR = VerificationExecutor(initializer=init_ocr_worker)
+BATCH_IN_FLIGHT = OCR_BATCH_IN_FLIGHT or max(1, EXECUTOR.max_workers // 2)
+
+def build_chain_source(source_class=Web3EventSource):
+    # CHAIN_SOURCE=memory runs without a node (tests, offline demos).
+    if os.environ.get('CHAIN_SOURCE', 'web3') == 'memory':
+        return InMemoryEventSource()
+    try:
+        return source_class()
+    except Exception as e:
+        print(f"Error connecting chain index to the node, falling back to an empty index: {e}")
+        return InMemoryEventSource()
+
+CHAIN_INDEX = ChainHashIndex(build_chain_source())
+
+# Merkle roots of anchored batches, and the batches themselves for proofs
+ROOT_INDEX = ChainHashIndex(build_chain_source(Web3RootSource))
+ANCHOR_STORE = AnchorStore()
+
+def chain_verdict(generated_hash, proof=None):
+    """
+    Whether the hash was issued: stored on chain by addBatch, or a leaf of
+    an anchored batch. An inclusion proof (the client's, or else one built
+    from ANCHOR_STORE) is checked here against the cached anchored roots,
+    so neither path reads the chain per certificate.
+    """
+    if CHAIN_INDEX.contains(generated_hash):
+        return True
+    if proof is not None and proves_anchored(generated_hash, proof):
+        return True
+    stored = ANCHOR_STORE.proof_for(generated_hash)
+    return stored is not None and proves_anchored(generated_hash, stored)
+
+def proves_anchored(generated_hash, proof):
+    return verify_proof(generated_hash, proof) and ROOT_INDEX.contains(proof['root'].lower())
+
+def parse_proof(proof):
+    """The optional `proof` form field: an inclusion proof as JSON (see GET /ocr/proofs/{hash})."""
+    if not proof:
+        return None
+    try:
+        parsed = json.loads(proof)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="proof must be a JSON inclusion proof")
+    if not isinstance(parsed, dict) or not isinstance(parsed.get('root'), str):
+        raise HTTPException(status_code=400, detail="proof must be a JSON object with a root")
+    return parsed
+
+# genuine.png stays the fallback for uploads no institution template matches.
+TEMPLATE_STORE = TemplateStore(default=TemplateEntry('default', REFERENCE_IMAGE_PATH))
+
+RESULT_CACHE = ResultCache()
+
+# Content-addressed overlays in shard directories, pruned by a janitor thread.
+HEATMAP_STORE = HeatmapStore(HEATMAP_FOLDER)
+
+VERIFICATION_STORE = VerificationStore()
+
+# Perceptual fingerprints of earlier uploads and blacklisted forgeries, checked before OCR
+NEAR_DUPLICATES = NearDuplicateIndex()
+
+JOBS = JobQueue()
+
+@app.on_event("startup")
+async def start_executor():
+    TEMPLATE_STORE.load_manifest()
+    if VERIFICATION_STORE.count() == 0:
+        imported = VERIFICATION_STORE.import_csv(CSV_PATH, generate_hash)
+        if imported:
+            print(f"✅ Imported {imported} row(s) from {CSV_PATH} into {VERIFICATION_STORE.path}")
+    VERIFICATION_STORE.start()
+    if NEAR_DUPLICATES.enabled:
+        print(f"✅ Loaded {NEAR_DUPLICATES.load()} near-duplicate fingerprint(s) from {NEAR_DUPLICATES.path}")
+    # Decode every template (and detect its features) once before the pool
+    # forks so workers inherit them, under the paths selection resolves to.
+    TEMPLATES.preload(*TEMPLATE_STORE.paths())
+    EXECUTOR.start()
+    CHAIN_INDEX.start()
+    ROOT_INDEX.start()
+    loaded = ANCHOR_STORE.load()
+    if loaded:
+        print(f"✅ Loaded {loaded} anchored batch(es) from {ANCHOR_STORE.root}")
+    JOBS.start()
+    HEATMAP_STORE.start()
+    # Workers load their models in the background; /health reports progress.
+    asyncio.get_running_loop().create_task(EXECUTOR.warm_up(ocr_worker_ready))
+
+@app.on_event("shutdown")
+async def stop_executor():
+    await JOBS.stop()
+    EXECUTOR.shutdown()
+    CHAIN_INDEX.stop()
+    ROOT_INDEX.stop()
+    VERIFICATION_STORE.stop()
+    HEATMAP_STORE.stop()
+    if CSV_EXPORT_PATH:
+        VERIFICATION_STORE.export_csv(CSV_EXPORT_PATH)
+
+def generate_ssim_heatmap(reference_path, test_image, render=True, fields=None):
+    """
+    `test_image` is the decoded BGR upload (a path is still accepted).
+    Returns {"ssim_score", "alignment", "hotspots", "heatmap_filename"}, or
+    None if either image is missing. Hotspots name the `fields` (a template
+    field layout) they overlap. With render=False no overlay is encoded and
+    heatmap_filename is None.
+    """
     try:
-        reference = cv2.imread(reference_path)
-        test = cv2.imread(test_path)
+        template = TEMPLATES.get(reference_path)
+        test = cv2.imread(test_image) if isinstance(test_image, str) else test_image
 
-        if reference is None or test is None:
+        if template is None or test is None:
             return None
 
-        if reference.shape != test.shape:
-            test = cv2.resize(test, (reference.shape[1], reference.shape[0]))
+        # Register the upload onto the template; falls back to a plain resize
+        test, alignment = template.align(test)
 
-        gray_reference = cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY)
         gray_test = cv2.cvtColor(test, cv2.COLOR_BGR2GRAY)
 
-        (score, ssim_map) = ssim(gray_reference, gray_test, full=True)
+        (score, ssim_map) = template.compare(gray_test)
 
-        ssim_map = (ssim_map - np.min(ssim_map)) / (np.max(ssim_map) - np.min(ssim_map))
-        ssim_map_inverted = 1 - ssim_map
-        ssim_map_blurred = cv2.GaussianBlur(ssim_map_inverted, (51, 51), 0)
-
-        heatmap = plt.cm.jet(ssim_map_blurred)[:,:,:3]
-        heatmap = (heatmap * 255).astype(np.uint8)
-        heatmap_on_image = cv2.addWeighted(test, 0.7, heatmap, 0.3, 0)
-        
-        cv2.imwrite(output_path, cv2.cvtColor(heatmap_on_image, cv2.COLOR_RGB2BGR))
+        heatmap_filename = None
+        if render:
+            heatmap_on_image = render_overlay(test, ssim_map)
+            heatmap_filename = HEATMAP_STORE.save(heatmap_on_image)
         
-        return score
+        return {"ssim_score": score, "alignment": alignment.to_dict(),
+                "hotspots": find_hotspots(ssim_map, fields), "heatmap_filename": heatmap_filename}
 
     except Exception as e:
         print(f"Error generating heatmap: {e}")
         return None
 
-def extract_fields(image_path):
-    extracted_data = {
-        'University Name': 'N/A',
-        'Certificate Holder Name': 'N/A',
-        'Course': 'N/A',
-        'Grade': 'N/A',
-        'Roll No': 'N/A',
-        'Certificate ID': 'N/A'
-    }
+def empty_confidence():
+    return {field: 0.0 for field in empty_fields()}
 
-    if not READER or not os.path.exists(image_path):
-        return extracted_data
-    
-    try:
-        results = READER.readtext(image_path)
-        all_text = " ".join([text.strip() for (bbox, text, conf) in results if text.strip()])
-        text_lines = [text.strip() for (bbox, text, conf) in results if text.strip()]
-        
-        uni_end_idx = 0
-
-        uni_start_idx = -1
-        for i, line in enumerate(text_lines):
-            if 'Institute' in line or 'University' in line or 'Technology' in line:
-                uni_start_idx = i
-                break
-
-        if uni_start_idx != -1:
-            uni_name_parts = [text_lines[uni_start_idx]]
-            uni_end_idx = uni_start_idx + 1
-            
-            for i in range(uni_end_idx, min(uni_start_idx + 3, len(text_lines))):
-                next_line = text_lines[i].strip()
-                if len(next_line.split()) <= 4 and ('of' in next_line.lower() or 'technology' in next_line.lower()):
-                    uni_name_parts.append(next_line)
-                    uni_end_idx = i + 1
-                else:
-                    break
-            
-            extracted_data['University Name'] = " ".join(uni_name_parts).strip()
-        
-        name_search_start = uni_end_idx 
-        for i in range(name_search_start, len(text_lines)):
-            line = text_lines[i]
-            if len(line.split()) >= 2 and 'course' not in line.lower() and 'roll' not in line.lower() and 'id' not in line.lower() and 'successfully' not in line.lower():
-                extracted_data['Certificate Holder Name'] = line
-                break
-
-        roll_match = re.search(r'(?:Roll\s*Number|Roll\s*No)\s*[:\s]*(\S+)', all_text, re.IGNORECASE)
-        if roll_match:
-            extracted_data['Roll No'] = roll_match.group(1).strip()
-            
-        id_match = re.search(r'(?:Certificate\s*ID|Cert\s*ID|ID\s*)\s*[:\s]*(\S+)', all_text, re.IGNORECASE)
-        if id_match:
-            extracted_data['Certificate ID'] = id_match.group(1).strip()
-            
-        grade_match = re.search(r'(?:Grade\s*[-\s:]*|with\s*Grade\s*[-\s:]*)\s*(\S)', all_text, re.IGNORECASE)
-        if grade_match:
-            extracted_data['Grade'] = grade_match.group(1).strip()
-
-        course_match = re.search(r'completed the course of\s*(.*?)\s*(authorized by|with Grade)', all_text, re.IGNORECASE | re.DOTALL)
-        if course_match:
-            course_name = course_match.group(1).strip()
-            course_name = re.sub(r'(?:an\s+online\s+non-credit\s+course|a\s+non-credit\s+course)', '', course_name, flags=re.IGNORECASE).strip()
-            extracted_data['Course'] = course_name
-        
-        if extracted_data['Course'] == 'N/A':
-             course_match_fallback = re.search(r'course of\s*([A-Z0-9\s]+)', all_text, re.IGNORECASE)
-             if course_match_fallback:
-                 extracted_data['Course'] = course_match_fallback.group(1).strip()
+def extract_fields(image, template=None):
+    """`image` is the decoded upload (ndarray) or a path to it."""
+    return extract_fields_scored(image, template)[0]
 
-        return extracted_data
+def extract_fields_scored(image, template=None):
+    """extract_fields(), plus each field's OCR confidence for the verdict policy."""
+    reader = OCR_READER.get()
+    if not reader or (isinstance(image, str) and not os.path.exists(image)):
+        return empty_fields(), empty_confidence()
 
+    try:
+        # A template with a field layout lets us skip full-page detection
+        if template is not None and template.fields:
+            scored = extract_fields_roi(reader, image, template)
+            if scored is not None:
+                return scored
+        results = reader.readtext(image)
     except Exception as e:
         print(f"Error during OCR extraction: {e}")
-        return extracted_data
+        return empty_fields(), empty_confidence()
+    return fields_from_ocr(results, template)
+
+def extract_fields_roi(reader, image, template):
+    """
+    Read only the template's field boxes from the upload aligned onto the
+    template, as (fields, confidence). Returns None when the key fields
+    come back empty, which usually means the upload doesn't follow this
+    layout after all.
+    """
+    reference = TEMPLATES.get(template.path)
+    gray = load_for_ocr(image)
+    if reference is None or gray is None:
+        return None
+
+    aligned = align_to_template(gray, reference)
+    values, conf = layout_for(template.fields).extract_scored(reader, aligned)
+
+    extracted_data, confidence = empty_fields(), empty_confidence()
+    for field in extracted_data:
+        extracted_data[field] = values.get(field, 'N/A')
+        confidence[field] = conf.get(field, 0.0)
+    if extracted_data['Certificate ID'] == 'N/A' or extracted_data['Certificate Holder Name'] == 'N/A':
+        return None
+    return extracted_data, confidence
+
+def load_for_ocr(image):
+    """Path or ndarray -> grayscale ndarray (None if it can't be decoded)."""
+    if isinstance(image, np.ndarray):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+
+def extract_fields_batch(images, batch_size=OCR_BATCH_SIZE):
+    """
+    extract_fields for many certificates at once.
+
+    Images (paths or ndarrays) are decoded on a thread pool, grouped by
+    size, and pushed through EasyOCR's readtext_batched so the recognition
+    stage runs over many crops per forward pass. Returns one (fields,
+    confidence) pair per input, in input order.
+    """
+    extracted = [(empty_fields(), empty_confidence()) for _ in images]
+    reader = OCR_READER.get()
+    if not reader or not images:
+        return extracted
 
-def update_certificates_csv(extracted_data):
-    """Update certificates2.csv with extracted data - CRITICAL FIX"""
+    with ThreadPoolExecutor(max_workers=OCR_DECODE_THREADS) as pool:
+        decoded = list(pool.map(load_for_ocr, images))
+
+    # readtext_batched needs equally sized images; scans of one design
+    # usually share a size, so grouping avoids resizing anything.
+    by_shape = {}
+    for i, image in enumerate(decoded):
+        if image is not None:
+            by_shape.setdefault(image.shape, []).append(i)
+
+    for indices in by_shape.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            try:
+                results = reader.readtext_batched([decoded[i] for i in chunk], batch_size=OCR_RECOGNITION_BATCH)
+            except Exception as e:
+                print(f"Error during batched OCR extraction: {e}")
+                continue
+            for i, result in zip(chunk, results):
+                extracted[i] = fields_from_ocr(result)
+    return extracted
+
+def fields_from_ocr(results, template=None):
+    """Recover (fields, confidence) from EasyOCR's (bbox, text, conf) list."""
     try:
-        fieldnames = ['University Name', 'Certificate Holder Name', 'Course', 'Grade', 'Roll No', 'Certificate ID']
-        file_exists = os.path.exists(CSV_PATH)
-        
-        row_data = {field: extracted_data.get(field, 'N/A') for field in fieldnames}
-        
-        with open(CSV_PATH, 'a' if file_exists else 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row_data)
-        
-        print(f"✅ Successfully updated {CSV_PATH}")
-        return True
+        # Compiled once per template per process; one pass over the tokens
+        return rule_set(template.rules if template is not None else None).extract_scored(results, empty_fields())
     except Exception as e:
-        print(f"❌ Error updating CSV: {e}")
-        return False
+        print(f"Error during OCR extraction: {e}")
+        return empty_fields(), empty_confidence()
 
-def generate_hash(data):
-    sorted_data = json.dumps(data, sort_keys=True)
-    return hashlib.sha256(sorted_data.encode()).hexdigest()
+def result_cache_key(upload_digest):
+    # A new blacklist entry may cover a copy cached before it, under other bytes
+    return f"{upload_digest}{TEMPLATE_STORE.version}{NEAR_DUPLICATES.blacklist_generation}"
 
-def run_blockchain_verification():
-    try:
-        result = subprocess.run(
-            ['truffle', 'exec', 'batchVerify.js', f'--file={CSV_PATH}'],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode == 0:
-            results_file = CSV_PATH.replace('.csv', '_verification_results.json')
-            if os.path.exists(results_file):
-                with open(results_file, 'r') as f:
-                    return json.load(f)
-        
+def cacheable_result(extracted_data, heatmap_filename, ssim, template, template_match, generated_hash,
+                     confidence=None, stages_run=(), rejected=None):
+    # Everything except the chain verdict, which is re-checked on every hit
+    # because a certificate can be issued after its first verification.
+    return {
+        "extracted_data": extracted_data,
+        "heatmap_filename": heatmap_filename,
+        "ssim": ssim,
+        "template": template.institution,
+        "template_match": template_match,
+        "blockchain_hash": generated_hash,
+        "confidence": confidence,
+        "ssim_ran": 'ssim' in stages_run,
+        "rejected": rejected,
+    }
+
+def heatmap_expired(result):
+    return result["heatmap_filename"] is not None and HEATMAP_STORE.path_for(result["heatmap_filename"]) is None
+
+async def cached_payload(upload_digest, heatmap=True, evidence=False, proof=None):
+    cached = RESULT_CACHE.get(result_cache_key(upload_digest))
+    if cached is None:
         return None
-    except Exception as e:
-        print(f"Error running blockchain verification: {e}")
+    if heatmap_expired(cached):
+        RESULT_CACHE.invalidate(result_cache_key(upload_digest))
         return None
+    return await stored_payload(cached, ['cache'], heatmap, evidence, proof)
+
+async def stored_payload(cached, stages_run, heatmap=True, evidence=False, proof=None):
+    """
+    The response for a cacheable_result() computed earlier, after
+    `stages_run` (the result cache lookup, or the fingerprint match and
+    OCR that confirmed it). None if this request needs the SSIM stage (or
+    overlay) that run skipped.
+    """
+    # The certificate may have been issued since, so its hash is looked up again
+    stages_run = list(stages_run) + ['chain']
+    is_valid = await EXECUTOR.run('chain', chain_verdict, cached["blockchain_hash"], proof, in_process=False)
+    rejected = None if is_valid else cached["rejected"]
+    if POLICY.wants_ssim(evidence, is_valid) and \
+            (not cached["ssim_ran"] or (heatmap and cached["heatmap_filename"] is None)):
+        return None  # this request needs the SSIM stage (or overlay) the cached run skipped
+    payload = verification_payload(
+        cached["extracted_data"], cached["heatmap_filename"], cached["ssim"], cached["template"],
+        cached["template_match"], cached["blockchain_hash"], is_valid, False, cached["confidence"],
+        stages_run, rejected, ssim_skipped=not cached["ssim_ran"])
+    payload["cached"] = True
+    return payload
+
+def verification_payload(extracted_data, heatmap_filename, ssim, template_name, template_match,
+                         generated_hash, is_valid, recorded, confidence=None, stages_run=(), rejected=None,
+                         ssim_skipped=False, blacklisted=None):
+    """
+    The /ocr/verify response. `rejected` is the verdict policy's reason
+    for calling the upload unreadable, `blacklisted` the note of the known
+    forgery it copies; `stages_run` lists the stages this request actually
+    ran.
+    """
+    if blacklisted is not None:
+        blockchain_status = "KNOWN_FORGERY"
+        validation_reason = f"This image is a copy of a certificate image blacklisted as a forgery ({blacklisted})."
+    elif rejected is not None:
+        blockchain_status = "UNREADABLE"
+        validation_reason = f"Certificate hash does not match any blockchain record, and key certificate fields could not be read reliably ({rejected}). Please upload a clearer scan of the whole certificate."
+    elif is_valid:
+        blockchain_status = "VALID"
+        validation_reason = "Certificate hash matches blockchain record. This certificate is authentic and has been verified against the university's blockchain ledger."
+    elif CHAIN_INDEX.ready:
+        blockchain_status = "INVALID"
+        validation_reason = "Certificate hash does NOT match any blockchain record. This certificate may be forged, altered, or not issued by the claimed institution."
+    else:
+        blockchain_status = "INVALID"
+        validation_reason = "Certificate not found in blockchain"
+
+    return {
+        "status": "success",
+        "extracted_data": extracted_data,
+        "heatmap_url": f"/heatmap/{heatmap_filename}" if heatmap_filename else None,
+        "ssim_score": float(ssim["ssim_score"]) if ssim else 0.0,
+        "alignment": ssim["alignment"] if ssim else None,
+        "hotspots": ssim["hotspots"] if ssim else [],
+        "template": template_name,
+        "template_match": template_match,
+        "blockchain_hash": generated_hash,
+        "is_valid": is_valid,
+        "validation_reason": validation_reason,
+        "verification_status": blockchain_status,
+        "recorded": recorded,  # False for a record already stored, or if the store can't write
+        "csv_updated": recorded,  # older clients still read this name
+        "field_confidence": confidence,
+        "stages_run": list(stages_run),
+        "early_exit": 'known_forgery' if blacklisted is not None else 'unreadable' if rejected is not None
+                      else 'not_on_chain' if ssim_skipped else None,
+        "cached": False
+    }
+
+async def timed_stage(name, awaitable):
+    with timed(name):
+        return await awaitable
+
+async def near_duplicate_check(upload):
+    """
+    Fingerprint a decoded upload and look for an earlier copy of it.
+    Returns (probe, near): `near` is the NEAR_DUPLICATES.match entry or
+    None. A blacklisted match answers the request (known_forgery_payload);
+    a stored verdict only stands once this upload's own OCR agrees with it
+    (near_duplicate_payload). After a full verification, pass `probe` to
+    NEAR_DUPLICATES.remember.
+    """
+    if not NEAR_DUPLICATES.enabled:
+        return None, None
+    with timed('fingerprint'):
+        probe = await asyncio.to_thread(NEAR_DUPLICATES.probe, upload.gray)
+        near = await asyncio.to_thread(NEAR_DUPLICATES.match, probe, TEMPLATE_STORE.version)
+    if near is not None and near["kind"] == 'verdict' and heatmap_expired(near["result"]):
+        near = None
+    return probe, near
+
+def near_duplicate_info(near):
+    return {key: near[key] for key in ('id', 'kind', 'distance', 'pixel_diff', 'upload_digest', 'note', 'created')}
+
+def known_forgery_payload(near):
+    NEAR_DUPLICATE_HITS.inc('blacklist')
+    payload = verification_payload(empty_fields(), None, None, None, None, None, False, False,
+                                   stages_run=['fingerprint'], blacklisted=near["note"] or 'no note')
+    payload["near_duplicate"] = near_duplicate_info(near)
+    return payload
+
+async def near_duplicate_payload(near, upload_digest, generated_hash, recorded, heatmap=True, evidence=False,
+                                 proof=None):
+    """
+    The response from the stored result of the earlier upload this one
+    copies, if OCR of this upload hashed to the same fields; its SSIM run
+    is reused. A thumbnail match can't tell one digit from another, so a
+    stored verdict is never taken on the fingerprint alone. None to carry
+    on with the full pipeline.
+    """
+    if near is None or near["kind"] != 'verdict':
+        return None
+    stored = near["result"]
+    if stored["blockchain_hash"] != generated_hash:
+        return None
+    payload = await stored_payload(stored, ['fingerprint', 'ocr'], heatmap, evidence, proof)
+    if payload is None:
+        return None
+    NEAR_DUPLICATE_HITS.inc('verdict')
+    RESULT_CACHE.put(result_cache_key(upload_digest), stored)
+    payload["recorded"] = payload["csv_updated"] = recorded
+    payload["near_duplicate"] = near_duplicate_info(near)
+    return payload
+
+async def run_verification(upload, progress=None, heatmap=True, evidence=False, proof=None):
+    """
+    Verify one ingested upload end to end and return the response payload.
+
+    heatmap=False skips rendering the overlay and returns only the
+    structured hotspots. Stages that can no longer change the verdict are
+    skipped (verdict_policy.py); evidence=True always runs SSIM.
+    `progress(stage)` is called as each of the ocr, ssim and chain stages
+    finishes, or with skipped=True when it is skipped; the job API streams
+    these. `proof` is a client-supplied Merkle inclusion proof for
+    certificates issued in an anchored batch.
+    """
+    progress = progress or (lambda stage, **data: None)
+
+    # Identical bytes against the same templates: reuse the earlier result
+    with timed('cache'):
+        cached = await cached_payload(upload.digest, heatmap, evidence, proof)
+    if cached is not None:
+        for stage in ('ocr', 'ssim', 'chain'):
+            progress(stage)
+        return cached
+
+    stages_run = []
+
+    async def stage(name, awaitable):
+        result = await timed_stage(name, awaitable)
+        stages_run.append(name)
+        progress(name)
+        return result
+
+    async with EXECUTOR.admit():
+        # Decode once; OCR and SSIM both get this array, never the file
+        with timed('decode'):
+            image = await asyncio.to_thread(upload.decode)
+            gray = await asyncio.to_thread(lambda: upload.gray)
+
+        # A recompressed or rescaled copy of an earlier upload or a blacklisted forgery
+        probe, near = await near_duplicate_check(upload)
+        if near is not None and near["kind"] == 'blacklist':
+            for stage in ('ocr', 'ssim', 'chain'):
+                progress(stage)
+            return known_forgery_payload(near)
+
+        def run_ssim(target):
+            return EXECUTOR.run('ssim', generate_ssim_heatmap, target.path, image, heatmap, target.fields)
+
+        # Guess the template from the image alone so SSIM needn't wait for OCR
+        with timed('template'):
+            template, template_match = await asyncio.to_thread(TEMPLATE_STORE.select, None, gray)
+
+        # 1 + 3. Extract fields, and generate the heatmap in parallel on the
+        # worker pool when it will be needed whatever OCR finds
+        ocr = stage('ocr', EXECUTOR.run('ocr', extract_fields_scored, gray, template))
+        ssim = None
+        if POLICY.ssim_with_ocr(evidence) and near is None:
+            (extracted_data, confidence), ssim = await asyncio.gather(ocr, timed_stage('ssim', run_ssim(template)))
+            stages_run.append('ssim')
+        else:
+            extracted_data, confidence = await ocr
+        print(f"Extracted data: {extracted_data}")
+
+        # The OCR'd institution name is authoritative; redo SSIM only if it disagrees
+        named_template = TEMPLATE_STORE.by_name(extracted_data.get('University Name'))
+        if named_template is not None:
+            if 'ssim' in stages_run and named_template.path != template.path:
+                with timed('ssim'):
+                    ssim = await run_ssim(named_template)
+            template, template_match = named_template, 'name'
+        if 'ssim' in stages_run:
+            progress('ssim')
+
+        # 2. Record the verification (queued; the store commits in batches)
+        with timed('hash'):
+            generated_hash = generate_hash(extracted_data)
+        # A SQLite lookup under the store's lock; keep it off the event loop
+        with timed('record'):
+            recorded = await asyncio.to_thread(VERIFICATION_STORE.record, extracted_data, generated_hash)
+
+        # A copy of an earlier upload that reads the same: reuse that run's SSIM
+        reused = await near_duplicate_payload(near, upload.digest, generated_hash, recorded, heatmap,
+                                              evidence, proof)
+        if reused is not None:
+            progress('chain')
+            progress('ssim')
+            return reused
+
+        # 4. Look the hash up in the in-memory chain index (or prove it in an anchored batch)
+        is_valid = await stage('chain', EXECUTOR.run('chain', chain_verdict, generated_hash, proof,
+                                                     in_process=False))
+        # Not on chain with key fields that can't be read: ask for a better scan
+        rejected = None if is_valid else POLICY.unreadable(extracted_data, confidence)
+
+        # 3, deferred. SSIM only when it still adds to the verdict
+        if 'ssim' not in stages_run:
+            if POLICY.wants_ssim(evidence, is_valid):
+                ssim = await stage('ssim', run_ssim(template))
+            else:
+                EARLY_EXITS.inc('not_on_chain' if rejected is None else 'unreadable')
+                progress('ssim', skipped=True)
+
+    heatmap_filename = ssim["heatmap_filename"] if ssim else None
+    result = cacheable_result(extracted_data, heatmap_filename, ssim, template, template_match, generated_hash,
+                              confidence, stages_run, rejected)
+    RESULT_CACHE.put(result_cache_key(upload.digest), result)
+    if probe is not None:
+        await asyncio.to_thread(NEAR_DUPLICATES.remember, probe, upload.digest, result, TEMPLATE_STORE.version)
+
+    # 5. Get verification result
+    return verification_payload(
+        extracted_data, heatmap_filename, ssim, template.institution, template_match,
+        generated_hash, is_valid, recorded, confidence, stages_run, rejected,
+        ssim_skipped='ssim' not in stages_run)
+
+async def ingest_upload(file):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    save_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{file.filename}") if KEEP_UPLOADS else None
+    # Read and hash the upload in memory; nothing downstream touches disk for it
+    with timed('ingest'):
+        return await asyncio.to_thread(ingest, file.file, file.filename, MAX_UPLOAD_BYTES, save_path)
 
 @app.post("/ocr/verify")
-async def verify_certificate(file: UploadFile = File(...)):
+async def verify_certificate(file: UploadFile = File(...), heatmap: bool = True, evidence: bool = False,
+                             proof: str = Form(None)):
+    inclusion_proof = parse_proof(proof)
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        upload_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{file.filename}")
-        
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 1. Extract fields
-        extracted_data = extract_fields(upload_path)
-        print(f"Extracted data: {extracted_data}")
-        
-        # 2. Update certificates2.csv - THIS IS THE KEY FIX
-        csv_updated = update_certificates_csv(extracted_data)
-        if not csv_updated:
-            print("Warning: CSV update failed, continuing with verification")
-        
-        # 3. Generate heatmap
-        heatmap_filename = f"heatmap_{timestamp}.png"
-        heatmap_path = os.path.join(HEATMAP_FOLDER, heatmap_filename)
-        ssim_score = generate_ssim_heatmap(REFERENCE_IMAGE_PATH, upload_path, heatmap_path)
-        
-        # 4. Run blockchain verification
-        verification_results = run_blockchain_verification()
-        
-        # 5. Get verification result
-        generated_hash = generate_hash(extracted_data)
-        is_valid = False
-        validation_reason = "Certificate not found in blockchain"
-        blockchain_status = "INVALID"
-        
-        if verification_results:
-            last_result = verification_results[-1] if verification_results else None
-            
-            if last_result:
-                is_valid = last_result.get('isValid', False)
-                blockchain_status = last_result.get('status', 'INVALID')
-                
-                if is_valid:
-                    validation_reason = "Certificate hash matches blockchain record. This certificate is authentic and has been verified against the university's blockchain ledger."
-                else:
-                    validation_reason = "Certificate hash does NOT match any blockchain record. This certificate may be forged, altered, or not issued by the claimed institution."
-        
-        return JSONResponse({
-            "status": "success",
-            "extracted_data": extracted_data,
-            "heatmap_url": f"/heatmap/{heatmap_filename}",
-            "ssim_score": float(ssim_score) if ssim_score else 0.0,
-            "blockchain_hash": generated_hash,
-            "is_valid": is_valid,
-            "validation_reason": validation_reason,
-            "verification_status": blockchain_status,
-            "csv_updated": csv_updated
-        })
-        
+        upload = await ingest_upload(file)
+        return JSONResponse(await run_verification(upload, heatmap=heatmap, evidence=evidence,
+                                                   proof=inclusion_proof))
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadUnreadable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except StageTimeout as e:
+        print(f"Timeout in verify_certificate: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"Error in verify_certificate: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def verify_job(job, upload, heatmap, evidence, proof=None):
+    # Queued jobs wait for a pool slot instead of bouncing with 503.
+    while True:
+        try:
+            return await run_verification(upload, job.progress, heatmap, evidence, proof)
+        except ExecutorBusy as e:
+            await asyncio.sleep(min(e.retry_after, 1))
+
+@app.post("/ocr/jobs", status_code=202)
+async def submit_verification_job(file: UploadFile = File(...), heatmap: bool = True, evidence: bool = False,
+                                  proof: str = Form(None)):
+    inclusion_proof = parse_proof(proof)
+    try:
+        upload = await ingest_upload(file)
+        job = JOBS.submit(lambda job: verify_job(job, upload, heatmap, evidence, inclusion_proof))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return JSONResponse({"job_id": job.id, "state": job.state, "status_url": f"/ocr/jobs/{job.id}",
+                         "events_url": f"/ocr/jobs/{job.id}/events"}, status_code=202)
+
+@app.get("/ocr/jobs/{job_id}")
+async def get_verification_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return JSONResponse(job.status())
+
+@app.get("/ocr/jobs/{job_id}/events")
+async def stream_verification_job(job_id: str):
+    """Server-sent events: one `progress` event per stage, then `done` or `failed`."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    async def events():
+        seen = 0
+        while True:
+            await job.wait(seen)
+            for event in job.events[seen:]:
+                if event['stage'] == 'done':
+                    yield f"event: done\ndata: {json.dumps(job.result)}\n\n"
+                elif event['stage'] == 'failed':
+                    yield f"event: failed\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            seen = len(job.events)
+            if job.finished is not None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def verify_batch_item(index, upload, scored, heatmap=True, evidence=False, probe=None, near=None):
+    """SSIM, store and chain stages for one certificate whose fields are already OCR'd."""
+    filename, upload_digest = upload.filename, upload.digest
+    extracted_data, confidence = scored
+    try:
+        template, template_match = TEMPLATE_STORE.select(university_name=extracted_data.get('University Name'))
+
+        with timed('hash'):
+            generated_hash = generate_hash(extracted_data)
+        with timed('record'):
+            recorded = await asyncio.to_thread(VERIFICATION_STORE.record, extracted_data, generated_hash)
+        reused = await near_duplicate_payload(near, upload_digest, generated_hash, recorded, heatmap, evidence)
+        if reused is not None:
+            reused.update({"index": index, "filename": filename})
+            return reused
+        with timed('chain'):
+            is_valid = await EXECUTOR.run('chain', chain_verdict, generated_hash, in_process=False)
+        stages_run = ['ocr', 'chain']
+        rejected = None if is_valid else POLICY.unreadable(extracted_data, confidence)
+
+        ssim = None
+        if POLICY.wants_ssim(evidence, is_valid):
+            if template_match == 'default':
+                template, template_match = await asyncio.to_thread(TEMPLATE_STORE.select, None, upload.gray)
+            with timed('ssim'):
+                ssim = await EXECUTOR.run('ssim', generate_ssim_heatmap, template.path, upload.decode(), heatmap,
+                                          template.fields)
+            stages_run.append('ssim')
+        else:
+            EARLY_EXITS.inc('not_on_chain' if rejected is None else 'unreadable')
+        heatmap_filename = ssim["heatmap_filename"] if ssim else None
+
+        result = cacheable_result(extracted_data, heatmap_filename, ssim, template, template_match, generated_hash,
+                                  confidence, stages_run, rejected)
+        RESULT_CACHE.put(result_cache_key(upload_digest), result)
+        if probe is not None:
+            await asyncio.to_thread(NEAR_DUPLICATES.remember, probe, upload_digest, result, TEMPLATE_STORE.version)
+        payload = verification_payload(extracted_data, heatmap_filename, ssim, template.institution,
+                                       template_match, generated_hash, is_valid, recorded, confidence,
+                                       stages_run, rejected, ssim_skipped='ssim' not in stages_run)
+    except Exception as e:
+        print(f"Error verifying batch item {filename}: {e}")
+        payload = {"status": "error", "detail": str(e)}
+    finally:
+        upload.release()
+    payload.update({"index": index, "filename": filename})
+    return payload
+
+@app.post("/ocr/verify/batch")
+async def verify_certificate_batch(files: List[UploadFile] = File(...), heatmap: bool = True,
+                                   evidence: bool = False):
+    """
+    Verify many certificates in one call. Results stream back as NDJSON,
+    one line per certificate in completion order (each line carries the
+    upload's index and filename).
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+
+    try:
+        # Held until the stream finishes, not just until this handler returns.
+        # Each chunk in flight beyond the first takes a slot of its own.
+        EXECUTOR.acquire()
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filenames = [f.filename for f in files]
+    save_paths = [os.path.join(UPLOAD_FOLDER, f"{timestamp}_{i}_{f.filename}") if KEEP_UPLOADS else None
+                  for i, f in enumerate(files)]
+    try:
+        uploads = await asyncio.gather(*(
+            asyncio.to_thread(ingest, f.file, f.filename, MAX_UPLOAD_BYTES, p) for f, p in zip(files, save_paths)
+        ))
+    except UploadTooLarge as e:
+        EXECUTOR.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    digests = [u.digest for u in uploads]
+
+    def decode_chunk(indices):
+        # Decoded per chunk, not up front, so only the BATCH_IN_FLIGHT chunks being OCR'd hold pixels.
+        decoded, errors = [], []
+        for i in indices:
+            try:
+                uploads[i].decode()
+                decoded.append(i)
+            except UploadUnreadable as e:
+                errors.append({"status": "error", "detail": str(e), "index": i, "filename": filenames[i]})
+        return decoded, errors
+
+    async def ocr_chunk(indices):
+        indices, answered = await asyncio.to_thread(decode_chunk, indices)
+        # Copies of blacklisted forgeries are answered without OCR
+        checked = dict(zip(indices, await asyncio.gather(*(near_duplicate_check(uploads[i]) for i in indices))))
+        forged = [i for i, (_, near) in checked.items() if near is not None and near["kind"] == 'blacklist']
+        for i in forged:
+            uploads[i].release()
+            answered.append(dict(known_forgery_payload(checked[i][1]), index=i, filename=filenames[i]))
+        indices = [i for i in indices if i not in forged]
+        if not indices:
+            return answered
+        try:
+            with timed('ocr_batch'):
+                fields = await EXECUTOR.run('ocr_batch', extract_fields_batch, [uploads[i].gray for i in indices])
+        except Exception as e:
+            print(f"Error in batch OCR: {e}")
+            for i in indices:
+                uploads[i].release()
+            return answered + [{"status": "error", "detail": str(e), "index": i, "filename": filenames[i]} for i in indices]
+        return answered + list(await asyncio.gather(*(
+            verify_batch_item(i, uploads[i], f, heatmap, evidence, *checked[i]) for i, f in zip(indices, fields)
+        )))
+
+    async def stream():
+        held, in_flight = 1, set()
+        try:
+            # Cached uploads answer straight away; only the rest go to OCR
+            pending = []
+            for i, digest in enumerate(digests):
+                payload = await cached_payload(digest, heatmap, evidence)
+                if payload is None:
+                    pending.append(i)
+                    continue
+                payload.update({"index": i, "filename": filenames[i]})
+                yield json.dumps(payload) + "\n"
+
+            # One OCR task per chunk, up to BATCH_IN_FLIGHT at once so several
+            # workers batch in parallel; each chunk's lines are written as soon
+            # as it finishes and the next chunk starts in its place.
+            chunks = [pending[i:i + OCR_BATCH_SIZE] for i in range(0, len(pending), OCR_BATCH_SIZE)]
+            chunks.reverse()
+            while chunks or in_flight:
+                while chunks and len(in_flight) < BATCH_IN_FLIGHT:
+                    if len(in_flight) >= held:
+                        try:
+                            EXECUTOR.acquire()
+                        except ExecutorBusy:
+                            break  # make do with the slots already held
+                        held += 1
+                    in_flight.add(asyncio.ensure_future(ocr_chunk(chunks.pop())))
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for payload in task.result():
+                        yield json.dumps(payload) + "\n"
+        finally:
+            for task in in_flight:
+                task.cancel()
+            for _ in range(held):
+                EXECUTOR.release()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/ocr/proofs/{certificate_hash}")
+async def get_inclusion_proof(certificate_hash: str):
+    """The Merkle inclusion proof of a certificate issued in an anchored batch, to present with it."""
+    proof = await asyncio.to_thread(ANCHOR_STORE.proof_for, certificate_hash.lower())
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Certificate is not in any anchored batch")
+    return {"certificate_hash": certificate_hash.lower(), "proof": proof,
+            "anchored": ROOT_INDEX.contains(proof["root"])}
+
 @app.get("/heatmap/{filename}")
-async def get_heatmap(filename: str):
-    file_path = os.path.join(HEATMAP_FOLDER, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Heatmap not found")
-    return FileResponse(file_path)
+async def get_heatmap(filename: str, if_none_match: str = Header(None)):
+    return HEATMAP_STORE.response(filename, if_none_match)
+
+METRICS.observe('ocr_in_flight', "Verifications holding an admission slot", lambda: EXECUTOR.active)
+METRICS.observe('ocr_capacity', "Admission slots (workers + pending)", lambda: EXECUTOR.capacity)
+METRICS.observe('ocr_jobs_queued', "Asynchronous jobs waiting for a worker", lambda: JOBS.queued)
+METRICS.observe('ocr_result_cache_hits_total', "Result cache hits", lambda: RESULT_CACHE.hits, 'counter')
+METRICS.observe('ocr_result_cache_misses_total', "Result cache misses", lambda: RESULT_CACHE.misses, 'counter')
+METRICS.observe('ocr_store_pending', "Verification rows queued for the store writer",
+                lambda: VERIFICATION_STORE.pending)
+METRICS.observe('ocr_store_write_failures_total', "Failed verification store commits",
+                lambda: VERIFICATION_STORE.write_failures, 'counter')
+METRICS.observe('ocr_chain_index_size', "Certificate hashes known to the chain index", lambda: len(CHAIN_INDEX))
+METRICS.observe('ocr_chain_refresh_failures_total', "Failed chain event fetches",
+                lambda: CHAIN_INDEX.refresh_failures, 'counter')
+METRICS.observe('ocr_anchored_roots', "Merkle roots known to the root index", lambda: len(ROOT_INDEX))
+METRICS.observe('ocr_anchored_batches', "Anchored batches loaded for proofs", lambda: len(ANCHOR_STORE))
+METRICS.observe('ocr_near_duplicate_fingerprints', "Fingerprints in the near-duplicate index",
+                lambda: len(NEAR_DUPLICATES))
+METRICS.observe('ocr_chain_index_ready', "1 once the chain index has loaded", lambda: int(CHAIN_INDEX.ready))
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(token):
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required (set ADMIN_TOKEN on the server)")
+
+@app.get("/admin/profiles")
+async def list_profiles(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    profiles = PROFILE_STORE.list()
+    for profile in profiles:
+        profile["download_url"] = f"/admin/profiles/{profile['id']}"
+        profile["summary_url"] = f"/admin/profiles/{profile['id']}?format=text"
+    return {"profiles": profiles}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = 'pstats', x_admin_token: str = Header(None)):
+    """The saved profile: pstats binary (default) or the text summary with format=text."""
+    require_admin(x_admin_token)
+    path = PROFILE_STORE.path_for(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == 'text':
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.post("/admin/near-duplicates/blacklist")
+async def blacklist_image(file: UploadFile = File(...), note: str = Form(''), x_admin_token: str = Header(None)):
+    """Blacklist a forged certificate image: later copies of it are rejected before OCR."""
+    require_admin(x_admin_token)
+    try:
+        upload = await ingest_upload(file)
+        await asyncio.to_thread(upload.decode)
+        probe = await asyncio.to_thread(NEAR_DUPLICATES.probe, upload.gray)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadUnreadable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    entry_id = await asyncio.to_thread(NEAR_DUPLICATES.blacklist, probe, upload.digest, note)
+    upload.release()
+    return {"id": entry_id, "upload_digest": upload.digest, "fingerprints": len(NEAR_DUPLICATES)}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "ocr_ready": READER is not None}
+    return {"status": "healthy", "ocr_ready": EXECUTOR.warm_state == 'ready',
+            "ocr_state": EXECUTOR.warm_state, "in_flight": EXECUTOR.active, "jobs_queued": JOBS.queued,
+            "chain_index_ready": CHAIN_INDEX.ready, "chain_index_size": len(CHAIN_INDEX),
+            "anchored_roots": len(ROOT_INDEX)}
 
 # --- Combined Main Execution (Corrected Order) ---
 if __name__ == "__main__":
@@ -278,7 +917,7 @@ if __name__ == "__main__":
     if not os.path.exists(TEST_IMAGE_PATH):
         print(f"\nFATAL: Image file not found at path: {TEST_IMAGE_PATH}.")
         print("Please check the filename and ensure the image is in the same directory.")
-    elif READER is None:
+    elif OCR_READER.get() is None:
         print("\nFATAL: EasyOCR initialization failed. Check console for error messages.")
     else:
         # Run extraction
@@ -0,0 +1,83 @@
+import hashlib
+from typing import Dict, List, Optional, Sequence
+
+# Leaves and inner nodes are hashed under different prefixes so an inner
+# node can never be passed off as a certificate.
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(certificate_hash: str) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(certificate_hash)).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """
+    Binary SHA-256 tree over a batch of certificate hashes (generate_hash
+    output, in batch order). A node left without a partner at any level
+    is carried up unchanged, so nothing is ever hashed twice.
+    """
+
+    def __init__(self, certificate_hashes: Sequence[str]):
+        if not certificate_hashes:
+            raise ValueError("A Merkle tree needs at least one certificate hash")
+        self.hashes = list(certificate_hashes)
+        level = [leaf_hash(h) for h in self.hashes]
+        self.levels = [level]
+        while len(level) > 1:
+            parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+            level = parents
+        self._positions: Optional[Dict[str, int]] = None
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1][0].hex()
+
+    def index_of(self, certificate_hash: str) -> Optional[int]:
+        if self._positions is None:
+            self._positions = {h: i for i, h in enumerate(self.hashes)}
+        return self._positions.get(certificate_hash)
+
+    def proof(self, index: int) -> dict:
+        """
+        Inclusion proof for the leaf at `index`: the root, the leaf's
+        position and the batch size (which fix the path), and the sibling
+        hashes from the leaf up.
+        """
+        siblings, position = [], index
+        for level in self.levels[:-1]:
+            if position ^ 1 < len(level):
+                siblings.append(level[position ^ 1].hex())
+            position //= 2
+        return {'root': self.root, 'index': index, 'size': len(self.hashes), 'siblings': siblings}
+
+
+def verify_proof(certificate_hash: str, proof: dict) -> bool:
+    """Whether `proof` leads from `certificate_hash` to proof['root']."""
+    try:
+        index, size = int(proof['index']), int(proof['size'])
+        siblings: List[bytes] = [bytes.fromhex(s) for s in proof['siblings']]
+        node = leaf_hash(certificate_hash)
+        root = str(proof['root']).lower()
+    except (KeyError, TypeError, ValueError):
+        return False
+    if not 0 <= index < size:
+        return False
+
+    remaining = iter(siblings)
+    while size > 1:
+        if index ^ 1 < size:
+            sibling = next(remaining, None)
+            if sibling is None:
+                return False
+            node = node_hash(sibling, node) if index % 2 else node_hash(node, sibling)
+        index //= 2
+        size = (size + 1) // 2
+    return next(remaining, None) is None and node.hex() == root
@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# ====================================================================
+# CONFIGURATION
+# Latency histogram bucket upper bounds in seconds. METRICS_SERVER_TIMING=0
+# stops adding the Server-Timing response header (the histograms stay).
+# ====================================================================
+METRICS_BUCKETS = tuple(float(b) for b in os.environ.get(
+    'METRICS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(','))
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing count, one series per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets, one series per label set.
+
+    observe() is a bisect and three additions under a lock, so it can sit
+    on the request path; the cumulative form Prometheus wants is only
+    built when /metrics is scraped.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Observed:
+    """A gauge or counter whose value is read from the application at scrape time."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float], kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._read = read
+
+    def samples(self) -> List[str]:
+        try:
+            return [f"{self.name} {_number(self._read())}"]
+        except Exception:
+            return []
+
+
+class MetricsRegistry:
+    """Every metric the service exports, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = METRICS_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def observe(self, name: str, help: str, read: Callable[[], float], kind: str = 'gauge') -> Observed:
+        return self._add(Observed(name, help, read, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    'ocr_stage_duration_seconds', "Time spent in each verification stage", ('stage',))
+STAGE_FAILURES = METRICS.counter(
+    'ocr_stage_failures_total', "Verification stages that raised, by stage and exception", ('stage', 'error'))
+EARLY_EXITS = METRICS.counter(
+    'ocr_early_exits_total', "Verifications that skipped stages under the verdict policy, by reason", ('reason',))
+NEAR_DUPLICATE_HITS = METRICS.counter(
+    'ocr_near_duplicate_hits_total', "Uploads answered from a near-duplicate before OCR, by match kind", ('kind',))
+REQUEST_SECONDS = METRICS.histogram(
+    'http_request_duration_seconds', "HTTP request latency by endpoint and status", ('endpoint', 'status'))
+
+# Stage timings of the current request, for its Server-Timing header.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time the enclosed block (which may await) as `stage`: one histogram
+    observation, a failure count if it raises, and an entry in the
+    current request's Server-Timing header.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_FAILURES.inc(stage, type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    # Stages that ran more than once (an SSIM re-run) are summed
+    merged: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        merged[stage] = merged.get(stage, 0.0) + elapsed
+    parts = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
+
+
+class RequestMetrics:
+    """
+    ASGI middleware that records every request's latency and adds a
+    Server-Timing header built from the stages `timed()` saw during it.
+    """
+
+    def __init__(self, app, server_timing_header: bool = METRICS_SERVER_TIMING):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        timings = []
+        token = _request_timings.set(timings)
+        status = [500]
+
+        async def timed_send(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                if self.server_timing_header:
+                    header = server_timing(timings, time.perf_counter() - started)
+                    message['headers'] = list(message.get('headers', [])) + [(b'server-timing', header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _request_timings.reset(token)
+            # The router stores the matched endpoint in the scope; label by
+            # its name so /heatmap/<hash> doesn't create a series per file.
+            endpoint = scope.get('endpoint')
+            REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                    getattr(endpoint, '__name__', 'unmatched'), str(status[0]))
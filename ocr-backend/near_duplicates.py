@@ -0,0 +1,357 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from phash_index import hamming
+
+# ====================================================================
+# CONFIGURATION
+# Before OCR, each upload is looked up among the images verified before it
+# and the ones blacklisted as known forgeries. A whole-page dHash can't do
+# this alone: certificates printed from one template are within a few
+# bits of each other however their names and roll numbers differ. So:
+#   - the lookup key is a difference hash on a NEAR_DUP_GRID grid with a
+#     dead band, so flat paper reads 0 through recompression noise while
+#     text edges are resolved to about a character. It is indexed in
+#     NEAR_DUP_CHUNK_BITS-bit chunks, and a candidate must share at least
+#     one chunk exactly. A chunk value shared by more than
+#     NEAR_DUP_MAX_BUCKET fingerprints (template text, margins) is not
+#     probed, which keeps a lookup at a handful of candidates with
+#     millions of entries. Only entry ids are kept in memory; candidates'
+#     fingerprints are read back from SQLite.
+#   - a candidate within NEAR_DUP_RADIUS bits is the same image only if
+#     its stored NEAR_DUP_THUMB thumbnail matches the upload's to within
+#     NEAR_DUP_MAX_PIXEL_DIFF grey levels everywhere. Recompression and
+#     rescaling stay well inside that, but so can one digit swapped for
+#     another at this resolution.
+# A blacklisted match rejects the upload outright. A verdict match only
+# saves the SSIM stage: the upload is still OCR'd, and the stored verdict
+# is reused only if its fields hash the same. The key survives
+# recompression, rescaling and brightness changes, not a shift: a rescan
+# or photo of a certificate moves it by a few pixels, flips hundreds of
+# bits and is verified in full (benchmark_near_duplicates.py measures
+# both), as are uploads whose matching verdict predates the current
+# templates.
+# Verdicts older than NEAR_DUP_TTL seconds are deleted, then the oldest
+# beyond NEAR_DUP_MAX_VERDICTS. Blacklist entries are kept until removed
+# by hand.
+# ====================================================================
+NEAR_DUP = os.environ.get('NEAR_DUP', '1') == '1'
+NEAR_DUP_DB = os.environ.get('NEAR_DUP_DB', 'data/fingerprints.db')
+NEAR_DUP_GRID = (128, 48)  # columns x rows of the key
+NEAR_DUP_DEADBAND = 8  # grey levels a neighbour must be brighter by to set a bit
+NEAR_DUP_CHUNK_BITS = int(os.environ.get('NEAR_DUP_CHUNK_BITS', 64))
+NEAR_DUP_RADIUS = int(os.environ.get('NEAR_DUP_RADIUS', 34))
+NEAR_DUP_MAX_BUCKET = int(os.environ.get('NEAR_DUP_MAX_BUCKET', 32))
+# Ids sharing the most chunks with an upload whose fingerprints are read
+# back to measure their distance; the NEAR_DUP_MAX_CANDIDATES closest
+# within NEAR_DUP_RADIUS get the thumbnail check.
+NEAR_DUP_MAX_VOTED = int(os.environ.get('NEAR_DUP_MAX_VOTED', 256))
+NEAR_DUP_MAX_CANDIDATES = int(os.environ.get('NEAR_DUP_MAX_CANDIDATES', 16))
+NEAR_DUP_THUMB = (192, 136)
+NEAR_DUP_MAX_PIXEL_DIFF = float(os.environ.get('NEAR_DUP_MAX_PIXEL_DIFF', 32))
+NEAR_DUP_TTL = float(os.environ.get('NEAR_DUP_TTL', 7 * 24 * 3600))
+NEAR_DUP_MAX_VERDICTS = int(os.environ.get('NEAR_DUP_MAX_VERDICTS', 200_000))
+NEAR_DUP_PRUNE_INTERVAL = float(os.environ.get('NEAR_DUP_PRUNE_INTERVAL', 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id               INTEGER PRIMARY KEY,
+    kind             TEXT NOT NULL,
+    fingerprint      BLOB NOT NULL,
+    thumbnail        BLOB NOT NULL,
+    upload_digest    TEXT,
+    template_version TEXT,
+    result           TEXT,
+    note             TEXT,
+    created          REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fingerprints_kind_created ON fingerprints (kind, created);
+"""
+
+# A fingerprint (the key) and the thumbnail that confirms a match
+Probe = Tuple[int, np.ndarray]
+
+
+def banded_dhash(gray: np.ndarray, grid: Tuple[int, int] = NEAR_DUP_GRID,
+                 deadband: int = NEAR_DUP_DEADBAND) -> int:
+    cols, rows = grid
+    small = cv2.resize(gray, (cols + 1, rows), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] - small[:, :-1]) > deadband
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def pixel_diff(a: np.ndarray, b: np.ndarray) -> float:
+    """Largest grey-level difference between two thumbnails, ignoring an overall brightness shift."""
+    a = a.astype(np.int16) - int(np.median(a))
+    b = b.astype(np.int16) - int(np.median(b))
+    return float(np.abs(a - b).max())
+
+
+class ChunkIndex:
+    """
+    Entry ids by fingerprint chunk: the in-memory half of NearDuplicateIndex.
+
+    Unlike HammingIndex it keeps no fingerprints, only (chunk key, id)
+    postings, 12 bytes each in two sorted numpy arrays; a key is a chunk's
+    value mixed with its position. New postings wait in a dict and are
+    merged in once there are enough of them. A key held by more than
+    `max_bucket` entries is saturated for good: its postings are dropped
+    at the merge and it is never probed again. candidates() ranks ids by
+    how many chunks they share with the query; the caller measures the
+    real distances. Removed ids are filtered out until the next merge.
+    """
+
+    def __init__(self, bits: int, chunk_bits: int, max_bucket: int, merge_min: int = 4096):
+        if chunk_bits not in (32, 64):
+            raise ValueError(f"Chunks must be 32 or 64 bits, not {chunk_bits}")
+        self.bytes = bits // 8
+        self.chunks = bits // chunk_bits
+        self.max_bucket = max_bucket
+        self.merge_min = merge_min
+        self._dtype = np.dtype('>u4' if chunk_bits == 32 else '>u8')
+        self._positions = np.arange(self.chunks, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._ids = np.empty(0, dtype=np.uint32)
+        self._recent: Dict[int, List[int]] = {}
+        self._recent_postings = 0
+        self._saturated = set()
+        self._removed = set()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _chunk_keys(self, fingerprint: int) -> np.ndarray:
+        chunks = np.frombuffer(fingerprint.to_bytes(self.bytes, 'big'), dtype=self._dtype).astype(np.uint64)
+        return (chunks ^ self._positions) * np.uint64(0xBF58476D1CE4E5B9)
+
+    def add(self, fingerprint: int, entry_id: int):
+        for key in self._chunk_keys(fingerprint).tolist():
+            if key not in self._saturated:
+                self._recent.setdefault(key, []).append(entry_id)
+                self._recent_postings += 1
+        self._size += 1
+        if self._recent_postings >= max(self.merge_min, len(self._keys) // 32):
+            self._merge()
+
+    def remove(self, entry_id: int):
+        self._removed.add(entry_id)
+        self._size -= 1
+
+    def _merge(self):
+        keys = np.fromiter((k for k, ids in self._recent.items() for _ in ids), dtype=np.uint64,
+                           count=self._recent_postings)
+        ids = np.fromiter((i for ids in self._recent.values() for i in ids), dtype=np.uint32,
+                          count=self._recent_postings)
+        keys, ids = np.concatenate([self._keys, keys]), np.concatenate([self._ids, ids])
+        if self._removed:
+            kept = ~np.isin(ids, np.fromiter(self._removed, dtype=np.uint32))
+            keys, ids = keys[kept], ids[kept]
+        order = np.argsort(keys, kind='stable')
+        keys, ids = keys[order], ids[order]
+        unique, counts = np.unique(keys, return_counts=True)
+        full = unique[counts > self.max_bucket]
+        if len(full):
+            self._saturated.update(full.tolist())
+            kept = ~np.isin(keys, full)
+            keys, ids = keys[kept], ids[kept]
+        self._keys, self._ids = keys, ids
+        self._recent, self._recent_postings, self._removed = {}, 0, set()
+
+    def candidates(self, fingerprint: int, limit: int) -> List[int]:
+        keys = self._chunk_keys(fingerprint)
+        starts = np.searchsorted(self._keys, keys, 'left')
+        ends = np.searchsorted(self._keys, keys, 'right')
+        votes = Counter()
+        for key, start, end in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+            recent = self._recent.get(key, ())
+            if key in self._saturated or end - start + len(recent) > self.max_bucket:
+                continue
+            votes.update(self._ids[start:end].tolist())
+            votes.update(recent)
+        for entry_id in self._removed & votes.keys():
+            del votes[entry_id]
+        return [entry_id for entry_id, _ in votes.most_common(limit)]
+
+
+class NearDuplicateIndex:
+    """
+    Fingerprints of verified uploads and blacklisted forgeries, kept in
+    SQLite with their thumbnails and stored results, and in memory as a
+    ChunkIndex of entry ids. kind is 'verdict' (the upload's cacheable
+    result) or 'blacklist' (an image known to be forged).
+    """
+
+    def __init__(self, path: str = NEAR_DUP_DB, enabled: bool = NEAR_DUP, radius: int = NEAR_DUP_RADIUS,
+                 max_bucket: int = NEAR_DUP_MAX_BUCKET, max_voted: int = NEAR_DUP_MAX_VOTED,
+                 max_candidates: int = NEAR_DUP_MAX_CANDIDATES,
+                 max_pixel_diff: float = NEAR_DUP_MAX_PIXEL_DIFF, ttl: float = NEAR_DUP_TTL,
+                 max_verdicts: int = NEAR_DUP_MAX_VERDICTS, prune_interval: float = NEAR_DUP_PRUNE_INTERVAL,
+                 chunk_bits: int = NEAR_DUP_CHUNK_BITS):
+        self.path = path
+        self.enabled = enabled
+        self.radius = radius
+        self.max_voted = max_voted
+        self.max_candidates = max_candidates
+        self.max_pixel_diff = max_pixel_diff
+        self.ttl = ttl
+        self.max_verdicts = max(1, max_verdicts)
+        self.prune_interval = prune_interval
+        cols, rows = NEAR_DUP_GRID
+        self._index = ChunkIndex(bits=cols * rows, chunk_bits=chunk_bits, max_bucket=max_bucket)
+        self._index_lock = threading.Lock()
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._verdicts = 0
+        self._last_prune = time.monotonic()
+        # Bumped by every blacklisting; part of the result-cache key
+        self.blacklist_generation = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def load(self) -> int:
+        """Drop stale verdicts, then index every stored fingerprint. Returns how many were loaded."""
+        with self._db_lock:
+            self._delete_stale()
+            rows = self._db().execute('SELECT id, kind, fingerprint FROM fingerprints').fetchall()
+        with self._index_lock:
+            for entry_id, kind, fingerprint in rows:
+                self._index.add(int.from_bytes(fingerprint, 'big'), entry_id)
+                self.blacklist_generation += kind == 'blacklist'
+                self._verdicts += kind == 'verdict'
+        return len(rows)
+
+    def prune(self) -> int:
+        """Delete verdicts past ttl, then the oldest beyond max_verdicts. Returns how many were deleted."""
+        with self._db_lock:
+            deleted = self._delete_stale()
+        with self._index_lock:
+            for entry_id in deleted:
+                self._index.remove(entry_id)
+        return len(deleted)
+
+    def _delete_stale(self) -> List[int]:
+        # Caller holds _db_lock
+        conn = self._db()
+        cutoff = time.time() - self.ttl
+        stale = [row[0] for row in conn.execute("SELECT id FROM fingerprints WHERE kind = 'verdict' AND created < ?",
+                                                (cutoff,))]
+        kept = conn.execute("SELECT COUNT(*) FROM fingerprints WHERE kind = 'verdict' AND created >= ?",
+                            (cutoff,)).fetchone()[0]
+        if kept > self.max_verdicts:
+            # Trim 1% below the cap so the next inserts don't each prune again
+            excess = kept - self.max_verdicts + self.max_verdicts // 100
+            stale += [row[0] for row in conn.execute("SELECT id FROM fingerprints WHERE kind = 'verdict' "
+                                                     "AND created >= ? ORDER BY created LIMIT ?", (cutoff, excess))]
+        if stale:
+            with conn:
+                conn.executemany('DELETE FROM fingerprints WHERE id = ?', [(entry_id,) for entry_id in stale])
+        self._verdicts = conn.execute("SELECT COUNT(*) FROM fingerprints WHERE kind = 'verdict'").fetchone()[0]
+        self._last_prune = time.monotonic()
+        return stale
+
+    def probe(self, gray: np.ndarray) -> Probe:
+        thumbnail = cv2.resize(gray, NEAR_DUP_THUMB, interpolation=cv2.INTER_AREA)
+        return banded_dhash(gray), thumbnail
+
+    def match(self, probe: Probe, template_version: str) -> Optional[dict]:
+        """
+        The stored entry this upload looks like a copy of, blacklisted ones
+        first, or None. Verdicts recorded under other templates don't count.
+        A match can still differ from the upload in a character or two.
+        """
+        fingerprint, thumbnail = probe
+        with self._index_lock:
+            voted = self._index.candidates(fingerprint, self.max_voted)
+        if not voted:
+            return None
+        with self._db_lock:
+            blobs = self._db().execute(
+                f"SELECT id, fingerprint FROM fingerprints WHERE id IN ({','.join('?' * len(voted))})",
+                voted).fetchall()
+        found = sorted((hamming(fingerprint, int.from_bytes(blob, 'big')), entry_id) for entry_id, blob in blobs)
+        distances = {entry_id: d for d, entry_id in found[:self.max_candidates] if d <= self.radius}
+        if not distances:
+            return None
+        with self._db_lock:
+            rows = self._db().execute(
+                f"SELECT id, kind, thumbnail, upload_digest, template_version, result, note, created "
+                f"FROM fingerprints WHERE id IN ({','.join('?' * len(distances))})", list(distances)).fetchall()
+
+        matches: List[dict] = []
+        for entry_id, kind, stored_thumbnail, digest, version, result, note, created in rows:
+            if kind == 'verdict' and version != template_version:
+                continue
+            stored = cv2.imdecode(np.frombuffer(stored_thumbnail, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if stored is None or stored.shape != thumbnail.shape:
+                continue
+            diff = pixel_diff(thumbnail, stored)
+            if diff > self.max_pixel_diff:
+                continue
+            matches.append({'id': entry_id, 'kind': kind, 'distance': distances[entry_id], 'pixel_diff': diff,
+                            'upload_digest': digest, 'note': note, 'created': created,
+                            'result': json.loads(result) if result else None})
+        if not matches:
+            return None
+        return min(matches, key=lambda m: (m['kind'] != 'blacklist', m['pixel_diff'], m['distance']))
+
+    def remember(self, probe: Probe, upload_digest: str, result: dict, template_version: str) -> Optional[int]:
+        """Store a verified upload's result for later copies of it, pruning old verdicts now and then."""
+        try:
+            encoded = json.dumps(result)
+        except (TypeError, ValueError) as e:
+            print(f"Error storing near-duplicate fingerprint: {e}")
+            return None
+        entry_id = self._insert('verdict', probe, upload_digest, template_version, encoded, None)
+        self._verdicts += 1
+        if self._verdicts > self.max_verdicts or time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+        return entry_id
+
+    def blacklist(self, probe: Probe, upload_digest: str, note: str = '') -> int:
+        """
+        Reject copies of this image from now on. Bumps blacklist_generation,
+        so cached results, including those of other copies, stop being served.
+        """
+        entry_id = self._insert('blacklist', probe, upload_digest, None, None, note)
+        self.blacklist_generation += 1
+        return entry_id
+
+    def _insert(self, kind, probe, upload_digest, template_version, result, note) -> int:
+        fingerprint, thumbnail = probe
+        cols, rows = NEAR_DUP_GRID
+        ok, png = cv2.imencode('.png', thumbnail)
+        if not ok:
+            raise ValueError("Could not encode fingerprint thumbnail")
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                cursor = conn.execute(
+                    'INSERT INTO fingerprints (kind, fingerprint, thumbnail, upload_digest, template_version, '
+                    'result, note, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (kind, fingerprint.to_bytes(cols * rows // 8, 'big'), png.tobytes(), upload_digest,
+                     template_version, result, note, time.time()))
+            entry_id = cursor.lastrowid
+        with self._index_lock:
+            self._index.add(fingerprint, entry_id)
+        return entry_id
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# ====================================================================
+# CONFIGURATION
+# OCR_PRELOAD=lazy     build the reader on first use (default)
+# OCR_PRELOAD=prefork  build it while this module is imported, so a
+#                      pre-forking server (gunicorn --preload, or the fork
+#                      based verification pool) shares the weights
+#                      copy-on-write with every worker
+# ====================================================================
+OCR_LANGUAGES = os.environ.get('OCR_LANGUAGES', 'en').split(',')
+OCR_GPU = os.environ.get('OCR_GPU', '0') == '1'
+OCR_PRELOAD = os.environ.get('OCR_PRELOAD', 'lazy')
+
+
+class ReaderProvider:
+    """
+    One EasyOCR reader per process, built on demand.
+
+    Importing this module costs nothing: easyocr (and torch behind it) is
+    only imported when the reader is first needed, so the server can answer
+    /health while the models are still loading.
+    """
+
+    def __init__(self, languages=OCR_LANGUAGES, gpu: bool = OCR_GPU):
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.state = 'idle'  # idle -> loading -> loaded -> ready, or failed
+        self.error = None
+        self.load_seconds = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The shared reader, loading it if needed. None if loading failed."""
+        if self._reader is not None:
+            return self._reader
+        with self._lock:
+            if self._reader is None and self.state != 'failed':
+                self._load()
+        return self._reader
+
+    def _load(self):
+        self.state = 'loading'
+        started = time.perf_counter()
+        try:
+            import easyocr
+            self._reader = easyocr.Reader(self.languages, gpu=self.gpu)
+            self.load_seconds = time.perf_counter() - started
+            self.state = 'loaded'
+            print(f"✅ EasyOCR loaded in {self.load_seconds:.1f}s (pid {os.getpid()})")
+        except Exception as e:
+            print(f"Error initializing EasyOCR: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+
+    def warm(self) -> bool:
+        """Load the reader and run one tiny inference so lazy setup is paid up front."""
+        reader = self.get()
+        if reader is None:
+            return False
+        if self.state != 'ready':
+            reader.readtext(np.full((32, 128), 255, dtype=np.uint8))
+            self.state = 'ready'
+        return True
+
+    def status(self):
+        return {'state': self.state, 'error': self.error, 'load_seconds': self.load_seconds}
+
+
+OCR_READER = ReaderProvider()
+
+if OCR_PRELOAD == 'prefork':
+    # Load only; no inference here, so torch hasn't started its thread pool
+    # when the process forks.
+    OCR_READER.get()
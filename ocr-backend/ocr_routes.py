@@ -1,29 +1,38 @@
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import FileResponse
-from ocr_service import process_certificate
-import uuid, os
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header
+from ocr_service import process_certificate, STATIC_HEATMAPS
+from upload_ingest import ingest, UploadTooLarge, UploadUnreadable
+import asyncio
 
 router = APIRouter(prefix="/ocr", tags=["OCR"])
 
+@router.on_event("startup")
+async def start_heatmap_janitor():
+    STATIC_HEATMAPS.start()
+
+@router.on_event("shutdown")
+async def stop_heatmap_janitor():
+    STATIC_HEATMAPS.stop()
+
 @router.post("/verify")
 async def verify_certificate(file: UploadFile = File(...)):
-    # Unique filename
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    file_path = f"static/{filename}"
-
-    # Save uploaded file temporarily
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Read, size-check and decode in memory; nothing is written to static/
+    try:
+        upload = await asyncio.to_thread(ingest, file.file, file.filename)
+        image = await asyncio.to_thread(upload.decode)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadUnreadable as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # Run OCR + Heatmap
-    extracted_data, heatmap_path = process_certificate(file_path)
+    extracted_data, heatmap_filename = process_certificate(image)
 
     return {
         "status": "success",
         "extracted_data": extracted_data,
-        "heatmap_url": f"/ocr/heatmap/{os.path.basename(heatmap_path)}"
+        "heatmap_url": f"/ocr/heatmap/{heatmap_filename}" if heatmap_filename else None
     }
 
 @router.get("/heatmap/{filename}")
-async def get_heatmap(filename: str):
-    return FileResponse(f"static/heatmaps/{filename}")
+async def get_heatmap(filename: str, if_none_match: str = Header(None)):
+    return STATIC_HEATMAPS.response(filename, if_none_match)
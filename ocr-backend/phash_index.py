@@ -0,0 +1,110 @@
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+HASH_SIZE = 8  # 8x8 difference hash -> 64-bit fingerprint
+
+
+def dhash(image: np.ndarray, hash_size: int = HASH_SIZE) -> int:
+    """
+    Difference hash of an image (BGR or grayscale).
+
+    The image is shrunk to (hash_size + 1) x hash_size and each bit records
+    whether a pixel is brighter than its right-hand neighbour, which
+    survives rescaling, recompression and small colour shifts.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def dhash_file(path: str, hash_size: int = HASH_SIZE) -> Optional[int]:
+    # A reduced decode is plenty for a 9x8 thumbnail and much cheaper.
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    return dhash(image, hash_size)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over integer fingerprints under Hamming distance.
+
+    Each fingerprint is split into `chunks` substrings, each with its own
+    hash table. Two fingerprints within distance r must agree to within
+    r // chunks bits on at least one substring (pigeonhole), so a query only
+    probes the few buckets around each of its substrings and verifies the
+    candidates found there instead of scanning every stored hash.
+
+    With `max_bucket`, a bucket that fills up stops growing and is no
+    longer probed: a substring that many fingerprints share (a margin, a
+    line of template text) narrows nothing down. Fingerprints are then
+    found through their rarer substrings only.
+    """
+
+    def __init__(self, bits: int = HASH_SIZE * HASH_SIZE, chunks: int = 4, max_bucket: Optional[int] = None):
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self.max_bucket = max_bucket
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, Optional[List[Tuple[int, Any]]]]] = [{} for _ in range(chunks)]
+        self._flip_masks: Dict[int, List[int]] = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _split(self, fingerprint: int) -> List[int]:
+        return [(fingerprint >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def _masks_within(self, distance: int) -> List[int]:
+        # Every chunk-sized bit mask with at most `distance` bits set.
+        masks = self._flip_masks.get(distance)
+        if masks is None:
+            masks = [0]
+            for k in range(1, distance + 1):
+                for bits in combinations(range(self.chunk_bits), k):
+                    masks.append(sum(1 << b for b in bits))
+            self._flip_masks[distance] = masks
+        return masks
+
+    def add(self, fingerprint: int, value: Any):
+        entry = (fingerprint, value)
+        for table, key in zip(self._tables, self._split(fingerprint)):
+            bucket = table.setdefault(key, [])
+            if bucket is None:
+                continue
+            if self.max_bucket is not None and len(bucket) >= self.max_bucket:
+                table[key] = None  # saturated
+                continue
+            bucket.append(entry)
+        self._size += 1
+
+    def search(self, fingerprint: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, value) pairs within `radius`, closest first."""
+        masks = self._masks_within(radius // self.chunks)
+        seen = set()
+        found = []
+        for table, key in zip(self._tables, self._split(fingerprint)):
+            for mask in masks:
+                for entry in table.get(key ^ mask) or ():
+                    if id(entry) in seen:
+                        continue
+                    seen.add(id(entry))
+                    d = hamming(fingerprint, entry[0])
+                    if d <= radius:
+                        found.append((d, entry[1]))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def nearest(self, fingerprint: int, radius: int) -> Optional[Tuple[int, Any]]:
+        found = self.search(fingerprint, radius)
+        return found[0] if found else None
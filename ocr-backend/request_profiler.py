@@ -0,0 +1,194 @@
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# ====================================================================
+# CONFIGURATION
+# A request is profiled when it asks to be (X-Profile: 1 header or
+# ?profile=1, both honoured only with a valid X-Admin-Token) or when it
+# falls in the PROFILE_SAMPLE_RATE fraction of traffic (0 = never).
+# Profiles are kept in PROFILE_DIR, newest PROFILE_KEEP of them.
+# ADMIN_TOKEN unset disables the flag and the admin endpoints entirely.
+# ====================================================================
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'data/profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_TOP_FUNCTIONS = 40
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def run_profiled(fn, *args):
+    """
+    Run fn(*args) under cProfile. Executed wherever the stage runs (a pool
+    worker or a thread); returns (result, marshalled stats) so the parent
+    can merge the stats of every stage of one request.
+    """
+    profile = cProfile.Profile()
+    result = profile.runcall(fn, *args)
+    profile.create_stats()
+    return result, marshal.dumps(profile.stats)
+
+
+class _LoadedStats:
+    # pstats.Stats accepts any object with create_stats() and .stats
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfile:
+    """The cProfile stats of one request's stages, collected as they finish."""
+
+    def __init__(self, profile_id: str, path: str, reason: str):
+        self.id = profile_id
+        self.path = path
+        self.reason = reason  # 'requested' or 'sampled'
+        self.started = time.time()
+        self.stages: List[Tuple[str, float]] = []
+        self.stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, elapsed: float, marshalled: bytes):
+        loaded = _LoadedStats(marshal.loads(marshalled))
+        with self._lock:
+            self.stages.append((stage, elapsed))
+            if self.stats is None:
+                self.stats = pstats.Stats(loaded)
+            else:
+                self.stats.add(loaded)
+
+    def summary(self) -> str:
+        lines = [f"profile {self.id}  {self.path}  ({self.reason})",
+                 f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}", "",
+                 "stage wall times:"]
+        lines += [f"  {stage:12s} {elapsed * 1000:10.1f} ms" for stage, elapsed in self.stages]
+        if self.stats is not None:
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+            lines += ["", out.getvalue()]
+        return '\n'.join(lines)
+
+
+_current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+class ProfileStore:
+    """Saved profiles: <id>.prof (pstats, for snakeviz and friends) and <id>.txt."""
+
+    def __init__(self, root: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.root = root
+        self.keep = max(1, keep)
+
+    def save(self, profile: RequestProfile):
+        if profile.stats is None:
+            return  # nothing ran on the pool for this request
+        os.makedirs(self.root, exist_ok=True)
+        profile.stats.dump_stats(os.path.join(self.root, f"{profile.id}.prof"))
+        with open(os.path.join(self.root, f"{profile.id}.txt"), 'w', encoding='utf-8') as f:
+            f.write(profile.summary())
+        self._prune()
+
+    def _prune(self):
+        saved = sorted(self.list(), key=lambda p: p['created'])
+        for entry in saved[:-self.keep]:
+            for ext in ('.prof', '.txt'):
+                try:
+                    os.remove(os.path.join(self.root, entry['id'] + ext))
+                except OSError:
+                    pass
+
+    def list(self) -> List[dict]:
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        profiles = []
+        for name in names:
+            profile_id, ext = os.path.splitext(name)
+            if ext == '.prof' and _PROFILE_ID.match(profile_id):
+                stat = os.stat(os.path.join(self.root, name))
+                profiles.append({'id': profile_id, 'created': stat.st_mtime, 'bytes': stat.st_size})
+        return sorted(profiles, key=lambda p: p['created'], reverse=True)
+
+    def path_for(self, profile_id: str, fmt: str = 'pstats') -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.root, profile_id + ('.txt' if fmt == 'text' else '.prof'))
+        return path if os.path.isfile(path) else None
+
+
+class RequestProfiler:
+    """
+    ASGI middleware that marks requests for profiling. Stages run through
+    VerificationExecutor.run() pick the mark up from a contextvar and
+    profile themselves; the merged profile is saved when the request ends
+    and its id returned in the X-Profile-ID header.
+
+    Unprofiled requests pay one header scan (only when ADMIN_TOKEN is set)
+    and one random() call (only when sampling is on).
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+
+    def _reason(self, scope) -> Optional[str]:
+        if ADMIN_TOKEN:
+            headers = dict(scope.get('headers') or [])
+            flagged = headers.get(b'x-profile') == b'1' or \
+                parse_qs(scope.get('query_string', b'').decode()).get('profile') == ['1']
+            if flagged and is_admin(headers.get(b'x-admin-token', b'').decode()):
+                return 'requested'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(uuid.uuid4().hex, scope.get('path', ''), reason)
+        token = _current_profile.set(profile)
+
+        async def tagged_send(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            _current_profile.reset(token)
+            try:
+                await asyncio.to_thread(self.store.save, profile)
+            except Exception as e:
+                print(f"❌ Error saving profile {profile.id}: {e}")
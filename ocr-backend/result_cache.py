@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# ====================================================================
+# CONFIGURATION
+# RESULT_CACHE_DIR enables the on-disk tier; leave it empty to keep the
+# cache in memory only.
+# ====================================================================
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '')
+
+
+class ResultCache:
+    """
+    Verification results keyed by upload content (and template version).
+
+    An LRU dict bounded by entry count and TTL sits in front of an optional
+    directory of JSON files, so results survive restarts. Keys are hex
+    digests, which makes them safe to use as file names.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL,
+                 disk_dir: str = RESULT_CACHE_DIR):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        # Shard by prefix so no single directory grows huge.
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value, expires_at = self._load_from_disk(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value, expires_at)
+        return value
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now + self.ttl)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'expires_at': now + self.ttl, 'value': value}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing result cache entry: {e}")
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key: str, now: float) -> Tuple[Optional[dict], float]:
+        if not self.disk_dir:
+            return None, 0
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None, 0
+        expires_at = record.get('expires_at', 0)
+        if expires_at <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None, 0
+        return record.get('value'), expires_at
@@ -0,0 +1,88 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+# ====================================================================
+# CONFIGURATION
+# The SSIM map is summarised over HOTSPOT_TILE-pixel tiles; tiles whose
+# mean SSIM falls below HOTSPOT_THRESHOLD are joined (8-connected) into
+# hotspot boxes. At most HOTSPOT_MAX boxes are reported, worst first.
+# ====================================================================
+HOTSPOT_TILE = int(os.environ.get('HOTSPOT_TILE', 64))
+HOTSPOT_THRESHOLD = float(os.environ.get('HOTSPOT_THRESHOLD', 0.9))
+HOTSPOT_MIN_TILES = int(os.environ.get('HOTSPOT_MIN_TILES', 1))
+HOTSPOT_MAX = int(os.environ.get('HOTSPOT_MAX', 20))
+
+
+def tile_stats(ssim_map: np.ndarray, tile: int = HOTSPOT_TILE):
+    """
+    Per-tile mean and minimum of an SSIM map.
+
+    Means come from one integral image, so edge tiles that are smaller
+    than `tile` are averaged over their real area; minimums use a block
+    reduce over the map padded with 1.0 (a perfect match never wins a min).
+    """
+    h, w = ssim_map.shape[:2]
+    rows, cols = -(-h // tile), -(-w // tile)
+    ys = np.minimum(np.arange(rows + 1) * tile, h)
+    xs = np.minimum(np.arange(cols + 1) * tile, w)
+
+    integral = cv2.integral(ssim_map.astype(np.float64))
+    sums = (integral[ys[1:, None], xs[None, 1:]] - integral[ys[:-1, None], xs[None, 1:]]
+            - integral[ys[1:, None], xs[None, :-1]] + integral[ys[:-1, None], xs[None, :-1]])
+    areas = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+    means = sums / areas
+
+    padded = np.ones((rows * tile, cols * tile), dtype=ssim_map.dtype)
+    padded[:h, :w] = ssim_map
+    mins = padded.reshape(rows, tile, cols, tile).min(axis=(1, 3))
+    return means, mins, ys, xs
+
+
+def _overlapping_fields(box: Sequence[int], fields: Dict[str, dict]) -> List[str]:
+    x, y, w, h = box
+    names = []
+    for name, spec in fields.items():
+        fx, fy, fw, fh = spec['box']
+        if x < fx + fw and fx < x + w and y < fy + fh and fy < y + h:
+            names.append(name)
+    return names
+
+
+def find_hotspots(ssim_map: np.ndarray, fields: Optional[Dict[str, dict]] = None,
+                  tile: int = HOTSPOT_TILE, threshold: float = HOTSPOT_THRESHOLD,
+                  min_tiles: int = HOTSPOT_MIN_TILES, limit: int = HOTSPOT_MAX) -> List[dict]:
+    """
+    Regions of `ssim_map` (template coordinates) that differ from the
+    template. Each hotspot is a dict with its box [x, y, width, height],
+    tile count, mean and minimum SSIM, and the names of the template
+    `fields` (a manifest field layout) it overlaps.
+    """
+    means, mins, ys, xs = tile_stats(ssim_map, tile)
+    mask = (means < threshold).astype(np.uint8)
+    if not mask.any():
+        return []
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    hotspots = []
+    for label in range(1, count):
+        col, row, cols, rows, tiles = (int(v) for v in stats[label])
+        if tiles < min_tiles:
+            continue
+        x0, x1 = int(xs[col]), int(xs[col + cols])
+        y0, y1 = int(ys[row]), int(ys[row + rows])
+        member = labels == label
+        hotspot = {
+            'box': [x0, y0, x1 - x0, y1 - y0],
+            'tiles': tiles,
+            'mean_ssim': round(float(means[member].mean()), 4),
+            'min_ssim': round(float(mins[member].min()), 4),
+        }
+        if fields:
+            hotspot['fields'] = _overlapping_fields(hotspot['box'], fields)
+        hotspots.append(hotspot)
+
+    hotspots.sort(key=lambda h: h['mean_ssim'])
+    return hotspots[:limit]
@@ -0,0 +1,223 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import image_registration
+from image_registration import ALIGN_MODE, Alignment
+
+# SSIM constants, identical to skimage.metrics.structural_similarity defaults
+# for uint8 images (7x7 uniform window, sample covariance, data_range=255).
+SSIM_WIN_SIZE = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_DATA_RANGE = 255.0
+
+# 'full' reproduces skimage exactly; 'pyramid' runs coarse-to-fine (see
+# ReferenceTemplate.ssim_pyramid) for a fraction of the CPU time.
+SSIM_MODE = os.environ.get('SSIM_MODE', 'full')
+SSIM_PYRAMID_SCALE = int(os.environ.get('SSIM_PYRAMID_SCALE', 4))
+SSIM_TILE_SIZE = int(os.environ.get('SSIM_TILE_SIZE', 128))
+# Bounds the coarse map's dissimilarity left unrefined (page-averaged
+# 1 - ssim), not the error against a full-resolution pass: a coarse tile
+# mean can be off by 0.25 and single pixels by up to 1.5.
+SSIM_PYRAMID_TOLERANCE = float(os.environ.get('SSIM_PYRAMID_TOLERANCE', 0.01))
+# Tiles whose coarse mean is below this are always refined, so no tile
+# near the hotspot threshold (tamper_regions.HOTSPOT_THRESHOLD, 0.9) keeps
+# a coarse value. On the test scans every tile at or above 0.95 coarse
+# was at least 0.947 at full resolution.
+SSIM_PYRAMID_REFINE_BELOW = float(os.environ.get('SSIM_PYRAMID_REFINE_BELOW', 0.95))
+
+# With many institutions only the recently used templates stay decoded.
+TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', 32))
+
+
+def _box(image: np.ndarray) -> np.ndarray:
+    # Matches scipy.ndimage.uniform_filter(mode='reflect') used by skimage.
+    return cv2.boxFilter(image, cv2.CV_64F, (SSIM_WIN_SIZE, SSIM_WIN_SIZE),
+                         normalize=True, borderType=cv2.BORDER_REFLECT)
+
+
+_COV_NORM = SSIM_WIN_SIZE ** 2 / (SSIM_WIN_SIZE ** 2 - 1)
+_C1 = (SSIM_K1 * SSIM_DATA_RANGE) ** 2
+_C2 = (SSIM_K2 * SSIM_DATA_RANGE) ** 2
+_PAD = (SSIM_WIN_SIZE - 1) // 2
+
+
+def _ssim_map(x: np.ndarray, ux: np.ndarray, vx: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """SSIM map of float64 `y` against `x`, whose statistics ux/vx are given."""
+    uy = _box(y)
+    vy = _COV_NORM * (_box(y * y) - uy * uy)
+    vxy = _COV_NORM * (_box(x * y) - ux * uy)
+
+    a1 = 2 * ux * uy + _C1
+    a2 = 2 * vxy + _C2
+    b1 = ux ** 2 + uy ** 2 + _C1
+    b2 = vx + vy + _C2
+    return (a1 * a2) / (b1 * b2)
+
+
+class ReferenceTemplate:
+    """
+    A decoded reference certificate plus everything SSIM needs from it.
+
+    The local mean and variance of the template never change, so they are
+    computed once here instead of on every comparison.
+    """
+
+    def __init__(self, path: str, image: np.ndarray, mtime: float):
+        self.path = path
+        self.mtime = mtime
+        self.image = image
+        self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        self.shape = image.shape
+        self.size = (image.shape[1], image.shape[0])  # (width, height) for cv2.resize
+
+        self.gray64 = self.gray.astype(np.float64)
+        self.ux = _box(self.gray64)
+        self.vx = _COV_NORM * (_box(self.gray64 * self.gray64) - self.ux * self.ux)
+        self._levels = {}
+        self._features = None
+
+    def features(self) -> image_registration.Features:
+        """Registration keypoints and descriptors, detected once per template."""
+        if self._features is None:
+            self._features = image_registration.detect(self.gray)
+        return self._features
+
+    def align(self, image: np.ndarray, mode: str = ALIGN_MODE) -> Tuple[np.ndarray, Alignment]:
+        """
+        Bring an upload (BGR or grayscale) into this template's coordinates.
+        Returns the aligned image and an Alignment describing the fit.
+        """
+        alignment = Alignment('resize')
+        if mode == 'features':
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            alignment = image_registration.estimate(self.features(), gray, self.size)
+        return image_registration.warp(image, alignment, self.size), alignment
+
+    def ssim(self, gray_test: np.ndarray) -> Tuple[float, np.ndarray]:
+        """
+        Structural similarity of `gray_test` (same shape as the template)
+        against this template. Returns (score, full ssim map) exactly like
+        structural_similarity(reference, test, full=True).
+        """
+        ssim_map = _ssim_map(self.gray64, self.ux, self.vx, gray_test.astype(np.float64))
+        score = ssim_map[_PAD:-_PAD, _PAD:-_PAD].mean()
+        return float(score), ssim_map
+
+    def level(self, scale: int) -> 'ReferenceTemplate':
+        """The template downsampled by `scale`, with its own SSIM statistics (cached)."""
+        coarse = self._levels.get(scale)
+        if coarse is None:
+            size = (max(SSIM_WIN_SIZE, self.size[0] // scale), max(SSIM_WIN_SIZE, self.size[1] // scale))
+            coarse = ReferenceTemplate(self.path, cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA), self.mtime)
+            self._levels[scale] = coarse
+        return coarse
+
+    def ssim_pyramid(self, gray_test: np.ndarray, scale: int = SSIM_PYRAMID_SCALE,
+                     tile: int = SSIM_TILE_SIZE, tolerance: float = SSIM_PYRAMID_TOLERANCE,
+                     refine_below: float = SSIM_PYRAMID_REFINE_BELOW) -> Tuple[float, np.ndarray]:
+        """
+        Coarse-to-fine SSIM. The whole page is compared at 1/scale
+        resolution, and only the least similar tiles are recomputed at full
+        resolution. Tiles are refined, worst first, until the dissimilarity
+        left to the coarse estimate, sum((1 - ssim) * area) / page area,
+        drops to `tolerance`; tolerance=0 refines every tile that isn't a
+        perfect match. Tiles whose coarse mean is below `refine_below` are
+        refined regardless.
+
+        The tolerance is measured on the coarse map, so it does not bound
+        the error of the tiles left coarse: downsampling smooths small
+        edits, and a coarse value can be well above the full-resolution one.
+        """
+        coarse = self.level(scale)
+        coarse_test = cv2.resize(gray_test, coarse.size, interpolation=cv2.INTER_AREA)
+        _, coarse_map = coarse.ssim(coarse_test)
+        ssim_map = cv2.resize(coarse_map, self.size, interpolation=cv2.INTER_LINEAR)
+
+        h, w = gray_test.shape[:2]
+        tiles = []
+        for y0 in range(0, h, tile):
+            for x0 in range(0, w, tile):
+                y1, x1 = min(y0 + tile, h), min(x0 + tile, w)
+                deficit = float((1.0 - ssim_map[y0:y1, x0:x1]).sum())
+                tiles.append((deficit, y0, y1, x0, x1))
+        tiles.sort(reverse=True)
+
+        remaining = sum(t[0] for t in tiles)
+        budget = tolerance * h * w
+        y = gray_test.astype(np.float64)
+        for deficit, y0, y1, x0, x1 in tiles:
+            over_budget = remaining > budget and deficit > 0
+            if not over_budget and 1.0 - deficit / ((y1 - y0) * (x1 - x0)) >= refine_below:
+                continue
+            # Widen the crop by the window radius so the box filters see the
+            # same neighbourhood as in a full-page pass; the result is exact.
+            cy0, cy1 = max(0, y0 - _PAD), min(h, y1 + _PAD)
+            cx0, cx1 = max(0, x0 - _PAD), min(w, x1 + _PAD)
+            fine = _ssim_map(self.gray64[cy0:cy1, cx0:cx1], self.ux[cy0:cy1, cx0:cx1],
+                             self.vx[cy0:cy1, cx0:cx1], y[cy0:cy1, cx0:cx1])
+            ssim_map[y0:y1, x0:x1] = fine[y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0]
+            remaining -= deficit
+
+        score = ssim_map[_PAD:-_PAD, _PAD:-_PAD].mean()
+        return float(score), ssim_map
+
+    def compare(self, gray_test: np.ndarray, mode: str = SSIM_MODE) -> Tuple[float, np.ndarray]:
+        if mode == 'pyramid':
+            return self.ssim_pyramid(gray_test)
+        return self.ssim(gray_test)
+
+
+class TemplateRegistry:
+    """
+    Process-wide cache of reference templates keyed by path.
+
+    Each template is decoded once and reused until the file's mtime
+    changes, so a request costs an os.stat instead of a full PNG decode.
+    At most `max_size` templates are kept, least recently used first out.
+    """
+
+    def __init__(self, max_size: int = TEMPLATE_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._templates: "OrderedDict[str, ReferenceTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[ReferenceTemplate]:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+
+        with self._lock:
+            template = self._templates.get(path)
+            if template is not None and template.mtime == mtime:
+                self._templates.move_to_end(path)
+                return template
+
+            image = cv2.imread(path)
+            if image is None:
+                return None
+            template = ReferenceTemplate(path, image, mtime)
+            self._templates[path] = template
+            self._templates.move_to_end(path)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+            print(f"✅ Loaded reference template {path} ({template.size[0]}x{template.size[1]})")
+            return template
+
+    def preload(self, *paths: str):
+        for path in paths:
+            template = self.get(path)
+            if template is None:
+                print(f"Warning: reference template not found at {path}")
+            elif ALIGN_MODE == 'features':
+                # Detect before the pool forks so workers inherit the descriptors.
+                template.features()
+
+
+TEMPLATES = TemplateRegistry()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from phash_index import HammingIndex, dhash, dhash_file
+
+# ====================================================================
+# CONFIGURATION
+# The manifest lists one entry per institution:
+#   {"institution": "...", "path": "template.png", "aliases": ["..."],
+#    "fields": {"Roll No": {"box": [x, y, w, h], "pattern": "..."}, ...},
+#    "rules": {"Roll No": {"kind": "label", "labels": ["enrolment no"]}, ...}}
+# Paths are relative to the manifest's directory; field boxes are in
+# template pixels (see field_layout.FieldSpec). "rules" overrides the
+# full-page extraction rules (see field_rules.DEFAULT_RULES).
+# ====================================================================
+TEMPLATE_MANIFEST = os.environ.get('TEMPLATE_MANIFEST', 'templates/manifest.json')
+# Max Hamming distance (out of 64 bits) for a perceptual-hash template match.
+TEMPLATE_PHASH_RADIUS = int(os.environ.get('TEMPLATE_PHASH_RADIUS', 10))
+# Minimum token overlap (Jaccard) for a fuzzy institution-name match.
+TEMPLATE_NAME_MIN_OVERLAP = float(os.environ.get('TEMPLATE_NAME_MIN_OVERLAP', 0.6))
+# Seconds between re-reading template mtimes for TemplateStore.version;
+# a template file replaced on disk changes the version within this long.
+TEMPLATE_VERSION_CHECK_INTERVAL = float(os.environ.get('TEMPLATE_VERSION_CHECK_INTERVAL', 1.0))
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_institution(name: Optional[str]) -> str:
+    if not name or name == 'N/A':
+        return ''
+    return ' '.join(_TOKEN_RE.findall(name.lower()))
+
+
+class TemplateEntry:
+    def __init__(self, institution: str, path: str, aliases=(), fingerprint: Optional[int] = None,
+                 fields: Optional[dict] = None, rules: Optional[dict] = None):
+        self.institution = institution
+        self.path = path
+        self.aliases = list(aliases)
+        self.fingerprint = fingerprint
+        self.fields = fields or {}
+        self.rules = rules or {}
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'institution': self.institution, 'path': self.path}
+
+
+class TemplateStore:
+    """
+    Reference templates keyed by issuing institution.
+
+    Selection never touches template pixels: institution names resolve
+    through a dict (exact) and an inverted token index (fuzzy), and images
+    through a multi-index Hamming table over 64-bit difference hashes.
+    Decoding the chosen template is left to TemplateRegistry.
+    """
+
+    def __init__(self, default: Optional[TemplateEntry] = None,
+                 version_check_interval: float = TEMPLATE_VERSION_CHECK_INTERVAL):
+        self.default = default
+        self.version_check_interval = version_check_interval
+        self._by_name: Dict[str, TemplateEntry] = {}
+        self._by_token: Dict[str, Set[str]] = defaultdict(set)
+        self._phash = HammingIndex()
+        self._entries: List[TemplateEntry] = []
+        self._version = None
+        self._version_checked = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self) -> List[TemplateEntry]:
+        return list(self._entries)
+
+    def paths(self) -> List[str]:
+        """Every template image path, the default's first, without repeats."""
+        return list(dict.fromkeys(entry.path for entry in ([self.default] if self.default else []) + self._entries))
+
+    def register(self, institution: str, path: str, aliases=(), fingerprint: Optional[int] = None,
+                 fields: Optional[dict] = None, rules: Optional[dict] = None) -> TemplateEntry:
+        if fingerprint is None:
+            fingerprint = dhash_file(path)
+        entry = TemplateEntry(institution, path, aliases, fingerprint, fields, rules)
+        self._entries.append(entry)
+        for name in [institution, *entry.aliases]:
+            key = normalize_institution(name)
+            if not key:
+                continue
+            self._by_name[key] = entry
+            for token in key.split():
+                self._by_token[token].add(key)
+        if fingerprint is not None:
+            self._phash.add(fingerprint, entry)
+        self._version = None
+        return entry
+
+    @property
+    def version(self) -> str:
+        """
+        Short digest of every registered template's path and mtime.
+
+        Part of the result-cache key, so registering templates or replacing
+        a template file invalidates cached verdicts. The mtimes are re-read
+        at most every version_check_interval seconds.
+        """
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked >= self.version_check_interval:
+            digest = hashlib.sha1()
+            for entry in ([self.default] if self.default else []) + self._entries:
+                try:
+                    mtime = os.stat(entry.path).st_mtime
+                except OSError:
+                    mtime = 0
+                digest.update(f"{entry.institution}|{entry.path}|{mtime}\n".encode('utf-8'))
+            self._version = digest.hexdigest()[:16]
+            self._version_checked = now
+        return self._version
+
+    def load_manifest(self, manifest_path: str = TEMPLATE_MANIFEST) -> int:
+        if not os.path.exists(manifest_path):
+            return 0
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        for item in manifest:
+            path = os.path.normpath(os.path.join(base_dir, item['path']))
+            self.register(item['institution'], path, item.get('aliases', ()), item.get('dhash'), item.get('fields'),
+                          item.get('rules'))
+        print(f"✅ Loaded {len(manifest)} certificate template(s) from {manifest_path}")
+        return len(manifest)
+
+    def by_name(self, university_name: Optional[str]) -> Optional[TemplateEntry]:
+        key = normalize_institution(university_name)
+        if not key:
+            return None
+        entry = self._by_name.get(key)
+        if entry is not None:
+            return entry
+
+        # OCR often drops or garbles a word, so fall back to token overlap.
+        tokens = set(key.split())
+        candidates = set()
+        for token in tokens:
+            candidates |= self._by_token.get(token, set())
+        best, best_overlap = None, 0.0
+        for candidate in candidates:
+            candidate_tokens = set(candidate.split())
+            overlap = len(tokens & candidate_tokens) / len(tokens | candidate_tokens)
+            if overlap > best_overlap:
+                best, best_overlap = candidate, overlap
+        if best is not None and best_overlap >= TEMPLATE_NAME_MIN_OVERLAP:
+            return self._by_name[best]
+        return None
+
+    def by_image(self, image: np.ndarray, radius: int = TEMPLATE_PHASH_RADIUS) -> Optional[TemplateEntry]:
+        match = self._phash.nearest(dhash(image), radius)
+        return match[1] if match else None
+
+    def select(self, university_name: Optional[str] = None,
+               image: Optional[np.ndarray] = None) -> Tuple[Optional[TemplateEntry], str]:
+        """
+        Pick the template for an upload. Returns (entry, method) where method
+        is 'name', 'phash' or 'default'.
+        """
+        entry = self.by_name(university_name)
+        if entry is not None:
+            return entry, 'name'
+        if image is not None:
+            entry = self.by_image(image)
+            if entry is not None:
+                return entry, 'phash'
+        return self.default, 'default'
+
+    def select_for_file(self, image_path: str) -> Tuple[Optional[TemplateEntry], str]:
+        image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        return self.select(image=image)
@@ -0,0 +1,63 @@
+import hashlib
+import json
+
+from anchor_store import AnchorStore
+from chain_issuer import StubIssuer
+from issue_certificates import Checkpoint, settle_pending
+from merkle import MerkleTree, verify_proof
+
+
+def certificate_hashes(prefix, count):
+    return [hashlib.sha256(f"{prefix}-{i}".encode()).hexdigest() for i in range(count)]
+
+
+def anchor(chain, root, count):
+    chain.wait(chain.send_anchor(root, count, chain.estimate_anchor_gas(root, count)))
+
+
+def test_pending_batch_is_invisible_until_committed(tmp_path):
+    store = AnchorStore(str(tmp_path / 'anchors'), rescan_interval=0)
+    tree = MerkleTree(certificate_hashes('a', 5))
+    store.write_pending(tree)
+    assert store.pending() == [(tree.root, tree.hashes)]
+    assert store.load() == 0
+    assert store.proof_for(tree.hashes[0]) is None
+
+    store.commit(tree.root)
+    assert store.pending() == []
+    proof = store.proof_for(tree.hashes[3])
+    assert proof is not None and proof['root'] == tree.root
+    assert verify_proof(tree.hashes[3], proof)
+    assert len(store) == 1
+
+
+def test_settle_pending_commits_mined_roots_and_drops_the_rest(tmp_path):
+    anchors = str(tmp_path / 'anchors')
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.jsonl'))
+    chain = StubIssuer(str(tmp_path / 'ledger.txt'))
+    store = AnchorStore(anchors)
+    mined = MerkleTree(certificate_hashes('mined', 4))
+    lost = MerkleTree(certificate_hashes('lost', 3))
+    for tree in (mined, lost):
+        store.write_pending(tree)
+    # Crash after the first root was mined but before its batch was committed
+    anchor(chain, mined.root, len(mined.hashes))
+
+    # A rerun reads the ledger the stub kept, as it would the chain
+    settle_pending(AnchorStore(anchors), checkpoint, StubIssuer(str(tmp_path / 'ledger.txt')))
+
+    recovered = AnchorStore(anchors)
+    assert recovered.pending() == []
+    assert recovered.load() == 1
+    assert all(verify_proof(h, recovered.proof_for(h)) for h in mined.hashes)
+    assert recovered.proof_for(lost.hashes[0]) is None
+    # The committed batch counts as issued; the dropped one is re-batched
+    assert checkpoint.issued() == set(mined.hashes)
+    with open(checkpoint.path, 'r', encoding='utf-8') as f:
+        assert json.loads(f.readline())['root'] == mined.root
+
+
+def test_settle_pending_without_pending_batches_is_a_no_op(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.jsonl'))
+    settle_pending(AnchorStore(str(tmp_path / 'anchors')), checkpoint, StubIssuer())
+    assert checkpoint.issued() == set()
@@ -0,0 +1,81 @@
+import hashlib
+
+import pytest
+
+from merkle import MerkleTree, verify_proof
+
+
+def certificate_hashes(count):
+    return [hashlib.sha256(f"certificate-{i}".encode()).hexdigest() for i in range(count)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 4, 5, 7, 8, 9, 16, 33])
+def test_every_leaf_proves_against_the_root(size):
+    hashes = certificate_hashes(size)
+    tree = MerkleTree(hashes)
+    for index, certificate_hash in enumerate(hashes):
+        proof = tree.proof(index)
+        assert proof['root'] == tree.root
+        assert verify_proof(certificate_hash, proof)
+
+
+@pytest.mark.parametrize('size', [2, 5, 8])
+def test_proof_does_not_prove_another_leaf(size):
+    hashes = certificate_hashes(size)
+    tree = MerkleTree(hashes)
+    proof = tree.proof(0)
+    assert not verify_proof(hashes[1], proof)
+    assert not verify_proof(certificate_hashes(size + 1)[-1], proof)
+
+
+def test_inner_node_is_not_a_leaf():
+    hashes = certificate_hashes(4)
+    tree = MerkleTree(hashes)
+    inner = tree.levels[1][0].hex()
+    assert not verify_proof(inner, {'root': tree.root, 'index': 0, 'size': 2, 'siblings': [tree.levels[1][1].hex()]})
+
+
+@pytest.mark.parametrize('size', [3, 6, 8])
+def test_truncated_siblings_are_rejected(size):
+    hashes = certificate_hashes(size)
+    proof = MerkleTree(hashes).proof(0)
+    proof['siblings'] = proof['siblings'][:-1]
+    assert not verify_proof(hashes[0], proof)
+
+
+@pytest.mark.parametrize('size', [1, 3, 6, 8])
+def test_extra_siblings_are_rejected(size):
+    hashes = certificate_hashes(size)
+    proof = MerkleTree(hashes).proof(0)
+    proof['siblings'] = proof['siblings'] + [hashes[0]]
+    assert not verify_proof(hashes[0], proof)
+
+
+def test_position_and_size_are_bound():
+    hashes = certificate_hashes(5)
+    tree = MerkleTree(hashes)
+    proof = tree.proof(1)
+    assert not verify_proof(hashes[1], dict(proof, index=0))
+    assert not verify_proof(hashes[1], dict(proof, size=4))
+    # The last leaf of an odd batch is carried up; claiming it is unpaired elsewhere fails
+    assert not verify_proof(hashes[4], dict(tree.proof(4), size=6))
+
+
+@pytest.mark.parametrize('proof', [
+    {},
+    {'root': 'ab', 'index': 0, 'size': 1},
+    {'root': 'ab', 'index': 'x', 'size': 1, 'siblings': []},
+    {'root': 'ab', 'index': 0, 'size': 1, 'siblings': ['not hex']},
+    {'root': 'ab', 'index': 0, 'size': 1, 'siblings': None},
+    {'root': 'ab', 'index': 1, 'size': 1, 'siblings': []},
+    {'root': 'ab', 'index': -1, 'size': 2, 'siblings': ['00']},
+    {'root': 'ab', 'index': 0, 'size': 0, 'siblings': []},
+])
+def test_malformed_proofs_are_rejected(proof):
+    assert not verify_proof(certificate_hashes(1)[0], proof)
+
+
+def test_root_is_compared_case_insensitively():
+    hashes = certificate_hashes(3)
+    proof = MerkleTree(hashes).proof(2)
+    assert verify_proof(hashes[2], dict(proof, root=proof['root'].upper()))
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from near_duplicates import ChunkIndex, NearDuplicateIndex
+
+
+def page(seed):
+    """A grey page with a few dark blocks, different per seed."""
+    rng = np.random.default_rng(seed)
+    image = np.full((707, 1000), 245, dtype=np.uint8)
+    for _ in range(12):
+        x, y = rng.integers(0, 900), rng.integers(0, 650)
+        image[y:y + 40, x:x + 90] = 30
+    return image
+
+
+def make_index(tmp_path, **kwargs):
+    return NearDuplicateIndex(path=str(tmp_path / 'fingerprints.db'), enabled=True, **kwargs)
+
+
+def test_chunk_index_saturates_and_removes():
+    index = ChunkIndex(bits=128, chunk_bits=32, max_bucket=2)
+    shared = 0xdeadbeef
+    for entry_id in (1, 2, 3):
+        index.add(shared | (entry_id << 96), entry_id)
+    # The shared low chunk saturated; only the distinct high chunk votes
+    assert index.candidates(shared | (2 << 96), 5) == [2]
+    index.remove(2)
+    assert index.candidates(shared | (2 << 96), 5) == []
+    assert len(index) == 2
+
+
+def test_copy_matches_its_verdict(tmp_path):
+    index = make_index(tmp_path)
+    entry_id = index.remember(index.probe(page(1)), 'a' * 64, {'ok': True}, 'v1')
+    index.remember(index.probe(page(2)), 'b' * 64, {'ok': True}, 'v1')
+    near = index.match(index.probe(page(1)), 'v1')
+    assert near is not None and near['id'] == entry_id and near['distance'] == 0
+    assert index.match(index.probe(page(1)), 'v2') is None
+
+
+def test_prune_drops_expired_verdicts_but_keeps_blacklist(tmp_path):
+    index = make_index(tmp_path, ttl=60)
+    old = index.probe(page(1))
+    index.remember(old, 'a' * 64, {}, 'v1')
+    forged = index.probe(page(2))
+    index.blacklist(forged, 'b' * 64, 'forged')
+    with index._db_lock:
+        with index._db() as conn:
+            conn.execute('UPDATE fingerprints SET created = ?', (time.time() - 120,))
+
+    assert index.prune() == 1
+    assert index.match(old, 'v1') is None
+    assert index.match(forged, 'v1')['kind'] == 'blacklist'
+
+    reloaded = make_index(tmp_path, ttl=60)
+    assert reloaded.load() == 1
+    assert reloaded.blacklist_generation == 1
+
+
+def test_verdicts_are_capped_oldest_first(tmp_path):
+    index = make_index(tmp_path, max_verdicts=3)
+    probes = [index.probe(page(seed)) for seed in range(5)]
+    for seed, probe in enumerate(probes):
+        index.remember(probe, f"{seed:064x}", {}, 'v1')
+    assert len(index) <= 3
+    assert index.match(probes[0], 'v1') is None
+    assert index.match(probes[-1], 'v1') is not None
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# ====================================================================
+# CONFIGURATION
+# MAX_UPLOAD_BYTES caps each uploaded file, MAX_REQUEST_BYTES the whole
+# request body (a batch carries many files). KEEP_UPLOADS=1 also writes
+# every upload to UPLOAD_FOLDER for auditing; processing never reads it.
+# ====================================================================
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 256 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+KEEP_UPLOADS = os.environ.get('KEEP_UPLOADS', '0') == '1'
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
+        self.limit = limit
+
+
+class UploadUnreadable(Exception):
+    pass
+
+
+class Upload:
+    """
+    One uploaded file held in memory: its bytes, SHA-256 and (once
+    decode() has run) the BGR image every pipeline stage shares.
+    """
+
+    def __init__(self, filename: str, data: bytes, digest: str):
+        self.filename = filename
+        self.data = data
+        self.digest = digest
+        self._image = None
+        self._gray = None
+
+    def decode(self) -> np.ndarray:
+        if self._image is None:
+            image = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise UploadUnreadable(f"{self.filename or 'upload'} is not a readable image")
+            self._image = image
+        return self._image
+
+    @property
+    def gray(self) -> np.ndarray:
+        # OCR only needs luminance, so it gets a third of the bytes to pickle.
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.decode(), cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def release(self):
+        """Drop the decoded arrays once every stage has finished with them."""
+        self._image = self._gray = None
+
+
+def ingest(fileobj, filename: str, max_bytes: int = MAX_UPLOAD_BYTES,
+           save_path: Optional[str] = None) -> Upload:
+    """
+    Read an upload in chunks, hashing as it arrives and stopping as soon as
+    it passes `max_bytes`. Writes it to `save_path` only when asked.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+        if len(buffer) + len(chunk) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(chunk)
+        buffer += chunk
+    if save_path:
+        with open(save_path, "wb") as f:
+            f.write(buffer)
+    return Upload(filename, bytes(buffer), digest.hexdigest())
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimit:
+    """
+    ASGI middleware that refuses request bodies over `max_bytes` with 413,
+    before the multipart parser spools them to disk: up front when
+    Content-Length is too big, otherwise as soon as the streamed body
+    passes it.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes and not rejected:
+                    # Answer now: the app may turn the parse error into a
+                    # generic 400, which limited_send then swallows.
+                    rejected = True
+                    await self._reject(send)
+                    raise _BodyTooLarge()
+            return message
+
+        async def limited_send(message):
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except _BodyTooLarge:
+            pass
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Request body exceeds {self.max_bytes} bytes"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,53 @@
+import os
+from typing import Dict, Optional, Tuple
+
+# ====================================================================
+# CONFIGURATION
+# With EARLY_EXIT=1 a verification stops as soon as its verdict is
+# decided instead of always running OCR, SSIM and the chain lookup:
+#   - SSIM (and the heatmap) only runs when the hash matched, or when the
+#     client asked for evidence (?evidence=1). Evidence requests run SSIM
+#     alongside OCR as before, so they cost no extra latency.
+#   - a hash that is not on chain, from an upload whose KEY_FIELDS are
+#     missing or read below MIN_KEY_FIELD_CONFIDENCE, is reported as
+#     UNREADABLE (rescan) rather than INVALID. The chain lookup always
+#     runs first, so a hash that is on chain stays VALID however
+#     confidently it was read.
+# EARLY_EXIT=0 runs every stage for every upload.
+# ====================================================================
+EARLY_EXIT = os.environ.get('EARLY_EXIT', '1') == '1'
+KEY_FIELDS = tuple(f.strip() for f in os.environ.get(
+    'EARLY_EXIT_KEY_FIELDS', 'Certificate ID,Certificate Holder Name').split(',') if f.strip())
+MIN_KEY_FIELD_CONFIDENCE = float(os.environ.get('MIN_KEY_FIELD_CONFIDENCE', 0.25))
+
+
+class VerdictPolicy:
+    """Decides which of the remaining stages can still change a verification's outcome."""
+
+    def __init__(self, enabled: bool = EARLY_EXIT, key_fields: Tuple[str, ...] = KEY_FIELDS,
+                 min_confidence: float = MIN_KEY_FIELD_CONFIDENCE):
+        self.enabled = enabled
+        self.key_fields = tuple(key_fields)
+        self.min_confidence = min_confidence
+
+    def unreadable(self, fields: Dict[str, str], confidence: Optional[Dict[str, float]]) -> Optional[str]:
+        """Why an upload whose hash is not on chain may just be misread, or None."""
+        if not self.enabled:
+            return None
+        for field in self.key_fields:
+            if fields.get(field, 'N/A') == 'N/A':
+                return f"{field} not found"
+            conf = (confidence or {}).get(field, 1.0)
+            if conf < self.min_confidence:
+                return f"{field} read with confidence {conf:.2f}"
+        return None
+
+    def ssim_with_ocr(self, evidence: bool) -> bool:
+        """Whether SSIM will run whatever OCR finds, so it can start alongside OCR."""
+        return not self.enabled or evidence
+
+    def wants_ssim(self, evidence: bool, is_valid: bool) -> bool:
+        return not self.enabled or evidence or is_valid
+
+
+POLICY = VerdictPolicy()
@@ -0,0 +1,159 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from request_profiler import current_profile, run_profiled
+
+# ====================================================================
+# CONFIGURATION
+# Every value can be overridden from the environment so the pool can be
+# sized per deployment without touching the code.
+# ====================================================================
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', os.cpu_count() or 1))
+OCR_MAX_PENDING = int(os.environ.get('OCR_MAX_PENDING', OCR_WORKERS * 2))
+OCR_RETRY_AFTER = int(os.environ.get('OCR_RETRY_AFTER', 5))
+
+STAGE_TIMEOUTS = {
+    'ocr': float(os.environ.get('OCR_STAGE_TIMEOUT', 60)),
+    'ocr_batch': float(os.environ.get('OCR_BATCH_STAGE_TIMEOUT', 300)),
+    'ssim': float(os.environ.get('SSIM_STAGE_TIMEOUT', 30)),
+    'chain': float(os.environ.get('CHAIN_STAGE_TIMEOUT', 10)),
+}
+
+
+class ExecutorBusy(Exception):
+    """Raised when the admission queue is full; the caller should answer 503."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Verification queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage does not finish within its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout:.0f}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class VerificationExecutor:
+    """
+    Runs the CPU-heavy verification stages (OCR, SSIM) in a process pool so
+    the uvicorn event loop stays free for cheap endpoints like /health.
+
+    Admission is bounded: at most `max_workers + max_pending` requests may be
+    in flight at once. Anything beyond that is rejected immediately with
+    ExecutorBusy instead of queueing without limit.
+
+    Pool tasks wait for a free worker here rather than in the pool's own
+    queue, so a stage's timeout only counts the time it actually runs.
+    """
+
+    def __init__(self, max_workers: int = OCR_WORKERS, max_pending: int = OCR_MAX_PENDING,
+                 initializer=None, retry_after: int = OCR_RETRY_AFTER):
+        self.max_workers = max(1, max_workers)
+        self.capacity = self.max_workers + max(0, max_pending)
+        self.retry_after = retry_after
+        self._initializer = initializer
+        self._pool = None
+        self._workers = None  # asyncio.Semaphore, one permit per pool worker
+        self._active = 0
+        self.warm_state = 'idle'  # idle -> warming -> ready / degraded / failed
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self._initializer)
+            print(f"✅ Verification pool started with {self.max_workers} worker(s), capacity {self.capacity}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def warm_up(self, probe):
+        """
+        Start every worker and wait for its initializer, in the background.
+
+        `probe` runs once per worker slot and returns True when that
+        worker's reader is usable; /health reports the aggregate state.
+        """
+        if self._pool is None:
+            self.start()
+        self.warm_state = 'warming'
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, probe) for _ in range(self.max_workers)),
+            return_exceptions=True,
+        )
+        ok = sum(1 for r in results if r is True)
+        if ok == len(results):
+            self.warm_state = 'ready'
+        else:
+            self.warm_state = 'degraded' if ok else 'failed'
+        print(f"Verification pool warm-up: {ok}/{len(results)} worker(s) ready")
+
+    def acquire(self):
+        """Take an admission slot or raise ExecutorBusy. Pair with release()."""
+        # The check and the increment run without an await in between, so on
+        # a single event loop no extra locking is needed.
+        if self._active >= self.capacity:
+            raise ExecutorBusy(self.retry_after)
+        self._active += 1
+
+    def release(self):
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, stage: str, fn, *args, in_process: bool = True):
+        """
+        Run `fn(*args)` off the event loop and enforce the stage timeout.
+
+        CPU-bound stages go to the process pool; I/O-bound ones (subprocesses,
+        file writes) pass in_process=False and use the default thread pool.
+        """
+        if in_process and self._pool is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        profile = current_profile()
+        if profile is not None:
+            # Profile inside the worker, where the time is actually spent
+            args = (fn,) + args
+            fn = run_profiled
+        if in_process:
+            if self._workers is None:
+                self._workers = asyncio.Semaphore(self.max_workers)
+            await self._workers.acquire()
+            try:
+                task = self._pool.submit(fn, *args)
+            except Exception:
+                self._workers.release()
+                raise
+            # Held until the task really ends, even if it outlives its timeout
+            task.add_done_callback(lambda _: loop.call_soon_threadsafe(self._workers.release))
+            future = asyncio.wrap_future(task)
+        else:
+            future = loop.run_in_executor(None, fn, *args)
+        started = loop.time()
+        timeout = STAGE_TIMEOUTS.get(stage)
+        try:
+            result = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage, timeout)
+        if profile is not None:
+            result, stats = result
+            profile.add(stage, loop.time() - started, stats)
+        return result
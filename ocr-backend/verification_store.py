@@ -0,0 +1,250 @@
+import argparse
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+VERIFICATION_DB = os.environ.get('VERIFICATION_DB', 'data/verifications.db')
+STORE_BATCH_SIZE = int(os.environ.get('STORE_BATCH_SIZE', 256))
+STORE_FLUSH_INTERVAL = float(os.environ.get('STORE_FLUSH_INTERVAL', 0.2))
+
+# CSV column -> table column. The CSV names are what batchVerify.js and the
+# reports expect, so exports keep them.
+FIELD_COLUMNS = {
+    'University Name': 'university_name',
+    'Certificate Holder Name': 'holder_name',
+    'Course': 'course',
+    'Grade': 'grade',
+    'Roll No': 'roll_no',
+    'Certificate ID': 'certificate_id',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verifications (
+    record_hash     TEXT PRIMARY KEY,
+    university_name TEXT,
+    holder_name     TEXT,
+    course          TEXT,
+    grade           TEXT,
+    roll_no         TEXT,
+    certificate_id  TEXT,
+    first_seen      REAL NOT NULL,
+    last_seen       REAL NOT NULL,
+    times_seen      INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_verifications_certificate_id ON verifications(certificate_id);
+CREATE INDEX IF NOT EXISTS idx_verifications_roll_no ON verifications(roll_no);
+"""
+
+UPSERT = """
+INSERT INTO verifications (record_hash, university_name, holder_name, course, grade, roll_no,
+                           certificate_id, first_seen, last_seen, times_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(record_hash) DO UPDATE SET
+    last_seen = MAX(last_seen, excluded.last_seen),
+    times_seen = times_seen + 1
+"""
+
+
+class VerificationStore:
+    """
+    SQLite (WAL) record of every certificate the service has verified.
+
+    One row per distinct record hash, so re-verifying a certificate bumps
+    a counter instead of appending a duplicate. Writes are queued and
+    committed in batches by a single writer thread; reads use their own
+    per-thread connections and never wait for the writer under WAL.
+    Failed commits are counted in `write_failures`.
+    """
+
+    def __init__(self, path: str = VERIFICATION_DB, batch_size: int = STORE_BATCH_SIZE,
+                 flush_interval: float = STORE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+        self._queued = set()  # hashes of new rows not committed yet
+        self._queued_lock = threading.Lock()
+        self._failing = False
+        self.write_failures = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Writes are serialised by _write_lock, so the writer connection may
+        # move between the caller's thread and the writer thread.
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    # ---------------------------------------------------------------- writes
+
+    def start(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='verification-store', daemon=True)
+            self._writer.start()
+
+    def stop(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None
+
+    @property
+    def pending(self) -> int:
+        """Rows queued but not yet committed."""
+        return self._queue.qsize()
+
+    def record(self, extracted_data: Dict[str, str], record_hash: str) -> bool:
+        """
+        Queue one verification. Idempotent per record_hash: True only when
+        it adds a record, False for one already stored (or queued) and
+        while the last commit failed.
+        """
+        now = time.time()
+        row = (record_hash, *(extracted_data.get(field, 'N/A') for field in FIELD_COLUMNS), now, now)
+        with self._queued_lock:
+            new = record_hash not in self._queued and self.by_hash(record_hash) is None
+            if new:
+                self._queued.add(record_hash)
+        if self._writer is None:
+            return self._commit([row]) and new
+        self._queue.put(row)
+        return new and not self._failing
+
+    def flush(self):
+        """Block until everything queued so far is committed."""
+        if self._writer is not None:
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait(timeout=30)
+
+    def _commit(self, rows: List[tuple]) -> bool:
+        try:
+            with self._write_lock:
+                if self._write_conn is None:
+                    self._write_conn = self._connect()
+                with self._write_conn:
+                    self._write_conn.executemany(UPSERT, rows)
+            self._failing = False
+            return True
+        except sqlite3.Error as e:
+            self._failing = True
+            self.write_failures += 1
+            print(f"❌ Error writing {len(rows)} verification record(s): {e}")
+            return False
+        finally:
+            with self._queued_lock:
+                self._queued.difference_update(row[0] for row in rows)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            rows, waiters, stopping = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                if stopping or waiters or len(rows) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if rows:
+                self._commit(rows)
+            for waiter in waiters:
+                waiter.set()
+            if stopping:
+                return
+
+    # ----------------------------------------------------------------- reads
+
+    def _to_fields(self, row: sqlite3.Row) -> Dict[str, str]:
+        record = {field: row[column] for field, column in FIELD_COLUMNS.items()}
+        record.update({'record_hash': row['record_hash'], 'times_seen': row['times_seen'],
+                       'first_seen': row['first_seen'], 'last_seen': row['last_seen']})
+        return record
+
+    def by_hash(self, record_hash: str) -> Optional[Dict[str, str]]:
+        row = self._reader().execute('SELECT * FROM verifications WHERE record_hash = ?', (record_hash,)).fetchone()
+        return self._to_fields(row) if row else None
+
+    def by_certificate_id(self, certificate_id: str) -> List[Dict[str, str]]:
+        rows = self._reader().execute('SELECT * FROM verifications WHERE certificate_id = ?', (certificate_id,))
+        return [self._to_fields(row) for row in rows]
+
+    def by_roll_no(self, roll_no: str) -> List[Dict[str, str]]:
+        rows = self._reader().execute('SELECT * FROM verifications WHERE roll_no = ?', (roll_no,))
+        return [self._to_fields(row) for row in rows]
+
+    def count(self) -> int:
+        return self._reader().execute('SELECT COUNT(*) FROM verifications').fetchone()[0]
+
+    # ------------------------------------------------------------ CSV bridge
+
+    def export_csv(self, csv_path: str) -> int:
+        """Write one row per distinct record with the certificates2.csv header."""
+        conn = self._reader()
+        columns = ', '.join(FIELD_COLUMNS.values())
+        tmp_path = f"{csv_path}.tmp"
+        count = 0
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(list(FIELD_COLUMNS))
+            for row in conn.execute(f'SELECT {columns} FROM verifications ORDER BY first_seen'):
+                writer.writerow(tuple(row))
+                count += 1
+        os.replace(tmp_path, csv_path)
+        return count
+
+    def import_csv(self, csv_path: str, hash_fn) -> int:
+        """Load a legacy append-only CSV; duplicate rows collapse into one record."""
+        if not os.path.exists(csv_path):
+            return 0
+        now = time.time()
+        rows = []
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            for record in csv.DictReader(csvfile):
+                if not any((record.get(field) or '').strip() for field in FIELD_COLUMNS):
+                    continue
+                fields = {field: record.get(field) or 'N/A' for field in FIELD_COLUMNS}
+                rows.append((hash_fn(fields), *fields.values(), now, now))
+        for start in range(0, len(rows), self.batch_size):
+            self._commit(rows[start:start + self.batch_size])
+        return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the verification store as CSV")
+    parser.add_argument('csv_path', nargs='?', default='data/certificates2.csv')
+    parser.add_argument('--db', default=VERIFICATION_DB)
+    args = parser.parse_args()
+    exported = VerificationStore(args.db).export_csv(args.csv_path)
+    print(f"✅ Exported {exported} record(s) to {args.csv_path}")
@@ -24,14 +24,20 @@ module.exports = async function (callback) {
     const fileContent = fs.readFileSync(csvPath);
     const records = parse(fileContent, { columns: true });
 
-    // Ensure hash column exists
-    records.forEach(r => {
-      if (!r.hasOwnProperty("hash")) r["hash"] = "";
-    });
-
-    // 2️⃣ Hash each row and store in the hash column
+    // 2️⃣ Hash the certificate fields of each row (the same six fields, with
+    // 'N/A' for empty ones, that the verifier hashes) into the hash column
+    const fields = [
+      "University Name",
+      "Certificate Holder Name",
+      "Course",
+      "Grade",
+      "Roll No",
+      "Certificate ID"
+    ];
     const hashes = records.map(row => {
-      const hash = crypto.createHash("sha256").update(stableStringify(row)).digest("hex");
+      const certificate = {};
+      fields.forEach(f => { certificate[f] = (row[f] || "").trim() || "N/A"; });
+      const hash = crypto.createHash("sha256").update(stableStringify(certificate)).digest("hex");
       row["hash"] = hash;
       return hash;
     });